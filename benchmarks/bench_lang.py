@@ -0,0 +1,848 @@
+"""
+Benchmarks for :mod:`pytool.lang`.
+
+Run from the repository root with::
+
+    python -m benchmarks.bench_lang            # Run everything
+    python -m benchmarks.bench_lang from_dict  # Run the named benchmarks
+
+Each benchmark prints the best time per call out of several repeats, so the
+numbers are comparable between runs on the same machine.
+
+"""
+
+import copy
+import copyreg
+import inspect
+import io
+import os
+import pickle
+import sys
+import timeit
+import tracemalloc
+import weakref
+
+import pytool
+import pytool.json
+from pytool.lang import (
+    CompactKeyspace,
+    FastNamespace,
+    Keyspace,
+    LazyNamespace,
+    Namespace,
+    RecordNamespace,
+    compile_schema,
+    flatten,
+    hashed_singleton,
+    unflatten,
+    unflatten_many,
+    unflatten_stream,
+)
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """Register *func* as a named benchmark."""
+    BENCHMARKS[func.__name__.replace("bench_", "")] = func
+    return func
+
+
+def report(label, func, number=None, repeat=5, namespace=None):
+    """Time *func* (or a statement string run in *namespace*) and print the
+    best time per call."""
+    timer = timeit.Timer(func, globals=namespace)
+    if number is None:
+        number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    if best >= 1e-3:
+        value = "{:10.2f} ms".format(best * 1e3)
+    else:
+        value = "{:10.2f} us".format(best * 1e6)
+    print("  {:<48} {}".format(label, value))
+    return best
+
+
+def report_memory(label, func):
+    """Print the peak memory allocated while calling *func*."""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+        del result
+    finally:
+        tracemalloc.stop()
+    print("  {:<48} {:10.1f} KiB".format(label, peak / 1024))
+    return peak
+
+
+def flat_doc(size=5000):
+    """Return a dict with *size* scalar keys."""
+    return {"key_{}".format(i): i for i in range(size)}
+
+
+def nested_doc(width=8, depth=4):
+    """Return a nested dict *width* wide and *depth* deep with some lists."""
+    if depth == 0:
+        return {"value": 1, "name": "leaf", "items": [1, 2, 3]}
+    return {"child_{}".format(i): nested_doc(width, depth - 1) for i in range(width)}
+
+
+def dotted_doc(size=5000):
+    """Return a flat dict of dot-notation keys, including list-like keys."""
+    doc = {}
+    for i in range(size // 5):
+        doc["section_{}.name".format(i)] = "name"
+        doc["section_{}.value".format(i)] = i
+        doc["section_{}.nested.flag".format(i)] = True
+        doc["section_{}.list.0".format(i)] = "zero"
+        doc["section_{}.list.1".format(i)] = "one"
+    return doc
+
+
+def _legacy_from_dict(self, obj):
+    """The pre single-pass implementation of :meth:`Namespace.from_dict`."""
+    obj = unflatten(obj)
+
+    assert isinstance(obj, dict), "Bad Namespace value: '{!r}'".format(obj)
+
+    def _coerce_value(value):
+        if isinstance(value, dict):
+            space = type(self)()
+            _legacy_from_dict(space, value)
+            return space
+        elif isinstance(value, list):
+            value = copy.copy(value)
+            for i in range(len(value)):
+                value[i] = _coerce_value(value[i])
+        return value
+
+    for key, value in obj.items():
+        assert self._VALID_NAME.match(key), "Invalid name: {!r}".format(key)
+        value = _coerce_value(value)
+        setattr(self, key, value)
+
+
+def _legacy_unflatten(obj):
+    """The recursive implementation of :func:`unflatten`."""
+
+    def expand(obj):
+        if not isinstance(obj, dict):
+            if isinstance(obj, list):
+                return [expand(v) for v in obj]
+            return obj
+
+        expanded = {}
+        for key, value in obj.items():
+            key = key.split(".") if isinstance(key, str) else [key]
+            if len(key) == 1:
+                expanded[key[0]] = expand(value)
+                continue
+
+            current = expanded
+            end = len(key) - 1
+            for i in range(len(key)):
+                part = key[i]
+                if part not in current:
+                    if i == end:
+                        current[part] = expand(value)
+                        break
+                    current[part] = {}
+                if i == end:
+                    raise ValueError("Value already assigned")
+                current = current[part]
+        return expanded
+
+    def join(obj):
+        if not isinstance(obj, dict):
+            if isinstance(obj, list):
+                return [join(v) for v in obj]
+            return obj
+
+        if "0" not in obj and 0 not in obj:
+            for key, value in obj.items():
+                obj[key] = join(value)
+            return obj
+
+        items = pytool.lang._list_items(obj)
+        if items is None:
+            return obj
+        return items
+
+    return join(expand(obj))
+
+
+def _legacy_list_items(obj):
+    """The sorting implementation of :func:`pytool.lang._list_items`."""
+    if "0" not in obj and 0 not in obj:
+        return None
+    try:
+        items = sorted(((int(k), v) for k, v in obj.items()), key=lambda i: i[0])
+    except (TypeError, ValueError):
+        return None
+    for i, (key, value) in enumerate(items):
+        if key != i:
+            return None
+        items[i] = value
+    return items
+
+
+def _legacy_namespace(obj):
+    space = Namespace()
+    _legacy_from_dict(space, obj)
+    return space
+
+
+@benchmark
+def bench_from_dict():
+    """Namespace construction, legacy multi-pass vs single-pass."""
+    docs = {
+        "flat": flat_doc(),
+        "nested": nested_doc(),
+        "dotted": dotted_doc(),
+    }
+    for name, doc in docs.items():
+        legacy = report("{} legacy".format(name), lambda: _legacy_namespace(doc))
+        current = report("{} single-pass".format(name), lambda: Namespace(doc))
+        print("  {:<48} {:10.2f} x".format(name + " speedup", legacy / current))
+
+
+def deep_doc(depth):
+    """Return a dict nested *depth* levels deep, alternating dicts, dot
+    keys and list-like dicts."""
+    doc = {"value": 1}
+    for i in range(depth):
+        doc = {"a.b": doc} if i % 2 else {"0": doc, "1": i}
+    return doc
+
+
+def list_doc(size=2000):
+    """Return a dict of lists of small dicts and lists."""
+    return {
+        "rows": [
+            {"id.value": i, "tags": ["a", "b"], "pairs": [[i, i], [i, i]]}
+            for i in range(size)
+        ],
+        "matrix": [[j for j in range(10)] for _ in range(size)],
+    }
+
+
+@benchmark
+def bench_unflatten():
+    """unflatten() on wide, deep and list-heavy documents, recursive vs
+    iterative."""
+    docs = [
+        ("wide", dotted_doc(size=50000)),
+        ("nested", nested_doc(width=8, depth=5)),
+        ("deep", deep_doc(400)),
+        ("lists", list_doc()),
+    ]
+    for name, doc in docs:
+        report(name + " recursive", lambda: _legacy_unflatten(doc), number=1)
+        report(name + " iterative", lambda: unflatten(doc), number=1)
+
+    doc = deep_doc(100000)
+    report("deep 100k levels iterative", lambda: unflatten(doc), number=1)
+
+
+def csv_rows(size=50000):
+    """Return *size* flat rows which share the same dot-notation columns."""
+    return [
+        {
+            "user.id": i,
+            "user.name": "user_{}".format(i),
+            "user.tags.0": "a",
+            "user.tags.1": "b",
+            "user.address.city": "city",
+            "user.address.zip": "00000",
+            "score": i / 3.0,
+            "meta.created": "2020-01-01",
+            "meta.updated": "2021-01-01",
+            "meta.flags.0": True,
+            "meta.flags.1": False,
+            "active": True,
+        }
+        for i in range(size)
+    ]
+
+
+@benchmark
+def bench_unflatten_many():
+    """unflatten() in a loop against unflatten_many() for rows sharing keys."""
+    rows = csv_rows()
+    loop = report("50k rows unflatten() loop", lambda: [unflatten(r) for r in rows])
+    many = report("50k rows unflatten_many()", lambda: list(unflatten_many(rows)))
+    print("  {:<48} {:10.2f} x".format("speedup", loop / many))
+
+    rows = [dict(row, extra={"nested.value": 1}) for row in rows]
+    report("50k rows with nested values", lambda: list(unflatten_many(rows)))
+
+    # More sets of keys than unflatten_many() compiles plans for
+    rows = csv_rows(5000)
+    rows = [dict(row, **{"col_{}".format(i % 500): i}) for i, row in enumerate(rows)]
+    loop = report("5k rows 500 key sets loop", lambda: [unflatten(r) for r in rows])
+    many = report("5k rows 500 key sets", lambda: list(unflatten_many(rows)))
+    print("  {:<48} {:10.2f} x".format("speedup", loop / many))
+
+
+def _consume(iterable):
+    """Exhaust *iterable* without keeping its items."""
+    for _ in iterable:
+        pass
+
+
+def property_pairs(groups=2000, size=50):
+    """Generate sorted ``(key, value)`` pairs like a large properties file."""
+    for i in range(groups):
+        for j in range(size):
+            yield "group_{:05}.item_{:03}.value".format(i, j), j
+            yield "group_{:05}.item_{:03}.tags.0".format(i, j), "tag"
+
+
+@benchmark
+def bench_unflatten_stream():
+    """unflatten() of a flat dict against unflatten_stream() of 200k pairs."""
+    runs = [
+        ("unflatten(dict(pairs))", lambda: unflatten(dict(property_pairs()))),
+        ("unflatten_stream(pairs)", lambda: unflatten_stream(property_pairs())),
+        (
+            "unflatten_stream(pairs, subtrees=True)",
+            lambda: _consume(unflatten_stream(property_pairs(), subtrees=True)),
+        ),
+    ]
+    for label, func in runs:
+        report(label, func, number=1)
+    for label, func in runs:
+        report_memory(label + " peak", func)
+
+
+def _recursive_flatten(obj, prefix=""):
+    """A hand-rolled recursive flattener, building every key from scratch."""
+    flat = {}
+    items = enumerate(obj) if isinstance(obj, list) else obj.items()
+    for key, value in items:
+        key = "{}{}".format(prefix, key)
+        if isinstance(value, (dict, list)) and value:
+            flat.update(_recursive_flatten(value, key + "."))
+        else:
+            flat[key] = value
+    return flat
+
+
+@benchmark
+def bench_flatten():
+    """flatten() against a recursive flattener, and the memory it holds."""
+    docs = [
+        ("wide", flat_doc(size=50000)),
+        ("nested", nested_doc(width=8, depth=5)),
+        ("lists", list_doc()),
+    ]
+    for name, doc in docs:
+        report(name + " recursive", lambda: _recursive_flatten(doc), number=1)
+        report(name + " generator", lambda: _consume(flatten(doc)), number=1)
+        report(name + " dict(flatten())", lambda: dict(flatten(doc)), number=1)
+
+    doc = nested_doc(width=8, depth=5)
+    report_memory("nested recursive peak", lambda: _recursive_flatten(doc))
+    report_memory("nested generator peak", lambda: _consume(flatten(doc)))
+
+
+def id_map(size=100000):
+    """Return a dict keyed by numeric IDs, including ``'0'``, which isn't a
+    list."""
+    ids = ["0"] + [str(1000 + i * 7) for i in range(size - 1)]
+    return {key: {"name": key} for key in reversed(ids)}
+
+
+@benchmark
+def bench_list_detection():
+    """List detection sorting every key against a single linear pass."""
+    dense = {str(i): i for i in range(100000)}
+    shuffled = dict(sorted(dense.items(), key=lambda item: hash(item[0])))
+    ids = id_map()
+    named = {"name": "not a list", **ids}
+    sparse = {str(i * 2): i for i in range(50000)}
+    maps = [
+        ("dense 100k list", dense),
+        ("dense 100k list, shuffled", shuffled),
+        ("100k ID map", ids),
+        ("100k ID map, name first", named),
+        ("50k half sparse list", sparse),
+    ]
+    for name, obj in maps:
+        legacy = report(name + " sorted", lambda: _legacy_list_items(obj))
+        current = report(name + " linear", lambda: pytool.lang._list_items(obj))
+        print("  {:<48} {:10.2f} x".format(name + " speedup", legacy / current))
+    report(
+        "50k half sparse list, sparse",
+        lambda: pytool.lang._list_items(sparse, sparse=True),
+    )
+
+    doc = {"group_{}.users".format(i): id_map(1000) for i in range(100)}
+    report("unflatten() 100 ID maps", lambda: unflatten(doc), number=1)
+
+
+def _legacy_hashed_singleton(klass):
+    """The original weak reference :func:`hashed_singleton`."""
+    singletons = weakref.WeakValueDictionary()
+
+    def __new__(cls, *args, **kwargs):
+        signature = (args, tuple(sorted(kwargs.items())))
+        if signature not in singletons:
+            obj = klass(*args, **kwargs)
+            singletons[signature] = obj
+        else:
+            obj = singletons[signature]
+        return obj
+
+    return type(klass.__name__, (object,), {"__new__": __new__})
+
+
+class Client(object):
+    """Stands in for an expensive client, like a database connection."""
+
+    def __init__(self, host, port=80):
+        self.host = host
+        self.port = port
+
+
+@benchmark
+def bench_hashed_singleton():
+    """hashed_singleton() hits, and how often unheld instances are rebuilt."""
+    classes = [
+        ("legacy weak", _legacy_hashed_singleton(Client)),
+        ("weak", hashed_singleton(Client)),
+        ("maxsize=128", hashed_singleton(maxsize=128)(Client)),
+        ("maxsize=128, ttl=60", hashed_singleton(maxsize=128, ttl=60)(Client)),
+    ]
+    for name, cls in classes:
+        held = [cls("host_{}".format(i), port=i) for i in range(100)]
+        report(name + " hit", lambda: cls("host_1", port=1))
+        del held
+
+    # The cost of matching the arguments up with Client's parameters
+    bind = pytool.lang._compile_binder(Client)
+    signature = inspect.signature(Client)
+
+    def signature_bind():
+        bound = signature.bind("host_1", port=1)
+        bound.apply_defaults()
+        return bound.args, bound.kwargs
+
+    report("precompiled binder", lambda: bind("host_1", port=1))
+    report("inspect.Signature.bind()", signature_bind)
+
+    config = {"host": "localhost", "ports": [80, 443], "options": {"timeout": 5}}
+    large = {"key_{}".format(i): [i, {"value": i}] for i in range(1000)}
+    structural = hashed_singleton(Client)
+    identity = hashed_singleton(identity=True)(Client)
+    for name, arg in [("config dict", config), ("1000 key config dict", large)]:
+        held = [structural(arg), identity(arg)]
+        report(name + " hit", lambda: structural(arg))
+        report(name + " hit, identity=True", lambda: identity(arg))
+        del held
+
+    for name, cls in classes[1:]:
+        cls.cache_clear()
+        for i in range(100000):
+            cls("host_{}".format(i % 100), port=i % 100)
+        info = cls.cache_info()
+        print("  {:<48} {:>10}".format(name + " 100k unheld calls, built", info.misses))
+
+
+@benchmark
+def bench_lazy():
+    """Reading three keys out of a large document, eager vs lazy."""
+    doc = nested_doc(width=8, depth=4)
+
+    def read(cls):
+        space = cls(doc)
+        return (
+            space.child_0.child_1.child_2.child_3.value,
+            space["child_7.child_0.child_1.child_2.name"],
+            space,
+        )
+
+    for cls in (Namespace, LazyNamespace):
+        report("{} read 3 keys".format(cls.__name__), lambda: read(cls))
+    for cls in (Namespace, LazyNamespace):
+        report_memory("{} read 3 keys peak".format(cls.__name__), lambda: read(cls))
+
+
+@benchmark
+def bench_paths():
+    """Dot-notation reads, traverse vs __getitem__ vs compiled accessors."""
+    space = Namespace({"server": {"routes": [{"name": "one", "opts": {"timeout": 5}}]}})
+    path = "server.routes.0.opts.timeout"
+    accessor = Namespace.compile_path(path)
+    getter = Namespace.getter(path, "server.routes.0.name")
+
+    report("traverse(path.split('.'))", lambda: space.traverse(path.split(".")))
+    report("space[path]", lambda: space[path])
+    report("compile_path(path)(space)", lambda: accessor(space))
+    report("getter(path, path2)(space)", lambda: getter(space))
+
+
+@benchmark
+def bench_get_many():
+    """Reading 30 paths with shared prefixes out of one Namespace."""
+    space = Namespace(nested_doc())
+    paths = [
+        "child_{}.child_{}.child_{}.child_{}.{}".format(a, b, c, d, leaf)
+        for a in (1, 2)
+        for b in (3, 4, 5)
+        for c in (6,)
+        for d in (7,)
+        for leaf in ("value", "name", "items", "missing", "items.1")
+    ]
+    getter = Namespace.getter(*paths[:3])
+    # Reading missing paths with __getitem__ creates them, so use a copy
+    other = space.copy()
+
+    report("[space[path] for path in paths]", lambda: [other[path] for path in paths])
+    report("get_many(paths)", lambda: space.get_many(paths))
+    report("getter(*3 paths)(space)", lambda: getter(space))
+    report("get_many(3 paths)", lambda: space.get_many(paths[:3]))
+
+
+@benchmark
+def bench_copy():
+    """Copying a Namespace and changing one leaf."""
+    space = Namespace(nested_doc())
+
+    def legacy():
+        clone = type(space)(space.as_dict())
+        clone.child_3.child_3.child_3.child_3.value = 2
+        return clone
+
+    def deep():
+        clone = space.copy()
+        clone.child_3.child_3.child_3.child_3.value = 2
+        return clone
+
+    def shared():
+        clone = space.copy(shared=True)
+        clone.child_3.child_3.child_3.child_3.value = 2
+        return clone
+
+    report("as_dict() + from_dict()", legacy)
+    report("copy()", deep)
+    report("copy(shared=True)", shared)
+
+
+@benchmark
+def bench_index():
+    """Dumping, membership checks and assignment, with and without an index."""
+    plain = Namespace(nested_doc())
+    indexed = Namespace(nested_doc())
+    indexed.use_index()
+    indexed.as_dict()
+    key = "child_3.child_3.child_3.child_3.value"
+
+    report("as_dict()", plain.as_dict)
+    report("as_dict() indexed", indexed.as_dict)
+    report("key in space", lambda: key in plain)
+    report("key in space indexed", lambda: key in indexed)
+
+    # Only Namespaces in an index should pay for keeping it up to date
+    report("space.value = 1", "space.value = 1", namespace={"space": plain})
+    report("space.value = 1 indexed", "space.value = 1", namespace={"space": indexed})
+
+    def assign(space):
+        space.child_3.child_3.child_3.value = 2
+        space.child_3.child_3.child_3 = Namespace({"value": 1})
+
+    report("assign subtree", lambda: assign(plain))
+    report("assign subtree indexed", lambda: assign(indexed))
+
+
+@benchmark
+def bench_attributes():
+    """Attribute reads on a plain object, Namespace and FastNamespace."""
+
+    class Plain(object):
+        pass
+
+    plain = Plain()
+    plain.foo = Plain()
+    plain.foo.bar = 1
+    spaces = {
+        "plain object": plain,
+        "Namespace": Namespace({"foo": {"bar": 1}}),
+        "FastNamespace": FastNamespace({"foo": {"bar": 1}}),
+    }
+
+    for name, space in spaces.items():
+        report(name + " .foo.bar", "space.foo.bar", namespace={"space": space})
+
+    doc = nested_doc()
+    for cls in (Namespace, FastNamespace):
+        space = cls(doc)
+        report(cls.__name__ + " for_json()", space.for_json)
+        report(cls.__name__ + " as_dict()", space.as_dict)
+
+
+@benchmark
+def bench_merge():
+    """Merging 10 configuration layers onto a large base."""
+    base = Namespace(nested_doc())
+    layers = [
+        {"child_{}.child_{}.child_0.name".format(i, 7 - i % 8): i, "layer": i}
+        for i in range(10)
+    ]
+
+    def legacy():
+        merged = base.as_dict()
+        for layer in layers:
+            merged.update(Namespace(layer).as_dict())
+        return Namespace(merged)
+
+    report("as_dict() + update() + Namespace()", legacy)
+    report("Namespace.merge()", lambda: Namespace.merge(base, *layers))
+
+
+@benchmark
+def bench_diff():
+    """Propagating a one leaf change, full rebuild vs diff and patch."""
+    base = Namespace(nested_doc())
+    shared = base.copy(shared=True)
+    shared.child_3.child_3.child_3.child_3.value = 2
+    deep = base.copy()
+    deep.child_3.child_3.child_3.child_3.value = 2
+    worker = base.copy()
+
+    # Dumping a shared copy materializes it, so it's only done on a copy
+    dumped = shared.copy(shared=True)
+    report("Namespace(as_dict())", lambda: Namespace(dumped.as_dict()))
+    report("diff() deep copy", lambda: base.diff(deep))
+    report("diff() shared copy", lambda: base.diff(shared))
+    ops = base.diff(shared)
+    report("apply_patch()", lambda: worker.apply_patch(ops))
+
+
+# Total keys for bench_keyspace, which can be set as a comma separated list
+# with the BENCH_KEYSPACE_SIZES environment variable. A Keyspace with 10M
+# keys needs more than 5 GiB of memory, so that size isn't run by default.
+KEYSPACE_SIZES = [
+    int(size)
+    for size in os.environ.get("BENCH_KEYSPACE_SIZES", "10000,1000000").split(",")
+]
+
+
+@benchmark
+def bench_keyspace():
+    """Memory used by per-user feature maps, Keyspace vs CompactKeyspace."""
+
+    def build(cls, size, features):
+        space = cls()
+        names = ["feature-{}".format(i) for i in range(features)]
+        for user in range(size // features):
+            level = space["user-{}".format(user)]
+            for name in names:
+                level[name] = True
+        return space
+
+    for size in KEYSPACE_SIZES:
+        for features in (1, 10):
+            for cls in (Keyspace, CompactKeyspace):
+                label = "{} {} keys, {} per user".format(cls.__name__, size, features)
+                report_memory(label, lambda: build(cls, size, features))
+
+
+Address = compile_schema("Address", {"city": "", "zip": ""})
+Record = compile_schema(
+    "Record",
+    {
+        "id": 0,
+        "name": "",
+        "active": False,
+        "address": Address,
+        "tags": [],
+        "meta": {"created": 0, "source": ""},
+    },
+)
+
+
+@benchmark
+def bench_schema():
+    """Building 100k records, Namespace vs compile_schema()."""
+    records = [
+        {
+            "id": i,
+            "name": "name-{}".format(i),
+            "active": bool(i % 2),
+            "address": {"city": "city", "zip": str(i)},
+            "tags": ["a", "b"],
+            "meta": {"created": i, "source": "api"},
+        }
+        for i in range(100000)
+    ]
+    text = pytool.json.as_json(records)
+    report("from_json()", lambda: pytool.json.from_json(text), number=1, repeat=3)
+
+    def load(cls):
+        return [cls(record) for record in records]
+
+    for cls in (Namespace, Record):
+        report(cls.__name__ + " build", lambda: load(cls), number=1, repeat=3)
+    for cls in (Namespace, Record):
+        report_memory(cls.__name__ + " build peak", lambda: load(cls))
+
+    rows = load(Record)
+    spaces = load(Namespace)
+    report("Namespace as_dict()", lambda: [row.as_dict() for row in spaces], number=1)
+    report("Record as_dict()", lambda: [row.as_dict() for row in rows], number=1)
+    report("Namespace for_json()", lambda: [row.for_json() for row in spaces], number=1)
+    report("Record for_json()", lambda: [row.for_json() for row in rows], number=1)
+
+
+@benchmark
+def bench_records():
+    """A 50k row API result, Namespace vs RecordNamespace."""
+    doc = {
+        "results": [
+            {
+                "id": i,
+                "name": "name-{}".format(i),
+                "email": "user{}@example.com".format(i),
+                "active": bool(i % 2),
+                "score": i / 7.0,
+                "created": "2024-01-01T00:00:00",
+            }
+            for i in range(50000)
+        ]
+    }
+
+    for cls in (Namespace, RecordNamespace):
+        report(cls.__name__ + "()", lambda: cls(doc), number=1, repeat=3)
+    for cls in (Namespace, RecordNamespace):
+        report_memory(cls.__name__ + "() peak", lambda: cls(doc))
+
+    for cls in (Namespace, RecordNamespace):
+        ns = cls(doc)
+        report(
+            cls.__name__ + " read rows",
+            lambda: [row.name for row in ns.results],
+            number=1,
+        )
+        report(cls.__name__ + " for_json()", ns.for_json, number=1)
+        report(cls.__name__ + " as_dict()", ns.as_dict, number=1)
+        report(cls.__name__ + " as_json()", lambda: pytool.json.as_json(ns), number=1)
+
+
+def _legacy_restore(cls, state):
+    space = cls.__new__(cls)
+    items, slots = state
+    space.__dict__.update(items)
+    for name, value in slots.items():
+        object.__setattr__(space, name, value)
+    return space
+
+
+def _legacy_pickle(obj):
+    """Pickle *obj* with the default state of each nested Namespace, which is
+    a separate object holding its ``__dict__`` and its slot values."""
+
+    def reduce(space):
+        names = ("_Namespace__pending", "_Namespace__index", "_Namespace__watchers")
+        slots = {name: object.__getattribute__(space, name) for name in names}
+        return (_legacy_restore, (type(space), (space.__dict__, slots)))
+
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[Namespace] = reduce
+    pickler.dump(obj)
+    return buffer.getvalue()
+
+
+@benchmark
+def bench_serialize():
+    """Serializing a large Namespace, nested pickle vs flat pickle vs binary
+    vs JSON."""
+    space = Namespace(nested_doc())
+    legacy = _legacy_pickle(space)
+    flat = pickle.dumps(space, pickle.HIGHEST_PROTOCOL)
+    binary = space.to_bytes()
+    text = pytool.json.as_json(space)
+
+    report("nested pickle dumps", lambda: _legacy_pickle(space))
+    report("flat pickle dumps", lambda: pickle.dumps(space, pickle.HIGHEST_PROTOCOL))
+    report("to_bytes()", space.to_bytes)
+    report("as_json()", lambda: pytool.json.as_json(space))
+    report("nested pickle loads", lambda: pickle.loads(legacy))
+    report("flat pickle loads", lambda: pickle.loads(flat))
+    report("from_bytes()", lambda: Namespace.from_bytes(binary))
+    report("from_json() + Namespace()", lambda: Namespace(pytool.json.from_json(text)))
+
+    for name, data in (
+        ("nested pickle", legacy),
+        ("flat pickle", flat),
+        ("to_bytes()", binary),
+        ("as_json()", text.encode("utf-8")),
+    ):
+        print("  {:<48} {:10.1f} KiB".format(name + " size", len(data) / 1024))
+
+
+@benchmark
+def bench_json():
+    """JSON encoding a large Namespace, for_json() copy vs streaming."""
+    space = Namespace(nested_doc())
+
+    def legacy():
+        return pytool.json.json.dumps(
+            space, default=pytool.json._default, for_json=True
+        )
+
+    report("simplejson.dumps(for_json=True)", legacy)
+    report("as_json()", lambda: pytool.json.as_json(space))
+    report("write_json()", lambda: pytool.json.write_json(space, io.StringIO()))
+    report_memory("simplejson.dumps(for_json=True) peak", legacy)
+    report_memory("as_json() peak", lambda: pytool.json.as_json(space))
+    report_memory(
+        "write_json() peak", lambda: pytool.json.write_json(space, _NullWriter())
+    )
+
+
+@benchmark
+def bench_from_json():
+    """Decoding JSON into Namespaces, in two passes vs during parsing."""
+    docs = [
+        ("nested", nested_doc(width=8, depth=5)),
+        ("dotted", dotted_doc(size=20000)),
+        ("rows", {"rows": [{"id": i, "name": str(i)} for i in range(50000)]}),
+    ]
+    for name, doc in docs:
+        text = pytool.json.as_json(doc)
+        report(
+            name + " Namespace(from_json())",
+            lambda: Namespace(pytool.json.from_json(text)),
+            number=1,
+        )
+        report(
+            name + " from_json(namespace=True)",
+            lambda: pytool.json.from_json(text, namespace=True),
+            number=1,
+        )
+        report(
+            name + " from_json(expand=False)",
+            lambda: pytool.json.from_json(text, namespace=True, expand=False),
+            number=1,
+        )
+
+
+class _NullWriter(object):
+    def write(self, data):
+        pass
+
+
+def main(names):
+    print("pytool", getattr(pytool, "__version__", ""), sys.version.split()[0])
+    for name in names or BENCHMARKS:
+        func = BENCHMARKS[name]
+        print("{}: {}".format(name, func.__doc__))
+        func()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -12,6 +12,10 @@ into JSON automatically.
 from datetime import datetime
 
 import simplejson as json
+from simplejson.encoder import encode_basestring_ascii
+
+from pytool.lang import Namespace, RecordList, RecordRow, _decode_hook
+from pytool.proxy import DictProxy, ListProxy
 
 # Conditionally handle bson import so we don't have to depend on pymongo
 try:
@@ -23,6 +27,7 @@ except ImportError:
 
 __all__ = [
     "as_json",
+    "write_json",
     "from_json",
 ]
 
@@ -56,6 +61,10 @@ def as_json(obj, **kwargs):
     Also adds additional encoders for :class:`~datetime.datetime` and
     :class:`bson.ObjectId`.
 
+    :class:`~pytool.lang.Namespace`, :class:`~pytool.proxy.DictProxy` and
+    :class:`~pytool.proxy.ListProxy` objects are encoded by walking them
+    directly, see :func:`write_json`.
+
     :param object obj: An object to encode.
     :param kwargs: Any optional keyword arguments to pass to the \
                    JSONEncoder
@@ -75,14 +84,206 @@ def as_json(obj, **kwargs):
        compatibility in any code that uses these hooks.
 
     """
+    if isinstance(obj, _STREAMED):
+        blocks = []
+        _StreamEncoder(blocks.append).encode(obj)
+        return "".join(blocks)
     return json.dumps(obj, default=_default, for_json=True)
 
 
-def from_json(value):
+def write_json(obj, fp):
+    """
+    Writes an object JSON encoded to a file-like object.
+
+    The output is exactly what :func:`as_json` would return, but it's written
+    to `fp` in chunks as it is encoded. :class:`~pytool.lang.Namespace`,
+    :class:`~pytool.lang.RecordList`, :class:`~pytool.proxy.DictProxy` and
+    :class:`~pytool.proxy.ListProxy` objects, and the lists and dictionaries
+    in them, are encoded by walking them directly, without building the
+    nested dictionary copy that ``for_json()`` would return.
+
+    :param object obj: An object to encode.
+    :param fp: A file-like object with a ``write()`` method.
+
+    Example::
+
+        with open('config.json', 'w') as fp:
+            write_json(config, fp)
+
+    """
+    encoder = _StreamEncoder(fp.write)
+    encoder.encode(obj)
+    encoder.flush()
+
+
+# Types which are encoded by walking them, rather than with simplejson
+_STREAMED = (Namespace, DictProxy, ListProxy, RecordList, RecordRow)
+
+
+class _StreamEncoder(object):
+    """
+    Encodes objects the same way :func:`as_json` does, walking Namespaces,
+    record lists, proxies, lists and dictionaries directly and giving every
+    other value to the simplejson encoder.
+
+    :param write: Callable which is given each block of output
+
+    """
+
+    # Number of chunks to collect before they're written as one block
+    BLOCK_SIZE = 4096
+
+    def __init__(self, write):
+        self.write = write
+        self.chunks = []
+        self.markers = set()
+        # The same options as_json() uses
+        self.encoder = json.JSONEncoder(default=_default, for_json=True)
+
+    def flush(self):
+        """Write the chunks collected so far as one block."""
+        if self.chunks:
+            self.write("".join(self.chunks))
+            self.chunks.clear()
+
+    def encode(self, obj):
+        """Encode *obj*, and write any output collected so far at the end."""
+        self.encode_value(obj)
+        self.flush()
+
+    def encode_value(self, value):
+        """Add the encoding of *value* to the chunks."""
+        kind = type(value)
+        if kind is str:
+            self.chunks.append(encode_basestring_ascii(value))
+        elif value is None:
+            self.chunks.append("null")
+        elif value is True:
+            self.chunks.append("true")
+        elif value is False:
+            self.chunks.append("false")
+        elif kind is int or kind is float:
+            # Non-finite floats are handled by simplejson
+            if kind is int or value - value == 0:
+                self.chunks.append(repr(value))
+            else:
+                self.chunks.append(self.encoder.encode(value))
+        elif kind is list or kind is tuple:
+            self.encode_list(value)
+        elif kind is dict:
+            self.encode_dict(value)
+        elif isinstance(value, Namespace):
+            if type(value).for_json is Namespace.for_json:
+                self.encode_namespace(value)
+            else:
+                self.chunks.append(self.encoder.encode(value))
+        elif isinstance(value, RecordList):
+            self.encode_list(value)
+        elif isinstance(value, RecordRow):
+            self.encode_items(value, value._present())
+        elif isinstance(value, (DictProxy, ListProxy)):
+            self.encode_value(value.for_json())
+        else:
+            self.chunks.append(self.encoder.encode(value))
+
+        if len(self.chunks) >= self.BLOCK_SIZE:
+            self.flush()
+
+    def mark(self, value):
+        """Guard against circular references, the same way simplejson
+        does."""
+        marker = id(value)
+        if marker in self.markers:
+            raise ValueError("Circular reference detected")
+        self.markers.add(marker)
+
+    def encode_list(self, value):
+        if not value:
+            self.chunks.append("[]")
+            return
+
+        self.mark(value)
+        append = self.chunks.append
+        append("[")
+        first = True
+        for item in value:
+            if first:
+                first = False
+            else:
+                append(", ")
+            self.encode_value(item)
+        append("]")
+        self.markers.discard(id(value))
+
+    def encode_dict(self, value):
+        # Leave keys which need converting to simplejson
+        if not all(type(key) is str for key in value):
+            self.chunks.append(self.encoder.encode(value))
+            return
+        self.encode_items(value, value.items())
+
+    def encode_namespace(self, space):
+        space._load()
+        items = space.__dict__.items()
+        if type(space)._descriptors:
+            # Read the items the same way for_json() does
+            items = [(key, getattr(space, key)) for key, _ in items]
+        self.encode_items(space, items)
+
+    def encode_items(self, value, items):
+        if not items:
+            self.chunks.append("{}")
+            return
+
+        self.mark(value)
+        append = self.chunks.append
+        append("{")
+        first = True
+        for key, item in items:
+            if first:
+                first = False
+            else:
+                append(", ")
+            append(encode_basestring_ascii(key))
+            append(": ")
+            self.encode_value(item)
+        append("}")
+        self.markers.discard(id(value))
+
+
+def from_json(value, namespace=False, expand=True):
     """Decodes a JSON string into an object.
 
     :param str value: String to decode
+    :param namespace: Decode JSON objects into Namespaces, either ``True``
+        for :class:`~pytool.lang.Namespace` or the Namespace class to use
+        (default ``False``)
+    :param bool expand: Expand dot-notation keys when decoding into
+        Namespaces (default ``True``)
     :returns: Decoded JSON object
 
+    Decoding into Namespaces gives the same result as creating them from the
+    decoded dictionaries, but each object is converted as soon as it's
+    parsed, so the document is only walked once and nothing is copied. With
+    *expand* turned off, dot-notation keys are kept as they are, which is
+    faster still for documents which don't use them.
+
+    Namespace classes which store lists as records, such as
+    :class:`~pytool.lang.RecordNamespace`, are created from the decoded
+    dictionaries instead, since lists are only seen after their items have
+    been decoded, and always expand dot-notation keys.
+
+    Example::
+
+        config = from_json(body, namespace=True)
+        config.server.port  # 8080
+
     """
-    return json.loads(value)
+    if not namespace:
+        return json.loads(value)
+    if namespace is True:
+        namespace = Namespace
+
+    if namespace._records:
+        return namespace._adopt(json.loads(value))
+    return json.loads(value, object_hook=_decode_hook(namespace, expand))
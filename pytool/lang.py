@@ -3,12 +3,20 @@ This module contains items that are "missing" from the Python standard library,
 that do miscelleneous things.
 """
 
+import collections
 import copy
+import copyreg
 import functools
 import inspect
+import keyword
+import operator
 import re
+import struct
+import sys
+import threading
+import time
 import weakref
-from typing import TypeVar
+from typing import Callable, Optional, TypeVar, Union
 
 __all__ = [
     "get_name",
@@ -17,7 +25,20 @@ __all__ = [
     "hashed_singleton",
     "UNSET",
     "Namespace",
+    "LazyNamespace",
+    "FastNamespace",
+    "StrictNamespace",
+    "RecordNamespace",
+    "RecordList",
+    "RecordRow",
+    "CompactKeyspace",
+    "SchemaNamespace",
+    "compile_schema",
+    "ConfigHolder",
+    "flatten",
     "unflatten",
+    "unflatten_many",
+    "unflatten_stream",
 ]
 
 
@@ -114,6 +135,9 @@ def classproperty(func):
 
 _Singleton = TypeVar("_Singleton", bound=object)
 
+# Immutable value types, which never need copying or freezing
+_PLAIN_VALUES = frozenset((str, int, float, bool, bytes, type(None)))
+
 
 def singleton(klass: _Singleton) -> _Singleton:
     """Wraps a class to create a singleton version of it.
@@ -162,20 +186,57 @@ def singleton(klass: _Singleton) -> _Singleton:
     return type(cls_name, (object,), cls_dict)
 
 
-def hashed_singleton(klass: _Singleton) -> _Singleton:
+# Statistics for the instances of a hashed_singleton() class
+_CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"]
+)
+
+
+def hashed_singleton(
+    klass: Optional[_Singleton] = None,
+    *,
+    maxsize: Optional[int] = None,
+    ttl: Optional[float] = None,
+    identity: bool = False,
+) -> Union[_Singleton, Callable[[_Singleton], _Singleton]]:
     """Wraps a class to create a hashed singleton version of it. A hashed
     singleton is like a singleton in that there will be only a single
     instance of the class for each call signature.
 
-    The singleton is kept as a `weak reference
+    By default the singleton is kept as a `weak reference
     <http://docs.python.org/2/library/weakref.html>`_, so if your program
     ceases to reference the hashed singleton, you may get a new instance if
     the Python interpreter has garbage collected your original instance.
 
-    This will not work for classes that take arguments that are unhashable
-    (e.g. dicts, sets).
+    If *maxsize* or *ttl* are given, instances are kept as strong references
+    instead, so expensive objects like clients aren't rebuilt just because
+    nothing was holding onto them. Up to *maxsize* instances are kept,
+    dropping the least recently used, and each instance is replaced once it
+    is *ttl* seconds old.
+
+    The wrapped class has a ``cache_info()`` method, which returns a named
+    tuple of ``(hits, misses, evictions, maxsize, currsize)`` counting the
+    calls which reused an instance, the calls which built one, and the
+    instances dropped for *maxsize* or *ttl*, and a ``cache_clear()`` method,
+    which drops all the instances and resets the counts.
+
+    Arguments are matched to the class's parameters first, so passing an
+    argument by position or by keyword, or leaving out an argument instead of
+    passing its default, all give the same instance.
+
+    Arguments that are dicts, lists, sets or Namespaces are compared by their
+    contents, so the same config dict passed twice gives the same instance,
+    even if it's a different dict object. Changing an argument after the
+    call doesn't change the instance it gave. With *identity*, unhashable
+    arguments are compared by which object they are instead, which is
+    cheaper for large arguments. Other unhashable arguments raise a
+    :exc:`TypeError`.
 
     :param klass: Class to decorate
+    :param int maxsize: Most instances to keep (default unlimited)
+    :param float ttl: Seconds to keep each instance for (default forever)
+    :param bool identity: Compare unhashable arguments by identity
+                          (default ``False``)
 
     .. versionadded:: 2.1
 
@@ -204,6 +265,14 @@ def hashed_singleton(klass: _Singleton) -> _Singleton:
         test is Test('b', k='k') # False
         test is Test('a', k='j') # False
 
+        # Calls binding the same arguments give the same instance
+        @hashed_singleton
+        class Point(object):
+            def __init__(self, x, y=0):
+                pass
+
+        Point(1) is Point(x=1, y=0) # True
+
         # Removing all references to a hashed singleton instance will allow
         # it to be garbage collected like normal, because it's only kept
         # as a weak reference
@@ -211,9 +280,39 @@ def hashed_singleton(klass: _Singleton) -> _Singleton:
         test = Test('a', k='k') # If the Python interpreter has garbage
                                 # collected, you will get a new instance
 
+        # Arguments are compared by their contents
+        test = Test({'host': 'localhost', 'ports': [80, 443]})
+        test is Test({'ports': [80, 443], 'host': 'localhost'}) # True
+
+        # Keep up to 32 clients, for at most 5 minutes each
+        @hashed_singleton(maxsize=32, ttl=300)
+        class Client(object):
+            def __init__(self, host, port):
+                pass
+
+        Client('localhost', 80)
+        Client('localhost', 80)
+        Client.cache_info() # CacheInfo(hits=1, misses=1, evictions=0,
+                            #           maxsize=32, currsize=1)
 
     """
-    cls_dict = {"_singletons": weakref.WeakValueDictionary()}
+    if maxsize is not None and maxsize < 1:
+        raise ValueError("maxsize must be at least 1")
+    if ttl is not None and ttl <= 0:
+        raise ValueError("ttl must be more than 0")
+    if klass is None:
+        return functools.partial(
+            hashed_singleton, maxsize=maxsize, ttl=ttl, identity=identity
+        )
+
+    strong = maxsize is not None or ttl is not None
+    if strong:
+        # Maps each signature to its instance and when it expires, in least
+        # recently used order
+        cache = collections.OrderedDict()
+    else:
+        cache = weakref.WeakValueDictionary()
+    cls_dict = {"_singletons": cache}
 
     # Mirror original class
     cls_name = klass.__name__
@@ -226,26 +325,233 @@ def hashed_singleton(klass: _Singleton) -> _Singleton:
         if isinstance(klass.__dict__[attr], staticmethod):
             cls_dict[attr] = klass.__dict__[attr]
 
+    # Hits, misses and evictions
+    stats = [0, 0, 0]
+    lock = threading.Lock()
+    freeze = _identity_key if identity else _freeze
+    bind = _compile_binder(klass)
+
     # Make new method that controls singleton behavior
     def __new__(cls, *args, **kwargs):
-        hashable_kwargs = tuple(sorted(kwargs.items()))
-        signature = (args, hashable_kwargs)
-
-        if signature not in cls._singletons:
-            obj = klass(*args, **kwargs)
-            cls._singletons[signature] = obj
+        if bind is None:
+            values, extra = args, kwargs
         else:
-            obj = cls._singletons[signature]
-
+            values, extra = bind(*args, **kwargs)
+
+        if not _PLAIN_VALUES.issuperset(map(type, values)) or (
+            extra and not _PLAIN_VALUES.issuperset(map(type, extra.values()))
+        ):
+            signature = (
+                tuple(map(freeze, values)),
+                tuple([(key, freeze(extra[key])) for key in sorted(extra)]),
+            )
+        else:
+            signature = (values, tuple(sorted(extra.items())) if extra else ())
+
+        if strong:
+            with lock:
+                obj = cache.get(signature)
+                if obj is not None:
+                    obj, expires = obj
+                    if expires is None or expires > time.monotonic():
+                        cache.move_to_end(signature)
+                        stats[0] += 1
+                        return obj
+                    del cache[signature]
+                    stats[2] += 1
+                stats[1] += 1
+        else:
+            # Only look the instance up once, since a weak reference can be
+            # collected between checking for it and getting it. This isn't
+            # locked, so the counts can be slightly off when threads race
+            obj = cache.get(signature)
+            if obj is not None:
+                stats[0] += 1
+                return obj
+            stats[1] += 1
+
+        # Build the instance without holding the lock, and keep whichever
+        # instance is stored first if another thread built one meanwhile
+        obj = klass(*args, **kwargs)
+        with lock:
+            if not strong:
+                return cache.setdefault(signature, obj)
+            if signature in cache:
+                cache.move_to_end(signature)
+                return cache[signature][0]
+            expires = None if ttl is None else time.monotonic() + ttl
+            cache[signature] = (obj, expires)
+            _evict()
         return obj
 
+    def _evict():
+        if maxsize is not None:
+            while len(cache) > maxsize:
+                cache.popitem(last=False)
+                stats[2] += 1
+        if ttl is not None:
+            # Drop the least recently used instances while they're expired
+            now = time.monotonic()
+            while cache and next(iter(cache.values()))[1] <= now:
+                cache.popitem(last=False)
+                stats[2] += 1
+
+    def cache_info():
+        with lock:
+            return _CacheInfo(stats[0], stats[1], stats[2], maxsize, len(cache))
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+            stats[:] = [0, 0, 0]
+
     # Add new method to singleton class dict
     cls_dict["__new__"] = __new__
+    cls_dict["cache_info"] = staticmethod(cache_info)
+    cls_dict["cache_clear"] = staticmethod(cache_clear)
 
     # Build and return new class
     return type(cls_name, (object,), cls_dict)
 
 
+def _compile_binder(klass):
+    """
+    Return a function which takes the same arguments as *klass*, and returns
+    a tuple of the value for each of its parameters, including defaults, and
+    a dict of any extra keyword arguments. Returns ``None`` if the signature
+    of *klass* can't be found.
+
+    The function is compiled with the same parameters as *klass*, so Python
+    binds the arguments itself, which is much faster than
+    :meth:`inspect.Signature.bind`.
+
+    :param klass: Class to bind the arguments of
+
+    """
+    try:
+        signature = inspect.signature(klass)
+    except (TypeError, ValueError):
+        return None
+
+    scope = {}
+    params = []
+    names = []
+    extra = "{}"
+    kind = None
+    for param in signature.parameters.values():
+        if kind is param.POSITIONAL_ONLY and param.kind is not kind:
+            params.append("/")
+        if param.kind is param.KEYWORD_ONLY and kind not in (
+            param.KEYWORD_ONLY,
+            param.VAR_POSITIONAL,
+        ):
+            params.append("*")
+        kind = param.kind
+
+        if kind is param.VAR_POSITIONAL:
+            params.append("*" + param.name)
+            names.append(param.name)
+        elif kind is param.VAR_KEYWORD:
+            params.append("**" + param.name)
+            extra = param.name
+        else:
+            names.append(param.name)
+            if param.default is param.empty:
+                params.append(param.name)
+            else:
+                # Defaults are looked up in the scope when the function is made
+                default = "_default{}".format(len(scope))
+                scope[default] = param.default
+                params.append("{}={}".format(param.name, default))
+    if kind is inspect.Parameter.POSITIONAL_ONLY:
+        params.append("/")
+
+    values = ", ".join(names) + ("," if len(names) == 1 else "")
+    source = "def __init__({}):\n    return ({}), {}\n".format(
+        ", ".join(params), values, extra
+    )
+    try:
+        exec(source, scope)
+    except SyntaxError:
+        return None
+
+    bind = scope["__init__"]
+    # Give bad arguments the same errors as the class itself
+    bind.__qualname__ = "{}.__init__".format(klass.__qualname__)
+    return bind
+
+
+def _freeze(value):
+    """
+    Return a hashable key for *value*, which is equal for equal values, by
+    converting the dicts, lists, tuples, sets and Namespaces in it into
+    tuples and frozensets. Each of these is tagged with the private
+    ``_FROZEN`` marker and its type, so it can't be equal to the key of any
+    other value.
+
+    :param value: Value to freeze
+
+    """
+    if type(value) in _PLAIN_VALUES:
+        return value
+    if isinstance(value, dict):
+        items = frozenset([(key, _freeze(item)) for key, item in value.items()])
+        return (_FROZEN, dict, items)
+    if isinstance(value, list):
+        return (_FROZEN, list, tuple([_freeze(item) for item in value]))
+    if isinstance(value, tuple):
+        return (_FROZEN, tuple, tuple([_freeze(item) for item in value]))
+    if isinstance(value, set):
+        return (_FROZEN, set, frozenset(value))
+    if isinstance(value, Namespace):
+        items = [(key, _freeze(item)) for key, item in value.iteritems()]
+        return (_FROZEN, type(value), frozenset(items))
+    return value
+
+
+# Tags the keys made by _freeze(), and is never part of any value
+_FROZEN = object()
+
+
+def _identity_key(value):
+    """
+    Return *value* if it's hashable, otherwise an :class:`_IdentityKey` for
+    it. The items of tuples, like ``*args``, get their own keys.
+
+    :param value: Value to make a key for
+
+    """
+    if type(value) in _PLAIN_VALUES:
+        return value
+    if type(value) is tuple:
+        return tuple(map(_identity_key, value))
+    try:
+        hash(value)
+    except TypeError:
+        return _IdentityKey(value)
+    return value
+
+
+class _IdentityKey(object):
+    """
+    Hashable key for an unhashable value, which is only equal to keys for the
+    same value. The value is kept, so its ``id()`` can't be reused by another
+    object while the key exists.
+
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return id(self.value)
+
+    def __eq__(self, other):
+        return type(other) is _IdentityKey and other.value is self.value
+
+
 class _UNSETMeta(type):
     def __nonzero__(cls):
         return False
@@ -429,6 +735,38 @@ class Namespace(object):
 
     _VALID_NAME = re.compile("^[a-zA-Z0-9_.]+$")
 
+    # Whether item values implement the __get__ descriptor protocol
+    _descriptors = True
+
+    # Whether reading a missing item creates a new nested Namespace
+    _vivify = True
+
+    # Whether lists of dictionaries with the same keys become RecordLists
+    _records = False
+
+    # Keep our own state out of __dict__, which only holds the namespace
+    # items. Private names are mangled, so they can't clash with item names
+    __slots__ = (
+        "__dict__",
+        "__weakref__",
+        "__pending",
+        "__index",
+        "__watchers",
+        "__frozen",
+    )
+
+    def __new__(cls, *args, **kwargs):
+        space = super(Namespace, cls).__new__(cls)
+        # Items which haven't been converted into attributes yet
+        object.__setattr__(space, "_Namespace__pending", None)
+        # Flattened index of this Namespace, if it's enabled
+        object.__setattr__(space, "_Namespace__index", None)
+        # Indexes this Namespace is part of, as (index ref, key) pairs
+        object.__setattr__(space, "_Namespace__watchers", None)
+        # Whether this Namespace is read-only, see ConfigHolder
+        object.__setattr__(space, "_Namespace__frozen", False)
+        return space
+
     def __init__(self, obj=None):
         if obj is not None:
             # Populate the namespace from the give dictionary
@@ -443,14 +781,22 @@ class Namespace(object):
 
     # Allow for dict-like key access and traversal
     def __getitem__(self, item):
-        if isinstance(item, (str, bytes)) and "." in item:
-            return self.traverse(item.split("."))
+        if isinstance(item, str) and "." in item:
+            return _compiled_path(item)(self)
         try:
             return self.__getattribute__(item)
         except AttributeError:
             return self.__getattr__(item)
 
     def __getattr__(self, name):
+        pending = _get_pending(self)
+        if pending is not None and name in pending:
+            return self._load_item(name)
+
+        # Class flags are read from the class, since items can shadow them
+        if not type(self)._vivify or _get_frozen(self):
+            return _EMPTY
+
         # Allow implicit nested namespaces by attribute access
         new_space = type(self)()
         setattr(self, name, new_space)
@@ -460,6 +806,10 @@ class Namespace(object):
         return self.iteritems()
 
     def __contains__(self, name):
+        index = _get_index(self)
+        if index is not None and name in index.flat(self):
+            return True
+
         names = name.split(".")
 
         obj = self
@@ -467,24 +817,125 @@ class Namespace(object):
             # Easy check for membership without triggering __getattr__ and
             # creating new empty Namespace attributes in the checked object
             if isinstance(obj, Namespace) and name not in obj.__dict__:
-                return False
+                if _get_pending(obj) is None or name not in _get_pending(obj):
+                    return False
 
             # Otherwise try to continue down the tree in a normal way
             obj = getattr(obj, name)
 
         # Check the Namespace object for emptiness
         if isinstance(obj, Namespace):
-            return bool(obj.__dict__)
+            return bool(obj)
 
         # Otherwise we found what we wanted
         return True
 
+    def __setattr__(self, name, value):
+        # Only Namespaces in an index or read-only pay for more than the
+        # slot reads
+        if _get_watchers(self) is None and not _get_frozen(self):
+            object.__setattr__(self, name, value)
+            return
+
+        _check_writable(self, name)
+        old = _get_dict(self).get(name, _MISSING)
+        object.__setattr__(self, name, value)
+        self._notify(name, old, value)
+
+    def __delattr__(self, name):
+        _check_writable(self, name)
+        self._load()
+        old = _get_dict(self).get(name, _MISSING)
+        object.__delattr__(self, name)
+        if _get_watchers(self) is not None:
+            self._notify(name, old, _MISSING)
+
+    def _notify(self, name, old, new):
+        """Update the indexes this Namespace is part of after the item
+        *name* changed from *old* to *new* (either may be ``_MISSING``)."""
+        # Stop telling indexes which have been dropped about changes
+        watchers = [watcher for watcher in _get_watchers(self) if watcher[0]()]
+        if not watchers:
+            _unwatch(self)
+            return
+        object.__setattr__(self, "_Namespace__watchers", watchers)
+
+        for ref, key in watchers:
+            index = ref()
+            key = name if key is None else key + "." + name
+            if old is not _MISSING:
+                index.remove(old, key)
+            if new is not _MISSING:
+                index.add(new, key)
+
     def __nonzero__(self):
-        return bool(self.__dict__)
+        return bool(self.__dict__ or _get_pending(self))
 
     def __bool__(self):
         # For Python 3
-        return bool(self.__dict__)
+        return bool(self.__dict__ or _get_pending(self))
+
+    def _load(self):
+        """Convert any pending items into attributes, keeping their order."""
+        pending = _get_pending(self)
+        if pending is None:
+            return
+
+        current = self.__dict__
+        loaded = {}
+        for name, value in pending.items():
+            if name in current:
+                # Already loaded, or assigned since
+                loaded[name] = current.pop(name)
+            else:
+                _check_name(type(self), name)
+                loaded[name] = self._adopt(value)
+        loaded.update(current)
+
+        current.clear()
+        current.update(loaded)
+        _set_pending(self, None)
+
+    def _load_item(self, name):
+        """Convert the pending item *name* into an attribute and return it."""
+        _check_name(type(self), name)
+        setattr(self, name, self._adopt(_get_pending(self)[name]))
+        return self.__getattribute__(name)
+
+    @classmethod
+    def _adopt(cls, value):
+        """Return the pending item *value* converted for storage.
+
+        Pending Namespaces are shared with another Namespace, so they become
+        shared copies of themselves, and lists are copied for the same
+        reason. Dictionaries are converted with :meth:`_wrap`.
+
+        """
+        if isinstance(value, Namespace):
+            return value.copy(shared=True)
+        if isinstance(value, dict):
+            return cls._wrap(value)
+        if isinstance(value, list):
+            if cls._records:
+                valid = _valid_names(cls._VALID_NAME)
+                records = _record_list(cls, value, valid)
+                if records is not None:
+                    return records
+            return [cls._adopt(item) for item in value]
+        if isinstance(value, RecordList):
+            return value._map(cls._adopt)
+        return value
+
+    @classmethod
+    def _wrap(cls, obj):
+        """Return the dictionary *obj* as a Namespace of this class, or as a
+        list if it is list-like.
+
+        Subclasses which populate themselves lazily override this to control
+        how dictionaries are converted.
+
+        """
+        return _coerce(cls, obj, _valid_names(cls._VALID_NAME))
 
     def iteritems(self, base_name=None):
         """Return generator which returns ``(key, value)`` tuples.
@@ -492,6 +943,15 @@ class Namespace(object):
         :param str base_name: Base namespace (optional)
 
         """
+        index = _get_index(self)
+        if index is not None:
+            for name, value in index.flat(self).items():
+                if base_name:
+                    name = base_name + "." + name
+                yield name, value
+            return
+
+        self._load()
         for name in self.__dict__.keys():
             value = getattr(self, name)
 
@@ -531,6 +991,8 @@ class Namespace(object):
                 for i in range(len(value)):
                     if isinstance(value[i], Namespace):
                         value[i] = value[i].as_dict()
+            elif isinstance(value, RecordList):
+                space[key] = [row.as_dict() for row in value]
         return space
 
     def for_json(self, base_name=None):
@@ -551,6 +1013,7 @@ class Namespace(object):
         target = {}
         obj = target if not base_name else {base_name: target}
 
+        self._load()
         for key in self.__dict__.keys():
             value = getattr(self, key)
             target[key] = value
@@ -567,6 +1030,8 @@ class Namespace(object):
                 for i in range(len(value)):
                     if isinstance(value[i], Namespace):
                         value[i] = value[i].for_json()
+            elif isinstance(value, RecordList):
+                target[key] = value.for_json()
 
         return obj
 
@@ -575,46 +1040,328 @@ class Namespace(object):
 
         :param dict obj: Dictionary object to merge into this Namespace
 
+        The dictionary is converted in a single pass: dot-notation keys are
+        expanded, list-like dictionaries are joined and nested Namespaces are
+        created as each level is reached, without building an intermediate
+        :func:`unflatten` copy of *obj*.
+
         .. versionadded:: 3.5.0
 
         """
-        obj = unflatten(obj)
-
         assert isinstance(obj, dict), "Bad Namespace value: '{!r}'".format(obj)
+        obj = _expand_keys(obj)
+        assert _list_items(obj) is None, "Bad Namespace value: '{!r}'".format(obj)
 
-        def _coerce_value(value):
-            """Helps coerce values to Namespaces recursively."""
-            if isinstance(value, dict):
-                return type(self)(value)
-            elif isinstance(value, list):
-                # We have to copy the list so we can modify in place without
-                # breaking things
-                value = copy.copy(value)
-                for i in range(len(value)):
-                    value[i] = _coerce_value(value[i])
-            return value
-
-        for key, value in obj.items():
-            assert self._VALID_NAME.match(key), "Invalid name: {!r}".format(key)
-            value = _coerce_value(value)
-            setattr(self, key, value)
+        self._load()
+        _populate(self, obj, _valid_names(type(self)._VALID_NAME))
 
     def __repr__(self):
         return "<{}({})>".format(type(self).__name__, self.as_dict())
 
-    def copy(self, *args, **kwargs):
-        """Return a copy of a Namespace by writing it to a dict and then
-        writing back to a Namespace.
+    def use_index(self, enabled=True):
+        """Enable (or disable) a cached, flattened index of this Namespace.
+
+        :param bool enabled: Whether to use the index (default ``True``)
+
+        The index maps the dot-notation keys of this Namespace to their
+        values. It is built the first time it's needed, and then used by
+        :meth:`iteritems`, :meth:`as_dict`, ``repr()`` and ``in`` checks
+        instead of walking the whole Namespace each time. This is useful
+        for large Namespaces which are read, iterated or dumped much more
+        often than they are changed.
+
+        Assigning or deleting attributes (or :class:`Keyspace` items)
+        anywhere in this Namespace only updates the part of the index for
+        the subtree that changed. Other changes, such as modifying lists in
+        place, aren't tracked, and descriptor values are read when they are
+        indexed. Keys which are changed move to the end of the index order.
+
+        Example::
+
+            config.use_index()
+            config.as_dict()  # Builds the index
+            config.server.port = 8080  # Only updates 'server.port'
+            'server.port' in config  # A single lookup
+
+        """
+        if not enabled:
+            index = _get_index(self)
+            object.__setattr__(self, "_Namespace__index", None)
+            if index is not None and index.items is not None:
+                # Stop the Namespaces in it from telling it about changes
+                index.remove(self, None)
+        elif _get_index(self) is None:
+            object.__setattr__(self, "_Namespace__index", _FlatIndex())
 
-        Arguments to this method are ignored.
+    def copy(self, *args, shared=False, **kwargs):
+        """Return a deep copy of a Namespace.
+
+        :param bool shared: Return a copy-on-write copy (default ``False``)
+
+        A shared copy starts out sharing all of its nested Namespaces and
+        lists with this Namespace. Each item is only copied, one level deep,
+        the first time it is accessed through the copy, so making a shared
+        copy and changing a few values in it costs time proportional to the
+        depth of the changes rather than the size of the Namespace. Changes
+        made through the copy never affect this Namespace.
+
+        This Namespace should be treated as read-only while it has shared
+        copies, since changes made to it may show up in the parts of the
+        copies which haven't been accessed yet.
+
+        Other arguments to this method are ignored.
+
+        Example::
+
+            overlay = config.copy(shared=True)
+            overlay.server.port = 8080  # Only copies config and server
+            config.server.port  # Unchanged
+
+        """
+        if not shared:
+            return _clone(type(self), self)
+
+        space = type(self)()
+        _set_pending(space, self._raw_items())
+        return space
+
+    def _raw_items(self):
+        """Return a new dictionary of this Namespace's items, including any
+        pending items as they are, in the order :meth:`_load` would give."""
+        current = self.__dict__
+        if _get_pending(self) is None:
+            return dict(current)
+
+        items = {}
+        for name, value in _get_pending(self).items():
+            items[name] = current[name] if name in current else value
+        items.update(current)
+        return items
+
+    @classmethod
+    def merge(cls, *layers, strategy="replace"):
+        """Return a new Namespace with each of *layers* deep merged into it
+        in order, so later layers take precedence.
+
+        :param layers: Dictionaries or Namespaces to merge
+        :param str strategy: How to merge lists, see :meth:`update_deep`
+
+        Items which only come from a single layer are shared with it the
+        same way a shared :meth:`copy` is, so layers should be treated as
+        read-only while the result is in use.
+
+        Example::
+
+            config = Namespace.merge(defaults, file_config, {'debug': True})
+
+        """
+        space = cls()
+        space.update_deep(*layers, strategy=strategy)
+        return space
+
+    def update_deep(self, *layers, strategy="replace"):
+        """Deep merge each of *layers* into this Namespace in order.
+
+        :param layers: Dictionaries or Namespaces to merge
+        :param str strategy: How to merge lists, either ``"replace"``
+            (default) or ``"append"``
+
+        Nested dictionaries and Namespaces are merged into the existing
+        nested Namespaces, and any other value replaces the existing one.
+        With the ``"append"`` strategy, lists are added to the end of
+        existing lists instead of replacing them.
+
+        Dictionaries are handled the same way as :meth:`from_dict`, and
+        Namespaces from layers are added as shared copies, so each item of
+        each layer is only visited once.
+
+        Example::
+
+            config.update_deep({'server.port': 8080}, tenant_config)
 
         """
-        return type(self)(self.as_dict())
+        if strategy not in ("replace", "append"):
+            raise ValueError("Unknown merge strategy: {!r}".format(strategy))
+
+        for layer in layers:
+            items = _layer_items(layer)
+            assert items is not None, "Bad Namespace value: '{!r}'".format(layer)
+            _merge(self, items, strategy == "append")
 
     # Aliases for the stdlib copy module
     __copy__ = copy
     __deepcopy__ = copy
 
+    def __reduce__(self):
+        return (copyreg.__newobj__, (type(self),), self.__getstate__())
+
+    def __getstate__(self):
+        """Return the items of this Namespace, and of all the nested
+        Namespaces of the same type, as one flat list for pickling.
+
+        Nested Namespaces of the same type are written into the same list
+        instead of as separate objects, and Namespaces with the same item
+        names share them, so pickling large Namespaces is faster and
+        smaller. Indexes aren't kept.
+
+        """
+        return _dump_state(self)
+
+    def __setstate__(self, state):
+        _load_state(self, state)
+
+    def to_bytes(self):
+        """Return this Namespace as compact binary data, which can be read
+        with :meth:`from_bytes`.
+
+        Values can be ``None``, booleans, integers, floats, strings, bytes,
+        lists, tuples, dictionaries with string keys, Namespaces and
+        :class:`RecordList` instances. Any other value raises a
+        :exc:`TypeError`.
+
+        Nested Namespaces are read back using the class :meth:`from_bytes`
+        is called on, and descriptors aren't supported, so use pickle for
+        anything which needs those kept.
+
+        Example::
+
+            data = config.to_bytes()
+            config = Namespace.from_bytes(data)
+
+        """
+        chunks = [_BINARY_HEADER]
+        _dump_binary(self, chunks, {})
+        return b"".join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Return a new Namespace from binary data given by :meth:`to_bytes`.
+
+        :param bytes data: Binary data
+        :raises ValueError: If *data* isn't valid
+
+        """
+        data = memoryview(data)
+        if data[: len(_BINARY_HEADER)] != _BINARY_HEADER:
+            raise ValueError("Bad Namespace data: unknown header")
+        try:
+            space, offset = _load_binary(cls, data, len(_BINARY_HEADER), [])
+        except (struct.error, IndexError, KeyError, UnicodeDecodeError) as err:
+            raise ValueError("Bad Namespace data: {}".format(err))
+        if offset != len(data) or not isinstance(space, cls):
+            raise ValueError("Bad Namespace data: unexpected content")
+        return space
+
+    def diff(self, other):
+        """Return a list of operations which turn this Namespace into
+        *other* when given to :meth:`apply_patch`.
+
+        :param other: Namespace (or dictionary) to compare with
+        :returns: List of ``("set", key, value)`` and ``("delete", key)``
+            tuples, where *key* is a dot-notation key
+
+        Nested Namespaces, dictionaries and lists are compared item by item,
+        and any other values are compared with ``==``. Subtrees which are the
+        same object in both, such as the untouched parts of a shared
+        :meth:`copy`, are skipped without being compared, so diffing two
+        mostly shared Namespaces only costs as much as the parts which were
+        changed.
+
+        Keys containing dots (from a :class:`Keyspace`) can't be told apart
+        from nested keys.
+
+        Example::
+
+            new = config.copy(shared=True)
+            new.server.port = 8080
+            config.diff(new)  # [('set', 'server.port', 8080)]
+
+        """
+        items = _layer_items(other)
+        assert items is not None, "Bad Namespace value: '{!r}'".format(other)
+
+        ops = []
+        _diff(self._raw_items(), items, None, ops)
+        return ops
+
+    def apply_patch(self, ops):
+        """Apply the operations from :meth:`diff` to this Namespace.
+
+        :param ops: Iterable of ``("set", key, value)`` and
+            ``("delete", key)`` tuples
+
+        Values are added the same way as with :meth:`update_deep`, and
+        deleting a key which doesn't exist does nothing.
+
+        Example::
+
+            worker_config.apply_patch(config.diff(new_config))
+
+        """
+        for op in ops:
+            path = op[1].split(".")
+            key = path.pop()
+
+            if op[0] == "set":
+                parent = self._patch_parent(path, True)
+                if isinstance(parent, Namespace):
+                    setattr(parent, key, type(parent)._adopt(op[2]))
+                else:
+                    parent[key] = op[2]
+            elif op[0] == "delete":
+                parent = self._patch_parent(path, False)
+                if isinstance(parent, Namespace):
+                    if _has_item(parent, key):
+                        delattr(parent, key)
+                elif parent is not None:
+                    parent.pop(key, None)
+            else:
+                raise ValueError("Unknown patch operation: {!r}".format(op[0]))
+
+    def _patch_parent(self, path, create):
+        """Return the item at *path* for :meth:`apply_patch`.
+
+        Missing Namespaces along *path* are added if *create* is true, and
+        otherwise ``None`` is returned. This doesn't rely on reading missing
+        items to add them, since subclasses may turn that off.
+
+        """
+        parent = self
+        for key in path:
+            if isinstance(parent, Namespace):
+                if not _has_item(parent, key):
+                    if not create:
+                        return None
+                    setattr(parent, key, type(parent)())
+                parent = getattr(parent, key)
+            else:
+                parent = Namespace.traverse(parent, [key])
+        return parent
+
+    def prune(self):
+        """Remove any empty nested Namespaces, such as the ones created by
+        reading items which weren't set.
+
+        Namespaces in lists are pruned too, but not removed from the lists.
+
+        Example::
+
+            if config.feature.flag:  # Creates config.feature
+                pass
+            config.prune()
+            'feature' in config.__dict__  # False
+
+        """
+        for name, value in list(self.__dict__.items()):
+            if isinstance(value, Namespace):
+                value.prune()
+                if not value:
+                    delattr(self, name)
+            elif isinstance(value, list):
+                _prune_list(value)
+            elif isinstance(value, RecordList):
+                _prune_list(value._rows)
+
     def traverse(self, path):
         """Traverse the Namespace and any nested elements by following the
         elements in an iterable *path* and return the item found at the end
@@ -650,6 +1397,85 @@ class Namespace(object):
                     raise err
         return ns
 
+    @staticmethod
+    def compile_path(path):
+        """Return a callable which traverses the Namespace (or other
+        traversable object) it's called with along *path* and returns the
+        item found at the end, the same as :meth:`traverse` would.
+
+        The path is parsed once, so the callable is much cheaper than using
+        dot-notation keys when the same path is read from many Namespaces or
+        many times.
+
+        :param path: A dot-notation string, or an iterable of keys
+        :returns: Callable taking a Namespace
+
+        Example usage::
+
+            get_name = Namespace.compile_path("foo.1.name")
+            get_name(ns)  # The same as ns["foo.1.name"]
+
+        """
+        if isinstance(path, str):
+            return _compiled_path(path)
+        return _CompiledPath(path)
+
+    @staticmethod
+    def getter(*paths):
+        """Return a callable which reads *paths* from the Namespace it's
+        called with, like :func:`operator.attrgetter`.
+
+        If one path is given the callable returns its value, otherwise it
+        returns a tuple of values in the same order as *paths*.
+
+        :param paths: Dot-notation strings, or iterables of keys
+        :returns: Callable taking a Namespace
+
+        Example usage::
+
+            get_server = Namespace.getter("server.host", "server.port")
+            host, port = get_server(config)
+
+        """
+        if len(paths) == 1:
+            return Namespace.compile_path(paths[0])
+
+        accessors = tuple(Namespace.compile_path(path) for path in paths)
+
+        def getter(obj):
+            return tuple([accessor(obj) for accessor in accessors])
+
+        return getter
+
+    def get_many(self, paths, default=UNSET, as_dict=False):
+        """Return the values at each of the dot-notation *paths*.
+
+        :param paths: Iterable of dot-notation strings
+        :param default: Value for paths which don't exist (default
+            :class:`UNSET`)
+        :param bool as_dict: Return a dictionary keyed by path instead of a
+            tuple (default ``False``)
+        :returns: Tuple of values in the same order as *paths*, or a
+            dictionary
+
+        Paths are grouped by their common prefixes, so each shared prefix
+        is only walked once. Unlike reading attributes, looking up paths
+        which don't exist never creates empty nested Namespaces.
+
+        Example::
+
+            host, port, debug = config.get_many(
+                ["server.host", "server.port", "app.debug"], default=None
+            )
+
+        """
+        paths = tuple(paths)
+        results = [default] * len(paths)
+        _get_tree(self, _path_tree(paths), results)
+        if as_dict:
+            return dict(zip(paths, results))
+        return tuple(results)
+
 
 class Keyspace(Namespace):
     """
@@ -680,156 +1506,2895 @@ class Keyspace(Namespace):
         super(Keyspace, self).__init__(obj)
 
     def __setitem__(self, key, value):
-        self.__dict__[key] = value
+        _check_writable(self, key)
+        items = _get_dict(self)
+        old = items.get(key, _MISSING)
+        items[key] = value
+        if _get_watchers(self):
+            self._notify(key, old, value)
 
 
-def _split_keys(obj):
+class CompactKeyspace(object):
     """
-    Return a generator that yields 2-tuples of lists representing dot-notation
-    keys split on the dots, and their values in *obj*.
+    Keyspace which keeps its whole tree in nested plain dictionaries, instead
+    of using a Keyspace object for every level. This takes around half the
+    memory of a :class:`Keyspace` when there are a lot of nested levels,
+    such as feature maps for millions of users.
+
+    Nested levels are returned as lightweight CompactKeyspace views of the
+    same tree, which are created as they're read. Reading, assigning and
+    deleting items and attributes, dot-notation keys, ``in`` checks,
+    iteration, :meth:`as_dict`, :meth:`for_json`, :meth:`from_dict`,
+    :meth:`copy` and :meth:`traverse` all work the same as with a Keyspace.
+    Other Namespace features, like indexes and the descriptor protocol,
+    aren't supported.
 
     Example::
 
-        {'foo.bar': 0, 'foo.spam': 1, 'parrot': 2}
-
-        ... yields ...
+        from pytool.lang import CompactKeyspace
 
-        (['foo', 'bar'], 0)
-        (['foo', 'spam'], 1)
-        (['parrot'], 2)
+        features = CompactKeyspace()
+        features['user-1']['new-ui'] = True
+        features['user-1.new-ui']  # True
+        features.as_dict()  # {'user-1.new-ui': True}
 
     """
-    assert isinstance(obj, dict)
 
-    for key, value in obj.items():
-        if not isinstance(key, str):
-            yield [key], value
-        else:
-            yield key.split("."), value
+    __slots__ = ("_node",)
 
+    def __init__(self, obj=None):
+        object.__setattr__(self, "_node", _KeyspaceNode())
+        if obj is not None:
+            self.from_dict(obj)
 
-def _unflatten(obj):
-    """
-    Return *obj* having dot-notation keys unflattened.
+    @classmethod
+    def _view(cls, node):
+        """Return a new CompactKeyspace for the tree *node*."""
+        view = cls.__new__(cls)
+        object.__setattr__(view, "_node", node)
+        return view
 
-    :param obj: Arbitrary object (preferably a dict) to unflatten
+    def __getitem__(self, key):
+        if isinstance(key, str) and "." in key:
+            return self.traverse(key.split("."))
 
-    """
-    # Check if we have something other than a dict
-    if not isinstance(obj, dict):
-        # If it's a list, we return after _unflattening the list items
-        if isinstance(obj, list):
-            return [_unflatten(v) for v in obj]
-        # If it's anything else we just return the value
-        return obj
+        node = self._node
+        try:
+            value = node[key]
+        except KeyError:
+            # Allow implicit nested levels, the same as a Keyspace
+            value = node[key] = _KeyspaceNode()
 
-    # Create the new unflattened dict... could mutate but that'd get messy
-    expanded = {}
+        if type(value) is _KeyspaceNode:
+            return self._view(value)
+        return value
 
-    # Iterate over our object's keys, looking for dot notation
-    for key, value in _split_keys(obj):
-        # If there's a single item, then it's a simple key and we recurse
-        if len(key) == 1:
-            key = key[0]
-            expanded[key] = _unflatten(value)
-            continue
+    def __getattr__(self, name):
+        # Don't create items for special method lookups, like copy's
+        if name.startswith("__") and name.endswith("__"):
+            raise AttributeError(name)
+        return self.__getitem__(name)
 
-        # Set the top level dict so we can walk down into it
-        current = expanded
+    def __setitem__(self, key, value):
+        if isinstance(value, CompactKeyspace):
+            # Keep the same tree, the same way a Keyspace keeps the object
+            value = value._node
+        self._node[key] = value
 
-        # Get our ending index for the split key, so we know when to assign a
-        # value instead of iterating again
-        end = len(key) - 1
+    __setattr__ = __setitem__
 
-        # Iterate over the key parts, walking down the dict tree
-        for i in range(len(key)):
-            # Get the part of the key
-            part = key[i]
+    def __delitem__(self, key):
+        del self._node[key]
 
-            # If the part is not in the current walk level ...
-            if part not in current:
-                # We check if we're at the end, and recursively assign a value
-                if i == end:
-                    current[part] = _unflatten(value)
-                    break
+    def __delattr__(self, name):
+        try:
+            del self._node[name]
+        except KeyError:
+            raise AttributeError(name)
 
-                # Or create a new walk level and continue
-                current[part] = {}
+    def __contains__(self, name):
+        value = self._node
+        names = name.split(".")
+        for i, key in enumerate(names):
+            if type(value) is not _KeyspaceNode:
+                if isinstance(value, (Namespace, CompactKeyspace)):
+                    return ".".join(names[i:]) in value
+                return False
+            if key not in value:
+                return False
+            value = value[key]
 
-            # If we get here, something went very wrong
-            if i == end:
-                raise ValueError("Value already assigned")
+        if type(value) is _KeyspaceNode:
+            return bool(value)
+        return True
 
-            # Continue walking down the key parts
-            current = current[part]
+    def __iter__(self):
+        return self.iteritems()
 
-    return expanded
+    def __bool__(self):
+        return bool(self._node)
 
+    def __repr__(self):
+        return "<{}({})>".format(type(self).__name__, self.as_dict())
 
-def _join_lists(obj):
-    """
-    Return *obj* with list-like dictionary objects converted to actual lists.
+    def __getstate__(self):
+        return self._node
 
-    :param obj: Arbitrary object
+    def __setstate__(self, state):
+        object.__setattr__(self, "_node", state)
 
-    Example::
+    def iteritems(self, base_name=None):
+        """Return generator which returns ``(key, value)`` tuples.
 
-        {'0': 'apple', '1': 'pear', '2': 'orange'}
+        :param str base_name: Base namespace (optional)
+
+        """
+        stack = [(base_name, iter(self._node.items()))]
+        while stack:
+            prefix, items = stack[-1]
+            for name, value in items:
+                if prefix:
+                    name = prefix + "." + name
+                if type(value) is _KeyspaceNode:
+                    # Walk the nested level, then carry on with this one
+                    stack.append((name, iter(value.items())))
+                    break
+                if isinstance(value, (Namespace, CompactKeyspace)):
+                    yield from value.iteritems(name)
+                else:
+                    yield name, value
+            else:
+                stack.pop()
+
+    def items(self, base_name=None):
+        """Return generator which returns ``(key, value)`` tuples.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        return self.iteritems(base_name)
+
+    def as_dict(self, base_name=None):
+        """Return the current keyspace as a dictionary of dot-notation keys.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        space = dict(self.iteritems(base_name))
+        for key, value in space.items():
+            if isinstance(value, list):
+                space[key] = [
+                    item.as_dict()
+                    if isinstance(item, (Namespace, CompactKeyspace))
+                    else item
+                    for item in value
+                ]
+        return space
+
+    def for_json(self, base_name=None):
+        """Return the current keyspace as a JSON suitable nested dictionary.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        target = _compact_json(self._node)
+        return target if not base_name else {base_name: target}
+
+    def from_dict(self, obj):
+        """Populate this keyspace from the given *obj* dictionary, expanding
+        dot-notation keys and list-like dictionaries the same way
+        :meth:`Namespace.from_dict` does.
+
+        :param dict obj: Dictionary to populate from
+
+        """
+        assert isinstance(obj, dict), "Bad Namespace value: '{!r}'".format(obj)
+        obj = _expand_keys(obj)
+        assert _list_items(obj) is None, "Bad Namespace value: '{!r}'".format(obj)
+
+        node = self._node
+        for key, value in obj.items():
+            node[key] = _compact_value(type(self), value)
+
+    def copy(self, *args, **kwargs):
+        """Return a deep copy of this keyspace. Arguments are ignored."""
+        return self._view(_compact_copy(self._node))
+
+    __copy__ = copy
+    __deepcopy__ = copy
+
+    traverse = Namespace.traverse
+
+
+class _KeyspaceNode(dict):
+    """Nested level of a :class:`CompactKeyspace`, which tells it apart from
+    dictionary values."""
+
+    __slots__ = ()
+
+
+def _compact_value(cls, value):
+    """
+    Return *value* converted for storage in a :class:`CompactKeyspace`, with
+    dictionaries becoming nested levels (or lists, if they are list-like) and
+    lists being copied with their dictionaries becoming *cls* instances.
+
+    :param type cls: CompactKeyspace class to create in lists
+    :param value: Value to convert
+
+    """
+    if isinstance(value, dict):
+        value = _expand_keys(value)
+        items = _list_items(value)
+        if items is None:
+            node = _KeyspaceNode()
+            for key, item in value.items():
+                node[key] = _compact_value(cls, item)
+            return node
+        value = items
+    elif not isinstance(value, list):
+        return value
+
+    converted = []
+    for item in value:
+        item = _compact_value(cls, item)
+        if type(item) is _KeyspaceNode:
+            item = cls._view(item)
+        converted.append(item)
+    return converted
+
+
+def _compact_json(value):
+    """
+    Return a JSON suitable copy of *value*, a :class:`CompactKeyspace` tree
+    node or one of its values.
+
+    :param value: Value to convert
+
+    """
+    if type(value) is _KeyspaceNode:
+        return {key: _compact_json(item) for key, item in value.items()}
+    if isinstance(value, (Namespace, CompactKeyspace)):
+        return value.for_json()
+    if isinstance(value, list):
+        return [_compact_json(item) for item in value]
+    return value
+
+
+def _compact_copy(value):
+    """
+    Return a deep copy of *value*, a :class:`CompactKeyspace` tree node or
+    one of its values, copying nested levels, Namespaces and lists.
+
+    :param value: Value to copy
+
+    """
+    if type(value) is _KeyspaceNode:
+        node = _KeyspaceNode()
+        for key, item in value.items():
+            node[key] = _compact_copy(item)
+        return node
+    if isinstance(value, (Namespace, CompactKeyspace)):
+        return value.copy()
+    if isinstance(value, list):
+        return [_compact_copy(item) for item in value]
+    return value
+
+
+class LazyNamespace(Namespace):
+    """
+    Namespace which wraps a (nested) dictionary without converting it up
+    front. Each level keeps a reference to the original dictionary, and only
+    converts an item into a child LazyNamespace or list when it is first
+    accessed, after which it is kept like any other attribute.
+
+    This is useful when only a handful of keys are read out of a large
+    document, since the parts that are never read are never copied.
+
+    Example::
+
+        from pytool.lang import LazyNamespace
+
+        doc = {'foo': {'bar': 1}, 'items': [{'name': 'one'}], ...}
+        ns = LazyNamespace(doc)
+        ns.foo.bar  # Only 'foo' has been converted
+        ns['items.0.name']  # Now 'items' and its first item have been too
+
+    Dot-notation keys and list-like dictionaries are handled the same way as
+    with a :class:`Namespace`, one level at a time. Invalid key names are
+    reported when the item is first accessed rather than on creation.
+
+    Iterating over a LazyNamespace, or converting it with :meth:`as_dict` or
+    :meth:`for_json`, converts all of it.
+
+    The wrapped dictionary is never modified, but changes made to it after it
+    has been wrapped may show up in the parts that haven't been accessed yet.
+
+    """
+
+    def from_dict(self, obj):
+        """Wrap the given *obj* dictionary in this LazyNamespace.
+
+        :param dict obj: Dictionary object to merge into this Namespace
+
+        """
+        assert isinstance(obj, dict), "Bad Namespace value: '{!r}'".format(obj)
+        obj = _expand_keys(obj)
+        assert _list_items(obj) is None, "Bad Namespace value: '{!r}'".format(obj)
+
+        if not self and not _get_watchers(self):
+            _set_pending(self, obj)
+            return
+
+        # Merging into existing items, so convert just this level right away
+        self._load()
+        for name, value in obj.items():
+            _check_name(type(self), name)
+            setattr(self, name, self._adopt(value))
+
+    @classmethod
+    def _wrap(cls, obj):
+        obj = _expand_keys(obj)
+        items = _list_items(obj)
+        if items is not None:
+            return [cls._adopt(item) for item in items]
+
+        space = cls()
+        _set_pending(space, obj)
+        return space
+
+
+class FastNamespace(Namespace):
+    """
+    Namespace which doesn't implement the descriptor protocol for its items,
+    so reading an attribute costs the same as it does on a plain object
+    instead of going through :meth:`Namespace.__getattribute__`.
+
+    Everything else works the same as a :class:`Namespace`, and nested
+    Namespaces created from a FastNamespace are FastNamespaces too.
+
+    Example::
+
+        from pytool.lang import FastNamespace
+
+        ns = FastNamespace({'foo': {'bar': 1}})
+        ns.foo.bar  # As fast as a normal attribute
+
+        ns.descriptor = MyDescriptor()
+        ns.descriptor  # The MyDescriptor instance, not its __get__ value
+
+    """
+
+    _descriptors = False
+
+    __slots__ = ()
+
+    __getattribute__ = object.__getattribute__
+
+
+class StrictNamespace(Namespace):
+    """
+    Namespace which doesn't create nested Namespaces when missing items are
+    read. Reading a missing item returns a shared, empty Namespace which
+    can't be changed instead, so checking for optional items never adds
+    anything to the Namespace.
+
+    Nested Namespaces created from a StrictNamespace are StrictNamespaces
+    too. Other Namespace classes can get the same behavior by setting
+    ``_vivify = False`` in a subclass.
+
+    Example::
+
+        from pytool.lang import StrictNamespace
+
+        ns = StrictNamespace({'foo': {'bar': 1}})
+        ns.feature.flag  # An empty Namespace, and ns is unchanged
+        bool(ns.feature)  # False
+        ns.feature.flag = True  # Raises AttributeError
+
+        ns.update_deep({'feature.flag': True})  # Set items directly instead
+
+    """
+
+    _vivify = False
+
+    __slots__ = ()
+
+
+class _EmptyNamespace(Namespace):
+    """Shared, immutable empty Namespace which is returned for missing items
+    when ``_vivify`` is turned off."""
+
+    _vivify = False
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        # Slots are set in __new__ without going through this
+        raise AttributeError("Can't set {!r} on a missing Namespace item".format(name))
+
+    def __delattr__(self, name):
+        raise AttributeError(
+            "Can't delete {!r} from a missing Namespace item".format(name)
+        )
+
+    def from_dict(self, obj):
+        raise AttributeError("Can't set items on a missing Namespace item")
+
+    def use_index(self, enabled=True):
+        raise AttributeError("Can't index a missing Namespace item")
+
+    def __reduce__(self):
+        return "_EMPTY"
+
+
+_EMPTY = _EmptyNamespace()
+object.__setattr__(_EMPTY, "_Namespace__frozen", True)
+
+
+class RecordNamespace(Namespace):
+    """
+    Namespace which stores lists of dictionaries that all have the same keys,
+    such as the rows of an API result, as a :class:`RecordList` instead of
+    as a list of separate Namespaces. The keys are kept once for the whole
+    list and each row only keeps a list of its values, which takes several
+    times less memory than giving every row its own ``__dict__``.
+
+    Lists with fewer than two items, or with items which aren't all
+    dictionaries with the same keys, are stored as normal lists. Nested
+    Namespaces created from a RecordNamespace are RecordNamespaces too.
+    Other Namespace classes can get the same behavior by setting
+    ``_records = True`` in a subclass.
+
+    Example::
+
+        from pytool.lang import RecordNamespace
+
+        ns = RecordNamespace({'users': [{'id': 1, 'name': 'one'},
+                                        {'id': 2, 'name': 'two'}]})
+        ns.users[1].name  # 'two'
+        ns['users.1.name']  # 'two'
+        ns.users[0].name = 'first'
+        ns.for_json()  # {'users': [{'id': 1, 'name': 'first'}, ...]}
+
+    """
+
+    _records = True
+
+    __slots__ = ()
+
+
+class RecordList(object):
+    """
+    List of rows which all share one tuple of keys, which is how a
+    :class:`RecordNamespace` stores lists of dictionaries with the same keys.
+
+    Each row is kept as a list of its values in key order, and is read
+    through a :class:`RecordRow` view. Indexing, iteration, ``len()``,
+    :meth:`append`, :meth:`insert`, :meth:`extend`, :meth:`pop`, ``+`` and
+    assigning or deleting items work the same as with a list of Namespaces,
+    and slices are new RecordLists with copies of the rows.
+
+    Rows can be added as dictionaries, Namespaces or RecordRows. Keys which
+    aren't in the list yet are added to it, and rows which don't have them
+    are left without them. Any other value raises a :exc:`TypeError`.
+
+    :param rows: Rows to add (optional)
+    :param type namespace: Namespace class for nested dictionaries in rows
+        (default :class:`RecordNamespace`)
+
+    Example::
+
+        from pytool.lang import RecordList
+
+        users = RecordList([{'id': 1, 'name': 'one'}])
+        users.append({'id': 2, 'name': 'two', 'admin': True})
+        users[1].admin  # True
+        'admin' in users[0]  # False
+
+    """
+
+    __slots__ = ("_cls", "_keys", "_positions", "_rows")
+
+    def __init__(self, rows=(), namespace=RecordNamespace):
+        self._cls = namespace
+        self._keys = ()
+        self._positions = {}
+        self._rows = []
+        self.extend(rows)
+
+    @classmethod
+    def _new(cls, namespace, keys, rows):
+        """Return a new RecordList of the value lists *rows*, which are in
+        the order of *keys*."""
+        records = cls.__new__(cls)
+        records._cls = namespace
+        records._keys = keys
+        records._positions = {key: i for i, key in enumerate(keys)}
+        records._rows = rows
+        return records
+
+    def _map(self, func=None):
+        """Return a new RecordList with copies of the rows, with *func*
+        applied to each value if it's given."""
+        if func is None:
+            rows = [list(values) for values in self._rows]
+        else:
+            rows = [list(map(func, values)) for values in self._rows]
+        return self._new(self._cls, self._keys, rows)
+
+    def _add_key(self, name):
+        """Add the key *name* to the list, and return its position."""
+        _check_name(self._cls, name)
+        position = len(self._keys)
+        self._keys += (name,)
+        self._positions[name] = position
+        for values in self._rows:
+            values.append(_ABSENT)
+        return position
+
+    def _row(self, item):
+        """Return the values of the row *item* in key order, adding any keys
+        it has which aren't in the list yet."""
+        if isinstance(item, RecordRow):
+            items = dict(item._present())
+        elif isinstance(item, Namespace):
+            item._load()
+            items = item.__dict__
+        elif isinstance(item, dict):
+            items = _expand_keys(item)
+            if _list_items(items) is not None:
+                raise TypeError("Can't add a list to a RecordList")
+            valid = _valid_names(self._cls._VALID_NAME)
+            items = {
+                name: _coerce(self._cls, value, valid)
+                if isinstance(value, (dict, list))
+                else value
+                for name, value in items.items()
+            }
+        else:
+            raise TypeError("Can't add {!r} to a RecordList".format(item))
+
+        positions = self._positions
+        values = [_ABSENT] * len(self._keys)
+        for name, value in items.items():
+            position = positions.get(name)
+            if position is None:
+                position = self._add_key(name)
+                values.append(_ABSENT)
+            values[position] = value
+        return values
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._new(
+                self._cls, self._keys, [list(values) for values in self._rows[index]]
+            )
+        return RecordRow._view(self, self._rows[index])
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            self._rows[index] = [self._row(row) for row in item]
+        else:
+            self._rows[index] = self._row(item)
+
+    def __delitem__(self, index):
+        del self._rows[index]
+
+    def __iter__(self):
+        view = RecordRow._view
+        for values in self._rows:
+            yield view(self, values)
+
+    def __eq__(self, other):
+        if not isinstance(other, RecordList):
+            return NotImplemented
+        return self.for_json() == other.for_json()
+
+    __hash__ = None
+
+    def __add__(self, other):
+        records = self._map()
+        try:
+            records.extend(other)
+        except TypeError:
+            return list(self) + list(other)
+        return records
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return "<{}({})>".format(type(self).__name__, [row.as_dict() for row in self])
+
+    def __getstate__(self):
+        return self._cls, self._keys, self._rows
+
+    def __setstate__(self, state):
+        namespace, keys, rows = state
+        self._cls = namespace
+        self._keys = keys
+        self._positions = {key: i for i, key in enumerate(keys)}
+        self._rows = rows
+
+    def append(self, item):
+        """Add the row *item* to the end of the list."""
+        self._rows.append(self._row(item))
+
+    def insert(self, index, item):
+        """Insert the row *item* before *index*."""
+        self._rows.insert(index, self._row(item))
+
+    def extend(self, items):
+        """Add each of the rows in *items* to the end of the list."""
+        for item in items:
+            self.append(item)
+
+    def pop(self, index=-1):
+        """Remove and return the row at *index* (default last)."""
+        return RecordRow._view(self, self._rows.pop(index))
+
+    def for_json(self):
+        """Return the rows as a JSON suitable list of dictionaries."""
+        keys = self._keys
+        return [_record_json(keys, values) for values in self._rows]
+
+    def copy(self, *args, **kwargs):
+        """Return a deep copy of this list. Arguments are ignored."""
+        cls = self._cls
+        return self._map(lambda value: _clone(cls, value))
+
+    __copy__ = copy
+    __deepcopy__ = copy
+
+
+class RecordRow(object):
+    """
+    View of one row of a :class:`RecordList`, which reads and writes the
+    row's values the same way a :class:`Namespace` reads and writes items.
+
+    Attribute and item access, dot-notation keys, ``in`` checks, iteration,
+    :meth:`as_dict`, :meth:`for_json` and :meth:`traverse` all work the same
+    as with a Namespace, and keys take precedence over method names when
+    read as attributes. Assigning a key the row doesn't have adds it to the
+    whole list. Reading a missing key returns an empty Namespace instead of
+    creating it, the same as a :class:`StrictNamespace` does, and the
+    descriptor protocol isn't supported.
+
+    Views are created as rows are read, so reading the same row twice gives
+    two RecordRow objects, which compare equal.
+
+    """
+
+    __slots__ = ("_records", "_values")
+
+    @classmethod
+    def _view(cls, records, values):
+        """Return a new RecordRow for the *values* of a row of *records*."""
+        row = _new_row(cls)
+        _set_records(row, records)
+        _set_values(row, values)
+        return row
+
+    def _get(self, name):
+        """Return the value of *name*, or ``_ABSENT`` if it isn't set."""
+        position = _get_records(self)._positions.get(name)
+        values = _get_values(self)
+        if position is None or position >= len(values):
+            return _ABSENT
+        return values[position]
+
+    def _present(self):
+        """Return ``(key, value)`` tuples for the values which are set."""
+        return [
+            (name, value)
+            for name, value in zip(_get_records(self)._keys, _get_values(self))
+            if value is not _ABSENT
+        ]
+
+    def __getattribute__(self, name):
+        position = _get_records(self)._positions.get(name)
+        if position is not None:
+            values = _get_values(self)
+            if position < len(values) and values[position] is not _ABSENT:
+                return values[position]
+        return object.__getattribute__(self, name)
+
+    def __getattr__(self, name):
+        # Don't pretend to have special methods, like copy's
+        if name.startswith("__") and name.endswith("__"):
+            raise AttributeError(name)
+        return _EMPTY
+
+    def __setattr__(self, name, value):
+        records = _get_records(self)
+        position = records._positions.get(name)
+        if position is None:
+            position = records._add_key(name)
+
+        # Rows which were removed from the list miss out on new keys
+        values = _get_values(self)
+        if position >= len(values):
+            values.extend([_ABSENT] * (position + 1 - len(values)))
+        values[position] = value
+
+    def __delattr__(self, name):
+        if self._get(name) is _ABSENT:
+            raise AttributeError(name)
+        _get_values(self)[_get_records(self)._positions[name]] = _ABSENT
+
+    def __getitem__(self, key):
+        if isinstance(key, str) and "." in key:
+            return _compiled_path(key)(self)
+        return getattr(self, key)
+
+    def __contains__(self, name):
+        names = name.split(".")
+        obj = self
+        for i, name in enumerate(names):
+            if isinstance(obj, Namespace):
+                return ".".join(names[i:]) in obj
+            if not isinstance(obj, RecordRow):
+                return False
+            obj = obj._get(name)
+            if obj is _ABSENT:
+                return False
+
+        if isinstance(obj, Namespace):
+            return bool(obj)
+        return True
+
+    def __iter__(self):
+        return self.iteritems()
+
+    def __bool__(self):
+        return bool(self._present())
+
+    def __eq__(self, other):
+        if not isinstance(other, RecordRow):
+            return NotImplemented
+        return _get_values(self) is _get_values(other)
+
+    def __hash__(self):
+        return hash(id(_get_values(self)))
+
+    def __repr__(self):
+        return "<{}({})>".format(type(self).__name__, self.as_dict())
+
+    def __getstate__(self):
+        return _get_records(self), _get_values(self)
+
+    def __setstate__(self, state):
+        _set_records(self, state[0])
+        _set_values(self, state[1])
+
+    def iteritems(self, base_name=None):
+        """Return generator which returns ``(key, value)`` tuples.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        prefix = base_name + "." if base_name else ""
+        for name, value in self._present():
+            if isinstance(value, (Namespace, RecordRow)):
+                yield from value.iteritems(prefix + name)
+            else:
+                yield prefix + name, value
+
+    def items(self, base_name=None):
+        """Return generator which returns ``(key, value)`` tuples.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        return self.iteritems(base_name)
+
+    def as_dict(self, base_name=None):
+        """Return the row as a dictionary of dot-notation keys.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        space = dict(self.iteritems(base_name))
+        for key, value in space.items():
+            if isinstance(value, RecordList):
+                space[key] = [row.as_dict() for row in value]
+            elif isinstance(value, list):
+                space[key] = [
+                    item.as_dict() if isinstance(item, (Namespace, RecordRow)) else item
+                    for item in value
+                ]
+        return space
+
+    def for_json(self, base_name=None):
+        """Return the row as a JSON suitable nested dictionary.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        target = _record_json(_get_records(self)._keys, _get_values(self))
+        return target if not base_name else {base_name: target}
+
+    def copy(self, *args, **kwargs):
+        """Return a deep copy of this row, which isn't part of any list.
+        Arguments are ignored."""
+        records = _get_records(self)
+        values = [_clone(records._cls, value) for value in _get_values(self)]
+        return self._view(records, values)
+
+    __copy__ = copy
+    __deepcopy__ = copy
+
+    traverse = Namespace.traverse
+
+
+# Access RecordRow state without going through our attribute methods
+_new_row = object.__new__
+_get_records = RecordRow._records.__get__
+_get_values = RecordRow._values.__get__
+_set_records = RecordRow._records.__set__
+_set_values = RecordRow._values.__set__
+
+
+class _Absent(object):
+    """Marks a key which isn't set in a row of a :class:`RecordList`."""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<absent>"
+
+    def __reduce__(self):
+        return "_ABSENT"
+
+
+_ABSENT = _Absent()
+
+
+def _record_list(cls, items, valid):
+    """
+    Return the list *items* as a :class:`RecordList` for the Namespace class
+    *cls* if it has at least two items and they're all dictionaries with the
+    same keys, otherwise ``None``.
+
+    :param type cls: Namespace class to convert nested dictionaries with
+    :param list items: List to convert
+    :param set valid: Names known to match ``cls._VALID_NAME``
+
+    """
+    if len(items) < 2 or not isinstance(items[0], dict):
+        return None
+
+    first = _expand_keys(items[0])
+    keys = tuple(first)
+    if not keys or _list_items(first) is not None:
+        return None
+
+    match = cls._VALID_NAME.match
+    for key in keys:
+        if key not in valid:
+            # Leave reporting bad names to the normal conversion
+            if not isinstance(key, str) or not match(key):
+                return None
+            valid.add(key)
+
+    # Check every row before converting any values. Reading the values as a
+    # tuple first means each row's list is allocated at exactly its size.
+    size = len(keys)
+    get = operator.itemgetter(*keys)
+    rows = []
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        item = _expand_keys(item)
+        if len(item) != size:
+            return None
+        try:
+            values = get(item)
+        except KeyError:
+            return None
+        rows.append(list(values) if size > 1 else [values])
+
+    for values in rows:
+        for i, value in enumerate(values):
+            if isinstance(value, (dict, list)):
+                values[i] = _coerce(cls, value, valid)
+
+    return RecordList._new(cls, keys, rows)
+
+
+def _record_json(keys, values):
+    """
+    Return a JSON suitable dictionary of the row *values* of a
+    :class:`RecordList` with the given *keys*.
+
+    :param tuple keys: Keys of the list
+    :param list values: Values of the row
+
+    """
+    target = {}
+    for name, value in zip(keys, values):
+        if value is _ABSENT:
+            continue
+        if isinstance(value, (Namespace, RecordList, RecordRow)):
+            value = value.for_json()
+        elif isinstance(value, list):
+            value = [
+                item.for_json() if isinstance(item, (Namespace, RecordRow)) else item
+                for item in value
+            ]
+        target[name] = value
+    return target
+
+
+class SchemaNamespace(object):
+    """
+    Base class for the Namespace classes created by :func:`compile_schema`.
+
+    Instances keep their fields in ``__slots__``, so they don't have a
+    ``__dict__``, don't check key names and don't implement the descriptor
+    protocol. Dot-notation keys, :meth:`traverse` and ``in`` checks work the
+    same as they do with a :class:`Namespace`, but reading a field which
+    isn't in the schema raises :exc:`AttributeError` instead of creating it.
+
+    Fields set to :class:`UNSET` are left out of :meth:`as_dict`,
+    :meth:`for_json`, iteration and ``in`` checks.
+
+    """
+
+    __slots__ = ()
+
+    # Names of the fields, in schema order
+    _fields = ()
+
+    def __init__(self, obj=None):
+        pass
+
+    def __getitem__(self, key):
+        if isinstance(key, str) and "." in key:
+            return self.traverse(key.split("."))
+        return getattr(self, key)
+
+    def __contains__(self, name):
+        names = name.split(".")
+        obj = self
+        for i, name in enumerate(names):
+            if isinstance(obj, Namespace):
+                return ".".join(names[i:]) in obj
+            if not isinstance(obj, SchemaNamespace) or name not in obj._fields:
+                return False
+            obj = getattr(obj, name)
+            if obj is UNSET:
+                return False
+
+        if isinstance(obj, Namespace):
+            return bool(obj)
+        return True
+
+    def __iter__(self):
+        return self.iteritems()
+
+    def __repr__(self):
+        return "<{}({})>".format(type(self).__name__, self.as_dict())
+
+    def __reduce__(self):
+        # Nested section classes aren't importable, so only this one is kept
+        return (type(self), (self.for_json(),))
+
+    def iteritems(self, base_name=None):
+        """Return generator which returns ``(key, value)`` tuples.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        prefix = base_name + "." if base_name else ""
+        for name in self._fields:
+            value = getattr(self, name)
+            if value is UNSET:
+                continue
+            if isinstance(value, (Namespace, SchemaNamespace)):
+                yield from value.iteritems(prefix + name)
+            else:
+                yield prefix + name, value
+
+    def items(self, base_name=None):
+        """Return generator which returns ``(key, value)`` tuples.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        return self.iteritems(base_name)
+
+    def as_dict(self, base_name=None):
+        """Return the current namespace as a dictionary.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        target = {}
+        self._flatten(target, base_name + "." if base_name else "")
+        return target
+
+    def _flatten(self, target, prefix):
+        """Add the dot-notation items of this namespace to *target*, with
+        their keys starting with *prefix*."""
+
+    def for_json(self, base_name=None):
+        """Return the current namespace as a JSON suitable nested dictionary.
+
+        :param str base_name: Base namespace (optional)
+
+        """
+        return {base_name: {}} if base_name else {}
+
+    def from_dict(self, obj):
+        """Set the fields of this namespace from the given *obj* dictionary.
+
+        Dot-notation keys are expanded, and keys which aren't fields of the
+        schema raise an :exc:`AssertionError`.
+
+        :param dict obj: Dictionary to set fields from
+
+        """
+
+    def copy(self, *args, **kwargs):
+        """Return a deep copy of this namespace. Arguments are ignored."""
+        return type(self)(self.for_json())
+
+    __copy__ = copy
+    __deepcopy__ = copy
+
+    traverse = Namespace.traverse
+
+
+def compile_schema(name, fields):
+    """
+    Return a new :class:`SchemaNamespace` class with the given *fields*.
+
+    Each field maps its name to its default value, and some values have a
+    special meaning:
+
+    * Another schema class makes the field a nested section, which defaults
+      to an instance of that class.
+    * A nested dictionary is compiled into a nested section class.
+    * A list containing just a schema class makes the field a list of those
+      sections, which defaults to an empty list.
+    * :class:`UNSET` makes the field optional. It's left out of
+      :meth:`~SchemaNamespace.as_dict`, :meth:`~SchemaNamespace.for_json`
+      and ``in`` checks until it is given a value.
+
+    Other lists, dictionaries and sets are copied for each instance, and
+    dictionaries or lists given for ordinary fields are converted the same
+    way a :class:`Namespace` would convert them.
+
+    The class keeps its fields in ``__slots__`` and has its methods
+    generated for its fields, so instances use a fraction of the memory of a
+    Namespace and are much faster to create from dictionaries.
+
+    Instances are pickled as their :meth:`~SchemaNamespace.for_json`
+    values, so the class needs to be importable from the module which
+    created it, the same as with :func:`collections.namedtuple`.
+
+    :param str name: Name of the new class
+    :param dict fields: Field names and defaults
+    :returns: New :class:`SchemaNamespace` subclass
+
+    Example::
+
+        from pytool.lang import UNSET, compile_schema
+
+        Route = compile_schema('Route', {'path': '/', 'timeout': 5})
+        Config = compile_schema('Config', {
+            'server': {'host': 'localhost', 'port': 80},
+            'routes': [Route],
+            'debug': False,
+            'name': UNSET,
+        })
+
+        config = Config({'server.port': 8080, 'routes': [{'path': '/a'}]})
+        config.server.port  # 8080
+        config.routes[0].timeout  # 5
+        config['routes.0.path']  # '/a'
+
+    """
+    try:
+        module = sys._getframe(1).f_globals.get("__name__", "__main__")
+    except (AttributeError, ValueError):
+        module = None
+    return _compile_schema(name, fields, module)
+
+
+def _compile_schema(name, fields, module):
+    """
+    Return a new :class:`SchemaNamespace` class, see :func:`compile_schema`.
+
+    :param str name: Name of the new class
+    :param dict fields: Field names and defaults
+    :param str module: Module the class belongs to, or ``None``
+
+    """
+    names = tuple(fields)
+    for field in names:
+        if not isinstance(field, str) or not field.isidentifier():
+            raise ValueError("Invalid field name: {!r}".format(field))
+        if keyword.iskeyword(field) or field.startswith("_"):
+            raise ValueError("Invalid field name: {!r}".format(field))
+        if hasattr(SchemaNamespace, field):
+            raise ValueError("Field name is reserved: {!r}".format(field))
+
+    # Values the generated code refers to, by name
+    scope = {
+        "_MISSING": _MISSING,
+        "UNSET": UNSET,
+        "_copy": copy.copy,
+        "_fields": frozenset(names),
+        "_expand": _schema_keys,
+        "_section": _schema_section,
+        "_sections": _schema_sections,
+        "_value": _schema_value,
+        "_flatten_value": _schema_flatten,
+        "_json_value": _schema_json,
+    }
+
+    # Each field is read from obj with:
+    #     value = get(key, _MISSING)
+    # then converted by its lines in convert, and set from value, or from
+    # its default expression when it's missing
+    defaults = []
+    converts = []
+    flatten = ["def _flatten(self, target, prefix):"]
+    json = ["def for_json(self, base_name=None):", "    target = {}"]
+
+    for i, field in enumerate(names):
+        default = fields[field]
+        if isinstance(default, dict):
+            default = _compile_schema(name + "_" + field, default, module)
+        key = repr(field)
+        ref = "_default_{}".format(i)
+        scope[ref] = default
+
+        if _is_schema(default):
+            # Nested section
+            defaults.append(ref + "()")
+            converts.append(
+                [
+                    "if type(value) is dict:",
+                    "    value = {}(value)".format(ref),
+                    "elif type(value) is not {}:".format(ref),
+                    "    value = _section({}, value)".format(ref),
+                ]
+            )
+            flatten.append(
+                "    self.{}._flatten(target, prefix + {!r})".format(field, field + ".")
+            )
+            json.append("    target[{}] = self.{}.for_json()".format(key, field))
+            continue
+
+        if isinstance(default, list) and len(default) == 1 and _is_schema(default[0]):
+            # List of sections
+            scope[ref] = default[0]
+            defaults.append("[]")
+            converts.append(["value = _sections({}, value)".format(ref)])
+        else:
+            # Ordinary field
+            if isinstance(default, (list, dict, set)):
+                defaults.append("_copy({})".format(ref))
+            else:
+                defaults.append(ref)
+            converts.append(
+                [
+                    "if isinstance(value, (dict, list)):",
+                    "    value = _value(value)",
+                ]
+            )
+
+        flatten.append("    value = self.{}".format(field))
+        flatten.append("    if value is not UNSET:")
+        flatten.append("        _flatten_value(target, prefix + {}, value)".format(key))
+        json.append("    value = self.{}".format(field))
+        json.append("    if value is not UNSET:")
+        json.append("        target[{}] = _json_value(value)".format(key))
+
+    init = ["def __init__(self, obj=None):", "    if obj is None:"]
+    for field, default in zip(names, defaults):
+        init.append("        self.{} = {}".format(field, default))
+    init.append("        return")
+
+    load = ["def from_dict(self, obj):"]
+    for lines in (init, load):
+        lines.append("    if type(obj) is not dict or not _fields.issuperset(obj):")
+        lines.append("        obj = _expand(obj, _fields)")
+        lines.append("    get = obj.get")
+
+    for field, default, convert in zip(names, defaults, converts):
+        read = "    value = get({!r}, _MISSING)".format(field)
+        init.append(read)
+        init.append("    if value is _MISSING:")
+        init.append("        self.{} = {}".format(field, default))
+        init.append("    else:")
+        init.extend("        " + line for line in convert)
+        init.append("        self.{} = value".format(field))
+        load.append(read)
+        load.append("    if value is not _MISSING:")
+        load.extend("        " + line for line in convert)
+        load.append("        self.{} = value".format(field))
+
+    init.append("    pass")
+    load.append("    pass")
+    flatten.append("    pass")
+    json.append("    return target if not base_name else {base_name: target}")
+
+    source = "\n".join(init + load + flatten + json) + "\n"
+    exec(source, scope)
+
+    namespace = {
+        "__slots__": names,
+        "_fields": names,
+        "__init__": scope["__init__"],
+        "from_dict": scope["from_dict"],
+        "_flatten": scope["_flatten"],
+        "for_json": scope["for_json"],
+        "__doc__": "Schema namespace with the fields {}.".format(", ".join(names)),
+    }
+    cls = type(name, (SchemaNamespace,), namespace)
+    if module is not None:
+        # Allow pickling classes created at module level, like namedtuple
+        cls.__module__ = module
+    return cls
+
+
+def _is_schema(value):
+    """Return whether *value* is a :class:`SchemaNamespace` class."""
+    return isinstance(value, type) and issubclass(value, SchemaNamespace)
+
+
+def _schema_keys(obj, fields):
+    """
+    Return the dictionary *obj* with its dot-notation keys expanded, checking
+    that all its keys are in *fields*.
+
+    :param dict obj: Dictionary given to ``from_dict``
+    :param frozenset fields: Field names of the schema
+
+    """
+    assert isinstance(obj, dict), "Bad Namespace value: '{!r}'".format(obj)
+    obj = _expand_keys(obj)
+    for key in obj:
+        assert key in fields, "Invalid name: {!r}".format(key)
+    return obj
+
+
+def _schema_section(cls, value):
+    """
+    Return *value* as an instance of the schema class *cls*.
+
+    :param type cls: Schema class of the section
+    :param value: Instance of *cls*, or a dictionary
+
+    """
+    if isinstance(value, cls):
+        return value
+    assert isinstance(value, dict), "Bad Namespace value: '{!r}'".format(value)
+    return cls(value)
+
+
+def _schema_sections(cls, value):
+    """
+    Return *value* as a list of instances of the schema class *cls*.
+
+    :param type cls: Schema class of the sections
+    :param value: List, or list-like dictionary, of sections
+
+    """
+    if isinstance(value, dict):
+        value = _list_items(_expand_keys(value))
+    assert isinstance(value, list), "Bad Namespace value: '{!r}'".format(value)
+    return [_schema_section(cls, item) for item in value]
+
+
+def _schema_value(value):
+    """
+    Return *value* converted for an ordinary schema field, with dictionaries
+    and lists converted the same way :meth:`Namespace.from_dict` would.
+
+    :param value: Value to convert
+
+    """
+    if isinstance(value, (dict, list)):
+        return _coerce(Namespace, value, _valid_names(Namespace._VALID_NAME))
+    return value
+
+
+def _schema_flatten(target, key, value):
+    """
+    Add *value* to the dot-notation dictionary *target* as *key*, the same
+    way :meth:`Namespace.as_dict` would.
+
+    :param dict target: Dictionary to add to
+    :param str key: Dot-notation key of *value*
+    :param value: Value to add
+
+    """
+    if isinstance(value, Namespace):
+        target.update(value.as_dict(key))
+    elif isinstance(value, SchemaNamespace):
+        value._flatten(target, key + ".")
+    elif isinstance(value, list):
+        target[key] = [
+            item.as_dict() if isinstance(item, (Namespace, SchemaNamespace)) else item
+            for item in value
+        ]
+    else:
+        target[key] = value
+
+
+def _schema_json(value):
+    """
+    Return *value* converted the same way :meth:`Namespace.for_json` would.
+
+    :param value: Value to convert
+
+    """
+    if isinstance(value, (Namespace, SchemaNamespace)):
+        return value.for_json()
+    if isinstance(value, list):
+        return [
+            item.for_json() if isinstance(item, (Namespace, SchemaNamespace)) else item
+            for item in value
+        ]
+    return value
+
+
+class ConfigHolder(object):
+    """
+    Holds a Namespace which can be read from many threads while it's being
+    replaced, such as configuration which is reloaded while a service runs.
+
+    Each new Namespace is built completely before it replaces the current one
+    with a single reference assignment, so readers never see a half built
+    Namespace and :meth:`snapshot` doesn't take a lock. Writers are
+    serialized with a lock. Old Namespaces are garbage collected normally
+    once nothing refers to them.
+
+    The Namespaces returned by :meth:`snapshot` are shared between threads,
+    so they're read-only, and assigning or deleting their items raises
+    :exc:`AttributeError`. Make changes with :meth:`publish` or
+    :meth:`update` instead. Reading a missing item from a snapshot returns
+    an empty Namespace rather than adding it, as with
+    :class:`StrictNamespace`, and :meth:`Namespace.copy` of a snapshot can
+    be modified as usual.
+
+    :param obj: Dictionary or Namespace to start with (optional)
+    :param type namespace: Namespace class to use (default
+        :class:`Namespace`)
+
+    Example::
+
+        from pytool.lang import ConfigHolder
+
+        config = ConfigHolder({'server': {'port': 80}})
+
+        # Reader threads get a consistent view for as long as they need it
+        snapshot = config.snapshot()
+        snapshot.server.port
+
+        # Writers build a new Namespace and swap it in
+        config.update({'server.port': 8080})
+        config.publish(load_config_file())
+
+    """
+
+    def __init__(self, obj=None, namespace=Namespace):
+        self._namespace = namespace
+        self._lock = threading.Lock()
+        self._snapshot = self._build(obj)
+
+    def _build(self, obj):
+        """Return a new snapshot Namespace from *obj*."""
+        if obj is None:
+            space = self._namespace()
+        else:
+            # Merging converts *obj* once, and copies the Namespaces in it
+            space = self._namespace.merge(obj)
+        _seal(space)
+        return space
+
+    def snapshot(self):
+        """Return the current Namespace. This never blocks."""
+        return self._snapshot
+
+    def publish(self, obj):
+        """Replace the current Namespace with a copy of *obj*.
+
+        :param obj: Dictionary or Namespace to publish
+        :returns: The new snapshot
+
+        """
+        space = self._build(obj)
+        with self._lock:
+            self._snapshot = space
+        return space
+
+    def update(self, *layers, strategy="replace"):
+        """Replace the current Namespace with one which has each of *layers*
+        merged into it, see :meth:`Namespace.merge`.
+
+        :param layers: Dictionaries or Namespaces to merge
+        :param str strategy: How to merge lists, see
+            :meth:`Namespace.update_deep`
+        :returns: The new snapshot
+
+        """
+        with self._lock:
+            space = self._namespace.merge(self._snapshot, *layers, strategy=strategy)
+            _seal(space)
+            self._snapshot = space
+        return space
+
+
+def _prune_list(items):
+    """
+    Prune the Namespaces in *items*, and in any lists nested in it.
+
+    :param list items: List to prune
+
+    """
+    for item in items:
+        if isinstance(item, Namespace):
+            item.prune()
+        elif isinstance(item, list):
+            _prune_list(item)
+        elif isinstance(item, RecordList):
+            _prune_list(item._rows)
+
+
+def _seal(value):
+    """
+    Load the pending items of *value*, and of every Namespace in it, and make
+    those Namespaces read-only, so they can be read from many threads at
+    once without being modified.
+
+    :param value: Namespace, or list of Namespaces, to seal
+
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, Namespace):
+            value._load()
+            if not _get_frozen(value):
+                object.__setattr__(value, "_Namespace__frozen", True)
+            stack.extend(value.__dict__.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, RecordList):
+            for values in value._rows:
+                stack.extend(values)
+
+
+def _layer_items(value):
+    """
+    Return the items of *value* to merge, if it's a Namespace or a dictionary
+    which isn't list-like, otherwise ``None``.
+
+    :param value: Value to check
+
+    """
+    if isinstance(value, Namespace):
+        return value._raw_items()
+    if isinstance(value, dict):
+        value = _expand_keys(value)
+        if _list_items(value) is None:
+            return value
+    return None
+
+
+def _diff(old, new, base_name, ops):
+    """
+    Add the operations which turn the *old* items into the *new* items to
+    *ops*.
+
+    :param dict old: Items, as returned by :func:`_layer_items`
+    :param dict new: Items, as returned by :func:`_layer_items`
+    :param str base_name: Dot-notation key of the items, or ``None``
+    :param list ops: List of operations to add to
+
+    """
+    for name, value in new.items():
+        key = name if base_name is None else base_name + "." + name
+        existing = old.get(name, _MISSING)
+
+        # Shared values don't need to be compared at all
+        if value is existing:
+            continue
+
+        if existing is not _MISSING:
+            old_items = _layer_items(existing)
+            if old_items is not None:
+                new_items = _layer_items(value)
+                if new_items is not None:
+                    _diff(old_items, new_items, key, ops)
+                    continue
+
+            if _same(existing, value):
+                continue
+
+        ops.append(("set", key, value))
+
+    for name in old:
+        if name not in new:
+            key = name if base_name is None else base_name + "." + name
+            ops.append(("delete", key))
+
+
+def _has_item(space, name):
+    """
+    Return whether the Namespace *space* has the item *name*, without
+    reading it.
+
+    :param Namespace space: Namespace to check
+    :param str name: Item name
+
+    """
+    if name in space.__dict__:
+        return True
+    pending = _get_pending(space)
+    return pending is not None and name in pending
+
+
+def _same(old, new):
+    """
+    Return whether the values *old* and *new* have the same contents.
+    Namespaces and dictionaries are compared by their items, and lists item
+    by item, since Namespaces themselves only compare equal to themselves.
+
+    :param old: Value to compare
+    :param new: Value to compare
+
+    """
+    if old is new:
+        return True
+
+    old_items = _layer_items(old)
+    new_items = _layer_items(new)
+    if old_items is not None or new_items is not None:
+        if old_items is None or new_items is None:
+            return False
+        if old_items.keys() != new_items.keys():
+            return False
+        return all(_same(old_items[name], new_items[name]) for name in new_items)
+
+    if isinstance(old, list) and isinstance(new, list):
+        if len(old) != len(new):
+            return False
+        return all(map(_same, old, new))
+
+    return old == new
+
+
+def _merge(space, items, append):
+    """
+    Deep merge the *items* from a layer into the Namespace *space*.
+
+    :param Namespace space: Namespace to merge into
+    :param dict items: Items to merge, as returned by :func:`_layer_items`
+    :param bool append: Whether to append lists to existing lists
+
+    """
+    cls = type(space)
+    for name, value in items.items():
+        _check_name(cls, name)
+
+        existing = space.__dict__.get(name, _MISSING)
+        if existing is _MISSING and _get_pending(space) and name in _get_pending(space):
+            existing = space._load_item(name)
+
+        if isinstance(existing, Namespace):
+            nested = _layer_items(value)
+            if nested is not None:
+                _merge(existing, nested, append)
+                continue
+
+        if append and isinstance(existing, (list, RecordList)):
+            if isinstance(value, dict):
+                value = _list_items(_expand_keys(value))
+            if isinstance(value, list):
+                setattr(space, name, existing + cls._adopt(value))
+                continue
+
+        setattr(space, name, cls._adopt(value))
+
+
+def _clone(cls, value):
+    """
+    Return a deep copy of *value*, copying Namespaces and lists. Any other
+    value is kept as it is, except dictionaries, which are converted the
+    same way :meth:`Namespace.from_dict` would.
+
+    :param type cls: Namespace class to convert dictionaries with
+    :param value: Value to copy
+
+    """
+    if isinstance(value, dict):
+        value = cls._wrap(value)
+    if isinstance(value, list):
+        return [_clone(cls, item) for item in value]
+    if isinstance(value, RecordList):
+        return value.copy()
+    if not isinstance(value, Namespace):
+        return value
+
+    cls = type(value)
+    space = cls()
+    # Pending items are never modified in place, so they can be shared
+    if _get_pending(value) is not None:
+        _set_pending(space, _get_pending(value))
+
+    descriptors = cls._descriptors
+    items = space.__dict__
+    for name, item in value.__dict__.items():
+        # Read the same way __getattribute__ would, without the call
+        if descriptors and not isinstance(item, Namespace):
+            if hasattr(item, "__get__"):
+                item = item.__get__(value, cls)
+        items[name] = _clone(cls, item)
+
+    return space
+
+
+def _dump_state(space):
+    """
+    Return the pickle state of *space*, see :meth:`Namespace.__getstate__`.
+
+    The state has four entries for *space* and for each nested Namespace of
+    the same type, in breadth-first order: a tuple of item names, a list of
+    item values, a tuple of the positions of the nested Namespaces in those
+    values (which are left as ``None``), and the pending items or ``None``.
+    A Namespace which was already reached is given as a ``(position,
+    number)`` pair instead, where *number* is its place in the order, so
+    shared subtrees and cycles are kept. Equal name and position tuples are
+    shared, so pickle only writes each of them once.
+
+    :param Namespace space: Namespace to dump
+
+    """
+    cls = type(space)
+    shared = {}
+    state = []
+    queue = [space]
+    # Numbers of the Namespaces reached so far, by id
+    numbers = {id(space): 0}
+    for node in queue:
+        items = _get_dict(node)
+        names = tuple(items)
+        values = list(items.values())
+        nested = ()
+        if cls in map(type, values):
+            nested = []
+            for i, item in enumerate(values):
+                if type(item) is not cls:
+                    continue
+                values[i] = None
+                number = numbers.get(id(item))
+                if number is None:
+                    numbers[id(item)] = len(queue)
+                    queue.append(item)
+                    nested.append(i)
+                else:
+                    nested.append((i, number))
+            nested = tuple(nested)
+        state += (
+            shared.setdefault(names, names),
+            values,
+            shared.setdefault(nested, nested),
+            _get_pending(node),
+        )
+    return state
+
+
+def _load_state(space, state):
+    """
+    Restore the items of *space* from a pickle *state* list.
+
+    :param Namespace space: New Namespace to restore
+    :param list state: State list from :func:`_dump_state`
+
+    """
+    cls = type(space)
+    new = cls.__new__
+    nodes = [space]
+    for i in range(0, len(state), 4):
+        names, values, nested, pending = state[i : i + 4]
+        for position in nested:
+            if type(position) is tuple:
+                position, number = position
+                values[position] = nodes[number]
+                continue
+            values[position] = node = new(cls)
+            nodes.append(node)
+        space = nodes[i // 4]
+        _get_dict(space).update(zip(names, values))
+        if pending is not None:
+            _set_pending(space, pending)
+
+
+# Binary format used by Namespace.to_bytes(), which starts with this header
+_BINARY_HEADER = b"NS\x01"
+
+_INT8 = struct.Struct("<b")
+_INT64 = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_SIZE8 = struct.Struct("<B")
+_SIZE = struct.Struct("<I")
+
+
+def _dump_binary(value, chunks, strings):
+    """
+    Add the binary encoding of *value* to *chunks*, see
+    :meth:`Namespace.to_bytes`.
+
+    Each value is a one byte tag followed by its data. Sizes are unsigned
+    integers and numbers are little endian. Strings are only written out the
+    first time they're seen, and are referred to by number after that.
+
+    :param value: Value to encode
+    :param list chunks: List of bytes to add to
+    :param dict strings: Numbers of the strings written so far
+
+    """
+    kind = type(value)
+    if kind is str:
+        index = strings.get(value)
+        if index is not None:
+            if index < 256:
+                chunks.append(b"r" + _SIZE8.pack(index))
+            else:
+                chunks.append(b"R" + _SIZE.pack(index))
+            return
+        strings[value] = len(strings)
+        data = value.encode("utf-8")
+        if len(data) < 256:
+            chunks.append(b"s" + _SIZE8.pack(len(data)) + data)
+        else:
+            chunks.append(b"S" + _SIZE.pack(len(data)) + data)
+    elif value is None:
+        chunks.append(b"N")
+    elif value is True:
+        chunks.append(b"T")
+    elif value is False:
+        chunks.append(b"F")
+    elif kind is int:
+        if -128 <= value < 128:
+            chunks.append(b"i" + _INT8.pack(value))
+        elif -(2**63) <= value < 2**63:
+            chunks.append(b"q" + _INT64.pack(value))
+        else:
+            data = value.to_bytes(value.bit_length() // 8 + 1, "little", signed=True)
+            chunks.append(b"I" + _SIZE.pack(len(data)) + data)
+    elif kind is float:
+        chunks.append(b"d" + _FLOAT.pack(value))
+    elif isinstance(value, Namespace):
+        items = value._raw_items()
+        pending = _get_pending(value)
+        chunks.append(b"n" + _SIZE.pack(len(items)))
+        for name, item in items.items():
+            if pending is not None and name not in value.__dict__:
+                # Encode pending items the way they will be loaded
+                item = value._adopt(item)
+            _dump_binary(name, chunks, strings)
+            _dump_binary(item, chunks, strings)
+    elif isinstance(value, RecordList):
+        # Keys are written once, followed by the values of each row
+        chunks.append(b"k" + _SIZE.pack(len(value._keys)))
+        for name in value._keys:
+            _dump_binary(name, chunks, strings)
+        chunks.append(_SIZE.pack(len(value._rows)))
+        for values in value._rows:
+            for item in values:
+                if item is _ABSENT:
+                    chunks.append(b"A")
+                else:
+                    _dump_binary(item, chunks, strings)
+    elif isinstance(value, (list, tuple)):
+        tag = b"l" if isinstance(value, list) else b"t"
+        chunks.append(tag + _SIZE.pack(len(value)))
+        for item in value:
+            _dump_binary(item, chunks, strings)
+    elif isinstance(value, dict):
+        chunks.append(b"m" + _SIZE.pack(len(value)))
+        for name, item in value.items():
+            if type(name) is not str:
+                raise TypeError("Can't encode key: {!r}".format(name))
+            _dump_binary(name, chunks, strings)
+            _dump_binary(item, chunks, strings)
+    elif kind is bytes:
+        chunks.append(b"b" + _SIZE.pack(len(value)) + value)
+    else:
+        raise TypeError("Can't encode value: {!r}".format(value))
+
+
+def _load_binary(cls, data, offset, strings):
+    """
+    Return the value encoded in *data* at *offset*, and the offset after it.
+
+    :param type cls: Namespace class to create nested Namespaces with
+    :param memoryview data: Binary data from :meth:`Namespace.to_bytes`
+    :param int offset: Position of the value in *data*
+    :param list strings: Strings read so far
+
+    """
+    tag = data[offset]
+    offset += 1
+    if tag == 0x72:  # r
+        return strings[data[offset]], offset + 1
+    if tag == 0x73:  # s
+        end = offset + 1 + data[offset]
+        value = str(data[offset + 1 : end], "utf-8")
+        strings.append(value)
+        return value, end
+    if tag == 0x69:  # i
+        return _INT8.unpack_from(data, offset)[0], offset + 1
+    if tag == 0x6E:  # n
+        size = _SIZE.unpack_from(data, offset)[0]
+        offset += 4
+        space = cls()
+        items = space.__dict__
+        for _ in range(size):
+            name, offset = _load_binary(cls, data, offset, strings)
+            items[name], offset = _load_binary(cls, data, offset, strings)
+        return space, offset
+    if tag == 0x4E:  # N
+        return None, offset
+    if tag == 0x54:  # T
+        return True, offset
+    if tag == 0x46:  # F
+        return False, offset
+    if tag == 0x71:  # q
+        return _INT64.unpack_from(data, offset)[0], offset + 8
+    if tag == 0x64:  # d
+        return _FLOAT.unpack_from(data, offset)[0], offset + 8
+    if tag == 0x6C or tag == 0x74:  # l, t
+        size = _SIZE.unpack_from(data, offset)[0]
+        offset += 4
+        items = []
+        for _ in range(size):
+            item, offset = _load_binary(cls, data, offset, strings)
+            items.append(item)
+        return (items if tag == 0x6C else tuple(items)), offset
+    if tag == 0x6D:  # m
+        size = _SIZE.unpack_from(data, offset)[0]
+        offset += 4
+        items = {}
+        for _ in range(size):
+            name, offset = _load_binary(cls, data, offset, strings)
+            items[name], offset = _load_binary(cls, data, offset, strings)
+        return items, offset
+    if tag == 0x52:  # R
+        return strings[_SIZE.unpack_from(data, offset)[0]], offset + 4
+    if tag == 0x6B:  # k
+        size = _SIZE.unpack_from(data, offset)[0]
+        offset += 4
+        keys = []
+        for _ in range(size):
+            name, offset = _load_binary(cls, data, offset, strings)
+            keys.append(name)
+        count = _SIZE.unpack_from(data, offset)[0]
+        offset += 4
+        rows = []
+        for _ in range(count):
+            values = []
+            for _ in range(size):
+                item, offset = _load_binary(cls, data, offset, strings)
+                values.append(item)
+            rows.append(values)
+        return RecordList._new(cls, tuple(keys), rows), offset
+    if tag == 0x41:  # A
+        return _ABSENT, offset
+
+    # Everything else is a size followed by that much data
+    size = _SIZE.unpack_from(data, offset)[0]
+    offset += 4
+    end = offset + size
+    if end > len(data):
+        raise ValueError("Bad Namespace data: truncated")
+    if tag == 0x53:  # S
+        value = str(data[offset:end], "utf-8")
+        strings.append(value)
+        return value, end
+    if tag == 0x62:  # b
+        return bytes(data[offset:end]), end
+    if tag == 0x49:  # I
+        return int.from_bytes(data[offset:end], "little", signed=True), end
+    raise ValueError("Bad Namespace data: unknown tag {!r}".format(chr(tag)))
+
+
+# Marks a missing item, since any value (even UNSET) can be an item
+_MISSING = object()
+
+# Read Namespace state without going through __getattribute__
+_get_dict = Namespace.__dict__["__dict__"].__get__
+_set_dict = Namespace.__dict__["__dict__"].__set__
+_get_pending = Namespace._Namespace__pending.__get__
+_get_watchers = Namespace._Namespace__watchers.__get__
+_get_index = Namespace._Namespace__index.__get__
+_get_frozen = Namespace._Namespace__frozen.__get__
+
+
+def _check_writable(space, name):
+    """Raise AttributeError if the Namespace *space* is read-only."""
+    if _get_frozen(space):
+        raise AttributeError(
+            "Can't set {!r} on a read-only Namespace snapshot".format(name)
+        )
+
+
+def _set_pending(space, pending):
+    """Set the pending items of *space*, which may be ``None``."""
+    object.__setattr__(space, "_Namespace__pending", pending)
+
+
+def _watch(space, watchers):
+    """Set the index *watchers* of *space*."""
+    object.__setattr__(space, "_Namespace__watchers", watchers)
+
+
+def _unwatch(space):
+    """Clear the index watchers of *space*."""
+    object.__setattr__(space, "_Namespace__watchers", None)
+
+
+class _FlatIndex(object):
+    """
+    Flattened dot-notation index of a Namespace, which is kept up to date by
+    the Namespaces in it calling :meth:`add` and :meth:`remove` as their
+    items change.
+
+    """
+
+    __slots__ = ("items", "__weakref__")
+
+    def __init__(self):
+        self.items = None
+
+    def flat(self, space):
+        """Return the flattened items of *space*, building them if needed."""
+        if self.items is None:
+            self.items = {}
+            self.add(space, None)
+        return self.items
+
+    def add(self, value, key):
+        """Add *value* to the index under *key*."""
+        if not isinstance(value, Namespace):
+            self.items[key] = value
+            return
+
+        if value is _EMPTY:
+            # It never has any items, and must stay immutable
+            return
+
+        value._load()
+        watcher = (weakref.ref(self), key)
+        watchers = _get_watchers(value)
+        if watchers is None:
+            _watch(value, [watcher])
+        else:
+            watchers.append(watcher)
+
+        descriptors = type(value)._descriptors
+        for name, item in value.__dict__.items():
+            if descriptors and not isinstance(item, Namespace):
+                if hasattr(item, "__get__"):
+                    item = item.__get__(value, type(value))
+            self.add(item, name if key is None else key + "." + name)
+
+    def remove(self, value, key):
+        """Remove *value* from the index under *key*."""
+        if not isinstance(value, Namespace):
+            self.items.pop(key, None)
+            return
+
+        watchers = _get_watchers(value)
+        if watchers:
+            watchers = [
+                watcher
+                for watcher in watchers
+                if watcher[1] != key or watcher[0]() is not self
+            ]
+            if watchers:
+                object.__setattr__(value, "_Namespace__watchers", watchers)
+            else:
+                _unwatch(value)
+
+        for name, item in value.__dict__.items():
+            self.remove(item, name if key is None else key + "." + name)
+
+
+class _CompiledPath(object):
+    """
+    Callable which traverses an object along a pre-parsed path, following the
+    same rules as :meth:`Namespace.traverse`.
+
+    :param path: A dot-notation string, or an iterable of keys
+
+    """
+
+    __slots__ = ("path", "_steps")
+
+    def __init__(self, path):
+        self.path = path
+        if isinstance(path, str):
+            path = path.split(".")
+
+        steps = []
+        for key in path:
+            # Work out the list index for each key up front
+            try:
+                index = int(key)
+            except (TypeError, ValueError):
+                index = None
+            steps.append((key, index))
+        self._steps = tuple(steps)
+
+    def __repr__(self):
+        return "<{}({!r})>".format(type(self).__name__, self.path)
+
+    def __call__(self, obj):
+        for key, index in self._steps:
+            if isinstance(obj, Namespace):
+                # Read set attributes straight from __dict__, falling back
+                # to __getitem__ for everything else
+                try:
+                    value = obj.__dict__[key]
+                except (KeyError, TypeError):
+                    obj = obj[key]
+                    continue
+                if type(obj)._descriptors and not isinstance(value, Namespace):
+                    if hasattr(value, "__get__"):
+                        value = value.__get__(obj, type(obj))
+                obj = value
+            elif index is not None and type(obj) is list:
+                obj = obj[index]
+            else:
+                try:
+                    obj = obj[key]
+                except TypeError:
+                    # Lists need integer indexes
+                    if index is None:
+                        raise
+                    obj = obj[index]
+        return obj
+
+
+@functools.lru_cache(maxsize=1024)
+def _compiled_path(path):
+    """
+    Return the :class:`_CompiledPath` for the dot-notation string *path*,
+    keeping recently used paths so they are only parsed once.
+
+    :param str path: Dot-notation path
+
+    """
+    return _CompiledPath(path)
+
+
+@functools.lru_cache(maxsize=256)
+def _path_tree(paths):
+    """
+    Return a tree of the keys in the dot-notation *paths*, where each node is
+    a tuple of ``(positions, children)``. *positions* are the positions in
+    *paths* of the paths which end at that node, and *children* is a tuple of
+    ``(key, index, node)`` for each following key, with its list index.
+
+    :param tuple paths: Dot-notation paths
+
+    """
+    root = ([], {})
+    for position, path in enumerate(paths):
+        node = root
+        for key in path.split("."):
+            node = node[1].setdefault(key, ([], {}))
+        node[0].append(position)
+
+    def freeze(node):
+        children = []
+        for key, child in node[1].items():
+            try:
+                index = int(key)
+            except ValueError:
+                index = None
+            children.append((key, index, freeze(child)))
+        return tuple(node[0]), tuple(children)
+
+    return freeze(root)
+
+
+def _get_tree(obj, node, results):
+    """
+    Store the values of *obj* at each of the paths in a :func:`_path_tree`
+    *node* in *results*, leaving missing paths as they are.
+
+    :param obj: Object to read from
+    :param tuple node: Node from :func:`_path_tree`
+    :param list results: Results to store values in
+
+    """
+    positions, children = node
+    for position in positions:
+        results[position] = obj
+
+    for key, index, child in children:
+        if isinstance(obj, Namespace):
+            items = obj.__dict__
+            if key in items:
+                value = items[key]
+                if type(obj)._descriptors and not isinstance(value, Namespace):
+                    if hasattr(value, "__get__"):
+                        value = value.__get__(obj, type(obj))
+            elif _get_pending(obj) is not None and key in _get_pending(obj):
+                value = obj._load_item(key)
+            else:
+                continue
+        elif isinstance(obj, RecordRow):
+            value = obj._get(key)
+            if value is _ABSENT:
+                continue
+        elif type(obj) is list:
+            if index is None or not -len(obj) <= index < len(obj):
+                continue
+            value = obj[index]
+        else:
+            try:
+                value = obj[key]
+            except (KeyError, IndexError, TypeError):
+                # Lists need integer indexes
+                if index is None:
+                    continue
+                try:
+                    value = obj[index]
+                except (KeyError, IndexError, TypeError):
+                    continue
+        _get_tree(value, child, results)
+
+
+def _unflatten(obj):
+    """
+    Return *obj* having dot-notation keys unflattened, and whether any of
+    its dicts has a ``'0'`` key, which means it may have list-like dicts for
+    :func:`_join_lists` to convert.
+
+    Nested dictionaries and lists are copied using an explicit stack instead
+    of recursion, so documents can be nested to any depth. Each nested value
+    is copied before the next key of its parent, the same order a recursive
+    walk would use.
+
+    :param obj: Arbitrary object (preferably a dict) to unflatten
+
+    """
+    # Each frame is an iterator over the items of a dict or list, the new
+    # dict or list they're copied into, and the container and key to store
+    # it in once it's done, where a key of _MISSING means appending
+    if isinstance(obj, dict):
+        result = {}
+        stack = [(iter(obj.items()), result, None, None)]
+        lists = "0" in obj or 0 in obj
+    elif isinstance(obj, list):
+        result = []
+        stack = [(iter(obj), result, None, None)]
+        lists = False
+    else:
+        return obj, False
+
+    push = stack.append
+    while stack:
+        items, target, parent, slot = stack[-1]
+        if type(target) is dict:
+            for key, value in items:
+                current = target
+                if isinstance(key, str) and "." in key:
+                    # Walk down the key parts, creating levels as needed
+                    key = key.split(".")
+                    lists = lists or "0" in key
+                    for part in key[:-1]:
+                        if part not in current:
+                            current[part] = {}
+                        current = current[part]
+                    key = key[-1]
+                    if key in current:
+                        raise ValueError("Value already assigned")
+
+                # Copy nested values before carrying on with this frame
+                if isinstance(value, _CONTAINERS):
+                    if isinstance(value, dict):
+                        lists = lists or "0" in value or 0 in value
+                        push((iter(value.items()), {}, current, key))
+                    else:
+                        push((iter(value), [], current, key))
+                    break
+                current[key] = value
+            else:
+                stack.pop()
+                if parent is not None:
+                    _store(parent, slot, target)
+        else:
+            append = target.append
+            for value in items:
+                if isinstance(value, _CONTAINERS):
+                    if isinstance(value, dict):
+                        lists = lists or "0" in value or 0 in value
+                        push((iter(value.items()), {}, target, _MISSING))
+                    else:
+                        push((iter(value), [], target, _MISSING))
+                    break
+                append(value)
+            else:
+                stack.pop()
+                if parent is not None:
+                    _store(parent, slot, target)
+
+    return result, lists
+
+
+# Values which _unflatten() copies
+_CONTAINERS = (dict, list)
+
+
+def _store(container, key, value):
+    """Store *value* in *container* under *key*, or append it to the list
+    *container* if *key* is ``_MISSING``."""
+    if key is _MISSING:
+        container.append(value)
+    else:
+        container[key] = value
+
+
+def _join_lists(obj, sparse=False):
+    """
+    Return *obj* with list-like dictionary objects converted to actual lists.
+
+    The dicts and lists in *obj* are changed in place, so it should be a new
+    copy, such as the one :func:`_unflatten` returns.
+
+    :param obj: Arbitrary object
+    :param bool sparse: Allow missing indexes (see :func:`_list_items`)
+
+    Example::
+
+        {'0': 'apple', '1': 'pear', '2': 'orange'}
 
         ... returns ...
 
         ['apple', 'pear', 'orange']
 
     """
-    # If it's not a dict, it's definitely not a dict-list
-    if not isinstance(obj, dict):
-        # If it's a list-list then we want to recurse into it
-        if isinstance(obj, list):
-            return [_join_lists(v) for v in obj]
-        # Otherwise just get out
-        return obj
+    root = [obj]
+    stack = [root]
+    push = stack.append
+    while stack:
+        container = stack.pop()
+        items = container.items() if type(container) is dict else enumerate(container)
+        for key, value in items:
+            if not isinstance(value, _CONTAINERS):
+                continue
+            # If there's a '0' key it's a possible list
+            if isinstance(value, dict) and ("0" in value or 0 in value):
+                joined = _list_items(value, sparse)
+                if joined is not None:
+                    container[key] = value = joined
+            push(value)
+    return root[0]
+
+
+def _list_items(obj, sparse=False):
+    """
+    Return the values of the list-like dictionary *obj* in index order, or
+    ``None`` if *obj* is not list-like.
+
+    Each key is only converted and checked once, stopping at the first one
+    which isn't an index, so a dict which isn't a list, like a map of IDs,
+    is rejected without converting or sorting all its keys.
+
+    :param dict obj: Dictionary to check
+    :param bool sparse: Allow missing indexes, filled with ``None``, as long
+                        as they're at most half of the list
 
+    """
     # If there's not a '0' key it's not a possible list
     if "0" not in obj and 0 not in obj:
-        # Recurse into it
-        for key, value in obj.items():
-            obj[key] = _join_lists(value)
+        return None
+
+    # A list without gaps has an index for each key, so any key that isn't an
+    # index, is out of range or is repeated (like '0' and '00') means obj
+    # isn't a list
+    size = len(obj)
+    limit = size * 2 if sparse else size
+    items = []
+    append = items.append
+    for key, value in obj.items():
+        try:
+            index = int(key)
+        except (TypeError, ValueError):
+            return None
+        if not 0 <= index < limit:
+            return None
+        count = len(items)
+        if index == count:
+            append(value)
+        elif index > count:
+            # Leave room for the indexes which haven't been seen yet
+            items.extend([_MISSING] * (index - count))
+            append(value)
+        elif items[index] is _MISSING:
+            items[index] = value
+        else:
+            return None
 
-        return obj
+    if len(items) > size:
+        # Fill the gaps in a sparse list
+        return [None if item is _MISSING else item for item in items]
+    return items
 
-    # Make sure the all the keys parse into integers, otherwise it's not a list
-    try:
-        items = [(int(k), v) for k, v in obj.items()]
-    except ValueError:
+
+def _expand_keys(obj):
+    """
+    Return *obj* with the dot-notation keys at its top level expanded into
+    nested dictionaries, or *obj* itself if it doesn't have any.
+
+    Only a single level is expanded. Values are left untouched so they can be
+    expanded when the caller reaches them, and any dictionary from *obj* that
+    has to be merged into is expanded into a new dictionary first, so *obj*
+    is never mutated.
+
+    :param dict obj: Dictionary to expand
+
+    Example::
+
+        {'foo.bar': 0, 'foo.spam': 1, 'parrot': {'dead.yes': 2}}
+
+        ... returns ...
+
+        {'foo': {'bar': 0, 'spam': 1}, 'parrot': {'dead.yes': 2}}
+
+    """
+    for key in obj:
+        if isinstance(key, str) and "." in key:
+            break
+    else:
         return obj
 
-    # Sort the integer keys to get the original list order
-    items = sorted(items)
+    expanded = {}
+    # Dictionaries we created, which are safe to write into
+    owned = set()
+
+    for key, value in obj.items():
+        if not isinstance(key, str) or "." not in key:
+            expanded[key] = value
+            continue
+
+        key = key.split(".")
+        end = len(key) - 1
+        current = expanded
+
+        # Walk down the key parts the same way _unflatten does
+        for i in range(len(key)):
+            part = key[i]
+
+            if part not in current:
+                if i == end:
+                    current[part] = value
+                    break
+
+                current[part] = {}
+                owned.add(id(current[part]))
 
-    # Check all the keys to ensure there's no missing indexes
-    i = 0
-    for key, value in items:
-        # If the index key is out of sequence we abandon
-        if key != i:
-            return obj
+            if i == end:
+                raise ValueError("Value already assigned")
 
-        # Replace the item with its value
-        items[i] = value
+            child = current[part]
+            if isinstance(child, dict) and id(child) not in owned:
+                # Don't write into a dictionary we were given
+                child = _expand_keys(child)
+                if child is current[part]:
+                    child = dict(child)
+                current[part] = child
+                owned.add(id(child))
 
-        # Increment to check the next one
-        i += 1
+            current = child
+
+    return expanded
+
+
+# Names which have already passed a _VALID_NAME check, keyed by pattern
+_VALID_NAMES = {}
+_VALID_NAMES_SIZE = 65536
+
+
+def _valid_names(pattern):
+    """
+    Return the set of names known to match *pattern*, so repeated keys don't
+    have to be matched again every time a Namespace is populated.
+
+    :param pattern: Compiled ``_VALID_NAME`` pattern
+
+    """
+    valid = _VALID_NAMES.get(pattern)
+    if valid is None or len(valid) > _VALID_NAMES_SIZE:
+        valid = _VALID_NAMES[pattern] = set()
+    return valid
+
+
+def _check_name(cls, name):
+    """
+    Assert that *name* is a valid item name for the Namespace class *cls*.
+
+    :param type cls: Namespace class
+    :param str name: Name to check
+
+    """
+    valid = _valid_names(cls._VALID_NAME)
+    if name not in valid:
+        assert cls._VALID_NAME.match(name), "Invalid name: {!r}".format(name)
+        valid.add(name)
 
-    return items
 
+def _coerce(cls, value, valid):
+    """
+    Return *value* converted for storage in a Namespace of type *cls*, with
+    dictionaries becoming Namespaces (or lists, if they are list-like) and
+    lists being copied with their items converted.
+
+    :param type cls: Namespace class to create
+    :param value: Value to convert
+    :param set valid: Names known to match ``cls._VALID_NAME``
+
+    """
+    if isinstance(value, dict):
+        value = _expand_keys(value)
+        items = _list_items(value)
+        if items is None:
+            space = cls()
+            _populate(space, value, valid)
+            return space
+        value = items
+    elif not isinstance(value, list):
+        return value
+
+    if cls._records:
+        records = _record_list(cls, value, valid)
+        if records is not None:
+            return records
+    return [_coerce(cls, item, valid) for item in value]
+
+
+def _populate(space, obj, valid):
+    """
+    Set the items of the already expanded dictionary *obj* as attributes on
+    the Namespace *space*, converting their values as we go.
+
+    :param Namespace space: Namespace to populate
+    :param dict obj: Dictionary without dot-notation keys
+    :param set valid: Names known to match ``cls._VALID_NAME``
+
+    """
+    cls = type(space)
+    match = cls._VALID_NAME.match
+    for key, value in obj.items():
+        if key not in valid:
+            assert match(key), "Invalid name: {!r}".format(key)
+            valid.add(key)
+        if isinstance(value, (dict, list)):
+            value = _coerce(cls, value, valid)
+        setattr(space, key, value)
+
+
+def _decode_hook(cls, expand=True):
+    """
+    Return a JSON decoder ``object_hook`` which turns each decoded object
+    into a Namespace of type *cls* (or a list, if it is list-like) the same
+    way :meth:`Namespace.from_dict` would, so documents are converted as
+    they're parsed instead of in a second pass.
 
-def unflatten(obj):
+    Objects are decoded innermost first, so their values are already
+    converted by the time the hook sees them, and the dictionary from the
+    decoder is used as the new Namespace's ``__dict__`` without copying it.
+
+    :param type cls: Namespace class to create
+    :param bool expand: Whether to expand dot-notation keys (default
+        ``True``)
+
+    """
+    valid = _valid_names(cls._VALID_NAME)
+    match = cls._VALID_NAME.match
+    new = cls.__new__
+    # Objects which became lists, by id, in case a dot-notation key in their
+    # parent adds to them. The lists are kept too, so the ids stay unique.
+    joined = {}
+
+    def build(obj):
+        if "0" in obj:
+            items = _list_items(obj)
+            if items is not None:
+                if expand:
+                    joined[id(items)] = (items, obj)
+                return items
+        for key in obj:
+            if key not in valid:
+                assert match(key), "Invalid name: {!r}".format(key)
+                valid.add(key)
+        space = new(cls)
+        _set_dict(space, obj)
+        return space
+
+    def expand_keys(obj):
+        expanded = {}
+        # Levels the dot-notation keys were added to, outermost first, with
+        # the value each level had
+        levels = {}
+        for key, value in obj.items():
+            if "." not in key:
+                expanded[key] = value
+                continue
+
+            parts = key.split(".")
+            current = expanded
+            for part in parts[:-1]:
+                child = current.get(part, _MISSING)
+                if child is _MISSING:
+                    child = current[part] = {}
+                elif isinstance(child, Namespace):
+                    # Decoded Namespaces are new, so they can be added to
+                    child = _get_dict(child)
+                elif type(child) is list and id(child) in joined:
+                    # Add to the object the list came from instead
+                    child = current[part] = joined.pop(id(child))[1]
+                elif type(child) is not dict:
+                    raise ValueError("Value already assigned")
+                levels[id(current), part] = (current, current[part])
+                current = child
+
+            if parts[-1] in current:
+                raise ValueError("Value already assigned")
+            current[parts[-1]] = value
+
+        # Build the levels innermost first, checking the Namespaces which
+        # were added to again, since they may be list-like now
+        for (_, part), (parent, child) in reversed(levels.items()):
+            if parent[part] is not child:
+                # Replaced by a later key without dots, as from_dict() does
+                continue
+            if type(child) is not dict:
+                child = _get_dict(child)
+            parent[part] = build(child)
+        return expanded
+
+    def hook(obj):
+        if expand:
+            for key in obj:
+                if "." in key:
+                    return build(expand_keys(obj))
+        return build(obj)
+
+    return hook
+
+
+def unflatten(obj, sparse=False):
     """
     Return *obj* with dot-notation keys unflattened into nested dictionaries,
     as well as list-like dictionaries converted into list instances.
 
     :param obj: An arbitrary object, preferably a dict
+    :param bool sparse: Convert dictionaries with missing indexes into lists
+                        too, with ``None`` in the gaps (default ``False``)
+
+    A list-like dictionary has integer keys starting from ``0``. By default
+    every index up to the last one must be there, otherwise it's left as a
+    dictionary. With *sparse*, up to half of the indexes can be missing, so
+    a map of numeric IDs still isn't mistaken for a list.
+
+    Example::
+
+        >>> unflatten({'a.0': 1, 'a.2': 3}, sparse=True)
+        {'a': [1, None, 3]}
 
     """
-    obj = _unflatten(obj)
-    obj = _join_lists(obj)
+    obj, lists = _unflatten(obj)
+    if lists:
+        obj = _join_lists(obj, sparse)
     return obj
+
+
+def unflatten_many(rows, sparse=False):
+    """
+    Return a generator of :func:`unflatten` applied to each of *rows*, for
+    many rows which share the same keys, such as rows from a CSV file.
+
+    :param rows: Iterable of dicts to unflatten
+    :param bool sparse: Allow lists with missing indexes, the same as with
+                        :func:`unflatten`
+
+    The first time a set of keys is seen, the keys are split and checked for
+    list-like dictionaries once, and compiled into a function that builds the
+    nested result directly from the row's values. Rows with the same keys,
+    in the same order, reuse it.
+
+    Rows which aren't dicts, or whose keys conflict with each other, are
+    passed to :func:`unflatten` as they are. So are rows with new keys once
+    64 sets of keys have been compiled.
+
+    Example::
+
+        >>> rows = [{'user.id': 1, 'user.tags.0': 'a'},
+        ...         {'user.id': 2, 'user.tags.0': 'b'}]
+        >>> list(unflatten_many(rows))
+        [{'user': {'id': 1, 'tags': ['a']}}, {'user': {'id': 2, 'tags': ['b']}}]
+
+    """
+    plans = {}
+    for row in rows:
+        if not isinstance(row, dict):
+            yield unflatten(row, sparse)
+            continue
+
+        keys = tuple(row)
+        plan = plans.get(keys, _MISSING)
+        if plan is _MISSING:
+            if len(plans) >= _PLAN_LIMIT:
+                # Compiling a plan costs more than unflattening a few rows
+                yield unflatten(row, sparse)
+                continue
+            plan = plans[keys] = _compile_plan(keys, sparse)
+        if plan is None:
+            yield unflatten(row, sparse)
+            continue
+
+        values = row.values()
+        if not _PLAIN_VALUES.issuperset(map(type, values)):
+            # Nested values don't share a plan, so they're unflattened alone
+            values = [
+                unflatten(value, sparse) if isinstance(value, _CONTAINERS) else value
+                for value in values
+            ]
+        yield plan(values)
+
+
+# How many sets of keys unflatten_many() keeps compiled plans for
+_PLAN_LIMIT = 64
+
+
+class _PlanSlot(object):
+    """Placeholder for the value of a row's key while compiling a plan."""
+
+    __slots__ = ("index",)
+
+    def __init__(self, index):
+        self.index = index
+
+
+def _compile_plan(keys, sparse=False):
+    """
+    Return a function which builds the unflattened dict for a row with
+    *keys* from a sequence of the row's values, or ``None`` if rows with
+    *keys* can't be built from a plan.
+
+    :param tuple keys: The keys of the rows
+    :param bool sparse: Allow lists with missing indexes
+
+    """
+    # Unflattening placeholders gives the nesting and lists for every row
+    try:
+        slots = {key: _PlanSlot(i) for i, key in enumerate(keys)}
+        template = unflatten(slots, sparse)
+    except (TypeError, ValueError):
+        return None
+
+    scope = {}
+    used = set()
+
+    def source(value):
+        if isinstance(value, _PlanSlot):
+            used.add(value.index)
+            return "v{}".format(value.index)
+        if value is None:
+            # Padding in a sparse list
+            return "None"
+        if isinstance(value, list):
+            return "[{}]".format(", ".join(source(item) for item in value))
+        items = []
+        for key, item in value.items():
+            if type(key) not in (str, int):
+                # Keys without a literal form are looked up in the scope
+                scope["k{}".format(len(scope))] = key
+                key = "k{}".format(len(scope) - 1)
+            else:
+                key = repr(key)
+            items.append("{}: {}".format(key, source(item)))
+        return "{{{}}}".format(", ".join(items))
+
+    lines = ["def plan(values):"]
+    try:
+        body = "    return {}".format(source(template))
+        if keys:
+            names = ", ".join("v{}".format(i) for i in range(len(keys)))
+            lines.append("    {}, = values".format(names))
+        lines.append(body)
+        # A key can be overwritten by a later one, which rows can't mirror
+        if len(used) != len(keys):
+            return None
+        exec("\n".join(lines) + "\n", scope)
+    except (RecursionError, SyntaxError, MemoryError):
+        return None
+    return scope["plan"]
+
+
+def unflatten_stream(pairs, subtrees=False, sparse=False):
+    """
+    Return the result of :func:`unflatten` for an iterable of dot-notation
+    ``(key, value)`` pairs, built as they're read rather than from a flat
+    dictionary.
+
+    :param pairs: Iterable of ``(key, value)`` tuples, such as the lines of a
+                  properties file
+    :param bool subtrees: Return a generator of ``(key, value)`` tuples for
+                          each top-level key as soon as its value is complete
+                          (default ``False``)
+    :param bool sparse: Allow lists with missing indexes, the same as with
+                        :func:`unflatten`
+
+    With *subtrees*, all the pairs for a top-level key must come together,
+    as they do when sorted by key, so only one top-level value is held in
+    memory at a time. A :exc:`ValueError` is raised if a top-level key
+    comes back after another one. The root is never converted into a list.
+
+    Unlike :func:`unflatten`, a :exc:`ValueError` is raised whenever a key is
+    assigned a value more than once.
+
+    Example::
+
+        >>> unflatten_stream([('a.b', 1), ('a.c.0', 2), ('d', 3)])
+        {'a': {'b': 1, 'c': [2]}, 'd': 3}
+        >>> list(unflatten_stream([('a.b', 1), ('d', 3)], subtrees=True))
+        [('a', {'b': 1}), ('d', 3)]
+
+    """
+    if subtrees:
+        return _unflatten_subtrees(pairs, sparse)
+
+    root = {}
+    lists = False
+    for key, value in pairs:
+        if _insert_pair(root, key, value):
+            lists = True
+    return _join_lists(root, sparse) if lists else root
+
+
+def _unflatten_subtrees(pairs, sparse):
+    """Generate the top-level items for :func:`unflatten_stream`."""
+    tree = {}
+    seen = set()
+    current = _MISSING
+    lists = False
+    for key, value in pairs:
+        head = key.partition(".")[0] if isinstance(key, str) else key
+        if head != current:
+            if current is not _MISSING:
+                subtree = tree.pop(current)
+                yield current, _join_lists(subtree, sparse) if lists else subtree
+                lists = False
+            if head in seen:
+                raise ValueError("Keys for {!r} aren't together".format(head))
+            seen.add(head)
+            current = head
+        if _insert_pair(tree, key, value):
+            lists = True
+
+    if current is not _MISSING:
+        subtree = tree.pop(current)
+        yield current, _join_lists(subtree, sparse) if lists else subtree
+
+
+def _insert_pair(target, key, value):
+    """
+    Store *value* for the dot-notation *key* in the dict *target*, and
+    return whether it may have added a list-like dict.
+
+    :param dict target: Unflattened dict to store into
+    :param key: Dot-notation key
+    :param value: Value to store
+
+    """
+    if isinstance(key, str) and "." in key:
+        parts = key.split(".")
+        lists = "0" in parts
+        key = parts.pop()
+        for part in parts:
+            current = target.get(part, _MISSING)
+            if current is _MISSING:
+                current = target[part] = {}
+            elif type(current) is not dict:
+                raise ValueError("Value already assigned")
+            target = current
+    else:
+        lists = key == "0" or key == 0
+
+    if key in target:
+        raise ValueError("Value already assigned")
+    if isinstance(value, _CONTAINERS):
+        value, nested = _unflatten(value)
+        lists = lists or nested
+    target[key] = value
+    return lists
+
+
+_FLATTENED = (dict, list, Namespace, RecordList, RecordRow)
+
+
+def flatten(obj, sep=".", lists=True):
+    """
+    Return a generator of ``(key, value)`` tuples for the values in the nested
+    dictionary *obj*, where *key* is the value's dot-notation key. This is the
+    inverse of :func:`unflatten`.
+
+    :param obj: A dict or :class:`Namespace` to flatten
+    :param str sep: Separator to join keys with (default ``'.'``)
+    :param bool lists: Flatten list items, using their indexes as keys
+                       (default ``True``)
+
+    Nested Namespaces and :class:`RecordList` rows are flattened the same as
+    dictionaries, and empty dictionaries and lists are kept as values. Keys
+    are converted to strings.
+
+    Values are generated as they're reached, so only the path to the current
+    value is kept in memory, and each key prefix is only built once.
+
+    ``unflatten(dict(flatten(obj))) == obj`` holds for any *obj* which
+    :func:`unflatten` leaves as it is, meaning it has string keys without dots
+    and no list-like dictionaries.
+
+    Example::
+
+        >>> dict(flatten({'a': {'b': 1, 'c': [2, 3]}}))
+        {'a.b': 1, 'a.c.0': 2, 'a.c.1': 3}
+        >>> dict(flatten({'db': {'host': 'localhost'}}, sep='__'))
+        {'db__host': 'localhost'}
+
+    """
+    items = _flatten_items(obj, lists)
+    if items is None:
+        raise TypeError("Can't flatten {!r}".format(obj))
+    return _flatten(items, sep, lists)
+
+
+def _flatten_items(value, lists):
+    """Return an iterator of *value*'s items, or ``None`` for other values."""
+    if isinstance(value, dict):
+        return iter(value.items())
+    if isinstance(value, Namespace):
+        value._load()
+        return ((name, getattr(value, name)) for name in value.__dict__)
+    if isinstance(value, RecordRow):
+        return iter(value._present())
+    if lists and isinstance(value, (list, RecordList)):
+        return enumerate(value)
+    return None
+
+
+def _flatten(items, sep, lists):
+    """Generate the flattened items for :func:`flatten`."""
+    # Each frame is the key prefix for a container and its remaining items
+    stack = [("", items)]
+    push = stack.append
+    while stack:
+        prefix, items = stack[-1]
+        for key, value in items:
+            key = prefix + (key if type(key) is str else str(key))
+            if isinstance(value, _FLATTENED) and value:
+                items = _flatten_items(value, lists)
+                if items is not None:
+                    push((key + sep, items))
+                    break
+            yield key, value
+        else:
+            stack.pop()
@@ -1,3 +1,4 @@
+import io
 from datetime import datetime
 
 import mock
@@ -46,6 +47,65 @@ def test_from_json(loads):
     loads.assert_called_with(loads.return_value)
 
 
+def test_from_json_namespace():
+    text = pytool.json.as_json(
+        {
+            "a": {"b": 1, "1": 2},
+            "a.c": [{"0": "x", "1": "y"}, {"d.e": 3}],
+            "f.0": "zero",
+            "f.1": "one",
+        }
+    )
+    ns = pytool.json.from_json(text, namespace=True)
+    expected = pytool.lang.Namespace(pytool.json.from_json(text))
+
+    assert isinstance(ns, pytool.lang.Namespace)
+    assert ns.for_json() == expected.for_json()
+    assert ns.a.c[0] == ["x", "y"]
+    assert ns.a.c[1].d.e == 3
+    assert ns.f == ["zero", "one"]
+    assert pytool.json.from_json('{"0": {"a.b": 1}}', namespace=True)[0].a.b == 1
+    assert pytool.json.from_json("[1, {}]", namespace=True)[1].__dict__ == {}
+
+    with pytest.raises(AssertionError):
+        pytool.json.from_json('{"bad key": 1}', namespace=True)
+    with pytest.raises(ValueError):
+        pytool.json.from_json('{"a": 1, "a.b": 2}', namespace=True)
+    with pytest.raises(ValueError):
+        pytool.json.from_json('{"a": ["x"], "a.1": "y"}', namespace=True)
+
+    text = '{"a": {"0": "x"}, "a.1": "y", "b": {"0": {"0": 1}}, "b.0.1": 2}'
+    ns = pytool.json.from_json(text, namespace=True)
+    expected = pytool.lang.Namespace(pytool.json.from_json(text))
+    assert ns.a == ["x", "y"]
+    assert ns.b == [[1, 2]]
+    assert ns.for_json() == expected.for_json()
+
+    for text in (
+        '{"a.b": 1, "a": 5}',
+        '{"a.b": 1, "a": {"c": 2}}',
+        '{"a.0": 1, "a": [2]}',
+    ):
+        ns = pytool.json.from_json(text, namespace=True)
+        expected = pytool.lang.Namespace(pytool.json.from_json(text))
+        assert ns.for_json() == expected.for_json()
+
+
+def test_from_json_namespace_options():
+    ns = pytool.json.from_json('{"a.b": {"c.d": 1}}', namespace=True, expand=False)
+    assert list(ns.__dict__) == ["a.b"]
+    assert ns.__dict__["a.b"].__dict__ == {"c.d": 1}
+
+    ks = pytool.json.from_json('{"a": {"b-c": 1}}', namespace=pytool.lang.Keyspace)
+    assert isinstance(ks.a, pytool.lang.Keyspace)
+    assert ks["a"]["b-c"] == 1
+
+    text = '{"rows": [{"id": 1}, {"id": 2}]}'
+    records = pytool.json.from_json(text, namespace=pytool.lang.RecordNamespace)
+    assert isinstance(records.rows, pytool.lang.RecordList)
+    assert records.rows[1].id == 2
+
+
 def test_as_json_with_bson():
     obj = pytool.json.bson.ObjectId()
     assert pytool.json.as_json(obj) == pytool.json.as_json(str(obj))
@@ -110,3 +170,49 @@ def test_for_json_hook_called_when_dict_subclass_buried_in_objects():
 
     obj = {"list": [Test()]}
     assert pytool.json.as_json(obj) == '{"list": [{"for_json": 1}]}'
+
+
+def _namespace():
+    ns = pytool.lang.Namespace({"foo": {"bar": [1, 2.5, {"baz": None}]}})
+    ns.spam = {"eggs": [pytool.lang.Namespace({"ham": "ü"})], 1: (True,)}
+    ns.when = datetime(2020, 1, 2)
+    ns.proxy = pytool.proxy.DictProxy({"list": pytool.proxy.ListProxy([ns.foo])})
+    ns.empty = pytool.lang.Keyspace()
+    return ns
+
+
+def test_as_json_namespace_matches_simplejson():
+    ns = _namespace()
+    expected = pytool.json.json.dumps(ns, default=pytool.json._default, for_json=True)
+
+    assert pytool.json.as_json(ns) == expected
+    assert pytool.json.as_json(ns.proxy) == pytool.json.as_json(ns.proxy.for_json())
+
+
+def test_as_json_namespace_does_not_call_for_json():
+    ns = _namespace()
+    del ns.spam
+    expected = pytool.json.as_json(ns)
+    with mock.patch.object(pytool.lang.Namespace, "for_json") as for_json:
+        assert pytool.json.as_json(ns) == expected
+
+    assert not for_json.called
+
+
+def test_as_json_namespace_circular():
+    ns = pytool.lang.Namespace()
+    ns.foo.rows = [ns]
+
+    with pytest.raises(ValueError):
+        pytool.json.as_json(ns)
+
+
+def test_write_json():
+    ns = _namespace()
+    fp = io.StringIO()
+    pytool.json.write_json(ns, fp)
+    assert fp.getvalue() == pytool.json.as_json(ns)
+
+    fp = io.StringIO()
+    pytool.json.write_json([1, {"a": "b"}], fp)
+    assert fp.getvalue() == '[1, {"a": "b"}]'
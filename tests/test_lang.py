@@ -1,6 +1,10 @@
 import copy
 import gc
 import inspect
+import pickle
+import sys
+import threading
+import weakref
 
 import pytest
 import simplejson
@@ -344,6 +348,39 @@ def test_namespaces_coerce_lists_and_recurse():
     assert ns.alpha[2].foo.bar == 2
 
 
+def test_namespaces_coerce_nested_lists():
+    obj = {"alpha": {"0": {"0": "zero"}, "1": {"a.0": 1, "a.1": 2}}}
+    ns = pytool.lang.Namespace(obj)
+    assert ns.alpha[0] == ["zero"]
+    assert ns.alpha[1].a == [1, 2]
+
+
+def test_namespaces_merge_dot_notation_into_nested_dicts():
+    obj = {"foo": {"bar": {"one": 1}}, "foo.bar.two": 2, "foo.spam": 3}
+    ns = pytool.lang.Namespace(obj)
+    assert ns.as_dict() == {"foo.bar.one": 1, "foo.bar.two": 2, "foo.spam": 3}
+
+
+def test_namespaces_do_not_mutate_the_source_dict():
+    obj = {"foo": {"bar": 1, "list": [{"a.b": 1}]}, "foo.baz": 2}
+    expected = copy.deepcopy(obj)
+    ns = pytool.lang.Namespace(obj)
+    ns.foo.list[0].a.b = 3
+    assert obj == expected
+
+
+def test_namespaces_reject_conflicting_dot_notation():
+    obj = {"foo": {"bar": 1}, "foo.bar": 2}
+    with pytest.raises(ValueError):
+        pytool.lang.Namespace(obj)
+
+
+def test_namespaces_reject_bad_nested_key_names():
+    obj = {"foo": [{"key-name": 1}]}
+    with pytest.raises(AssertionError):
+        pytool.lang.Namespace(obj)
+
+
 def test_namespaces_reject_top_level_lists():
     obj = {"0": "zero", "1": "one", "2": "two"}
     with pytest.raises(AssertionError):
@@ -516,6 +553,157 @@ def test_hashed_singleton_preserves_staticmethods():
     assert t.static() == "static"
 
 
+def test_hashed_singleton_unhashable_args():
+    config = {"host": "localhost", "ports": [80, 443], "tags": {"a"}}
+    t = HashedSingleton(config, n=[1])
+    assert t is HashedSingleton(copy.deepcopy(config), n=[1])
+    reordered = {"tags": {"a"}, "ports": [80, 443], "host": "localhost"}
+    assert t is HashedSingleton(reordered, n=[1])
+    assert t is not HashedSingleton(config, n=(1,))
+    assert t is not HashedSingleton(dict(config, ports=(80, 443)), n=[1])
+    assert t is not HashedSingleton(config)
+
+    ns = pytool.lang.Namespace({"a": {"b": [1, {"c": 2}]}})
+    t = HashedSingleton(ns)
+    assert t is HashedSingleton(ns.copy())
+    assert t is not HashedSingleton(ns.as_dict())
+
+    assert HashedSingleton([1, 2]) is not HashedSingleton((list, (1, 2)))
+    assert HashedSingleton([1, 2]) is not HashedSingleton([(1, 2)])
+    assert HashedSingleton({"a": 1}) is not HashedSingleton((dict, {("a", 1)}))
+    assert HashedSingleton({1}, []) is not HashedSingleton(frozenset([1]), [])
+
+    with pytest.raises(TypeError):
+        HashedSingleton(pytool.lang.RecordList())
+
+
+def test_hashed_singleton_identity():
+    @pytool.lang.hashed_singleton(identity=True)
+    class Test(object):
+        def __init__(self, *args, **kwargs):
+            pass
+
+    config = {"host": "localhost"}
+    t = Test(config, "name", n=config)
+    assert t is Test(config, "name", n=config)
+    assert t is not Test(dict(config), "name", n=config)
+
+
+def test_hashed_singleton_binds_signature():
+    @pytool.lang.hashed_singleton
+    class Test(object):
+        def __init__(self, host, port=80, *args, timeout=None, **options):
+            self.host = host
+
+    t = Test("localhost")
+    assert t is Test(host="localhost")
+    assert t is Test("localhost", 80)
+    assert t is Test("localhost", port=80, timeout=None)
+    assert t is not Test("localhost", 81)
+    assert t is not Test("localhost", 80, "extra")
+    assert t is not Test("localhost", retries=2)
+    assert Test("localhost", a=1, b=2) is Test("localhost", b=2, a=1)
+
+    with pytest.raises(TypeError, match=r"Test.__init__\(\) missing"):
+        Test()
+
+    @pytool.lang.hashed_singleton
+    class Positional(object):
+        def __init__(self, a, b=[], /, *, c):
+            pass
+
+    p = Positional(1, c=2)
+    assert p is Positional(1, [], c=2)
+    assert p is not Positional(1, [1], c=2)
+    with pytest.raises(TypeError):
+        Positional(a=1, c=2)
+
+    # Classes without a signature use the arguments as they're given
+    Dict = pytool.lang.hashed_singleton(maxsize=8)(dict)
+    assert Dict(a=1) is Dict(a=1)
+
+
+def test_hashed_singleton_cache_info():
+    @pytool.lang.hashed_singleton
+    class Test(object):
+        pass
+
+    t = Test()
+    assert t is Test()
+    assert Test.cache_info() == (1, 1, 0, None, 1)
+
+    Test.cache_clear()
+    assert Test.cache_info() == (0, 0, 0, None, 0)
+    assert Test() is not t
+
+
+def test_hashed_singleton_maxsize():
+    @pytool.lang.hashed_singleton(maxsize=2)
+    class Test(object):
+        def __init__(self, key):
+            self.key = key
+
+    a, b = Test("a"), Test("b")
+    assert Test("a") is a
+    Test("c")
+    assert Test("a") is a
+    assert Test("b") is not b
+    info = Test.cache_info()
+    assert (info.hits, info.misses, info.evictions) == (2, 4, 2)
+    assert (info.maxsize, info.currsize) == (2, 2)
+
+    # Instances are kept even without any other references
+    ident = id(Test("b"))
+    gc.collect()
+    assert id(Test("b")) == ident
+
+    with pytest.raises(ValueError):
+        pytool.lang.hashed_singleton(maxsize=0)
+
+
+def test_hashed_singleton_maxsize_lost_race():
+    @pytool.lang.hashed_singleton(maxsize=2)
+    class Test(object):
+        def __init__(self, key):
+            self.key = key
+            if key == "b" and not stored:
+                # Store another instance first, then touch "a" so the
+                # instance returned here has to be moved back to the end
+                stored.append(None)
+                stored[0] = Test("b")
+                Test("a")
+
+    stored = []
+    Test("a")
+    assert Test("b") is stored[0]
+    Test("c")
+    assert Test("b") is stored[0]
+
+
+def test_hashed_singleton_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(pytool.lang.time, "monotonic", lambda: now[0])
+
+    @pytool.lang.hashed_singleton(ttl=10)
+    class Test(object):
+        def __init__(self, key):
+            self.key = key
+
+    a = Test("a")
+    now[0] += 5
+    b = Test("b")
+    assert Test("a") is a
+    now[0] += 6
+    assert Test("a") is not a
+    assert Test("b") is b
+    now[0] += 20
+    Test("c")
+    assert Test.cache_info() == (2, 4, 3, None, 1)
+
+    with pytest.raises(ValueError):
+        pytool.lang.hashed_singleton(ttl=0)
+
+
 def test_singleton_no_args():
     s = Singleton()
     assert s is Singleton()
@@ -574,6 +762,195 @@ def test_unflatten():
     assert result == expected
 
 
+def test_unflatten_deep():
+    depth = sys.getrecursionlimit() * 2
+    obj = "leaf"
+    for i in range(depth):
+        obj = {"a.b": [obj], "c.0": i, "c.1": i}
+
+    result = pytool.lang.unflatten(obj)
+    for i in reversed(range(depth)):
+        assert result["c"] == [i, i]
+        result = result["a"]["b"][0]
+    assert result == "leaf"
+
+    with pytest.raises(ValueError):
+        pytool.lang.unflatten({"a": {"b": 1}, "a.b": 2})
+
+
+def test_unflatten_nested_lists():
+    obj = {"a.0.0": 1, "a.0.1": 2, "b.0.c.0": 3, "d.0": {"e.0": 4}}
+
+    assert pytool.lang.unflatten(obj) == {
+        "a": [[1, 2]],
+        "b": [{"c": [3]}],
+        "d": [{"e": [4]}],
+    }
+
+
+def test_unflatten_sparse():
+    obj = {
+        "gap.0": "a",
+        "gap.2": "c",
+        "ids.0": "root",
+        "ids.1001": "user",
+        "dupe.0": 0,
+        "dupe.00": 1,
+        "shuffled": {"2": "c", "0": "a", "1": "b"},
+    }
+
+    assert pytool.lang.unflatten(obj) == {
+        "gap": {"0": "a", "2": "c"},
+        "ids": {"0": "root", "1001": "user"},
+        "dupe": {"0": 0, "00": 1},
+        "shuffled": ["a", "b", "c"],
+    }
+    assert pytool.lang.unflatten(obj, sparse=True) == {
+        "gap": ["a", None, "c"],
+        "ids": {"0": "root", "1001": "user"},
+        "dupe": {"0": 0, "00": 1},
+        "shuffled": ["a", "b", "c"],
+    }
+    rows = [{"a.0": 1, "a.2": 3}]
+    assert list(pytool.lang.unflatten_many(rows, sparse=True)) == [{"a": [1, None, 3]}]
+    pairs = rows[0].items()
+    assert pytool.lang.unflatten_stream(pairs, sparse=True) == {"a": [1, None, 3]}
+
+
+def test_unflatten_many():
+    rows = [
+        {"user.id": 1, "user.tags.0": "a", "user.tags.1": "b", "n": 1},
+        {"user.id": 2, "user.tags.0": {"c.d": 1}, "user.tags.1": [{"e.0": 2}], "n": 2},
+        {"user.id": 3, "user.tags.0": None, "user.tags.1": None, "n": 3},
+        {"n": 4, "user.id": 4},
+        {"a.0": 1, "a.00": 2},
+        {"a.b": 2, "a": 1},
+        [{"f.g": 5}],
+        "value",
+    ]
+
+    result = pytool.lang.unflatten_many(iter(rows[:-1]))
+    assert inspect.isgenerator(result)
+    assert list(result) == [pytool.lang.unflatten(row) for row in rows[:-1]]
+    assert list(pytool.lang.unflatten_many(rows[-1:])) == ["value"]
+
+    with pytest.raises(TypeError):
+        list(pytool.lang.unflatten_many([{"a.b": 1, "a": 2}, {"a": 1, "a.b": 2}]))
+
+
+def test_unflatten_many_stops_compiling_plans(monkeypatch):
+    compiled = []
+    compile_plan = pytool.lang._compile_plan
+
+    def _compile_plan(keys, sparse=False):
+        compiled.append(keys)
+        return compile_plan(keys, sparse)
+
+    monkeypatch.setattr(pytool.lang, "_compile_plan", _compile_plan)
+    limit = pytool.lang._PLAN_LIMIT
+    rows = [{"a.b": i, "c{}.d".format(i % (limit * 2)): i} for i in range(limit * 4)]
+
+    expected = [pytool.lang.unflatten(row) for row in rows]
+
+    assert list(pytool.lang.unflatten_many(rows)) == expected
+    assert len(compiled) == limit
+
+
+def test_unflatten_stream():
+    pairs = [
+        ("a.b", 1),
+        ("a.c.0", {"d.e": 2}),
+        ("a.c.1", [3]),
+        ("f", 4),
+        ("g.0", 5),
+        ("g.1", 6),
+    ]
+    expected = {"a": {"b": 1, "c": [{"d": {"e": 2}}, [3]]}, "f": 4, "g": [5, 6]}
+
+    assert pytool.lang.unflatten_stream(iter(pairs)) == expected
+    assert pytool.lang.unflatten_stream(pairs) == pytool.lang.unflatten(dict(pairs))
+    assert pytool.lang.unflatten_stream([("0", 1), ("1.a", 2)]) == [1, {"a": 2}]
+
+    subtrees = pytool.lang.unflatten_stream(iter(pairs), subtrees=True)
+    assert inspect.isgenerator(subtrees)
+    assert next(subtrees) == ("a", expected["a"])
+    assert list(subtrees) == [("f", 4), ("g", [5, 6])]
+
+    for pairs in ([("a", 1), ("a", 2)], [("a", 1), ("a.b", 2)], [("a.b", 1), ("a", 2)]):
+        with pytest.raises(ValueError):
+            pytool.lang.unflatten_stream(pairs)
+
+    subtrees = pytool.lang.unflatten_stream(
+        [("a.b", 1), ("c", 2), ("a.d", 3)], subtrees=True
+    )
+    assert next(subtrees) == ("a", {"b": 1})
+    assert next(subtrees) == ("c", 2)
+    with pytest.raises(ValueError):
+        next(subtrees)
+
+
+def test_flatten():
+    obj = {
+        "nest": {"sub": 1, "empty": {}},
+        "arr": [3, [4, 5], {"six": 6}, []],
+        "none": None,
+    }
+
+    flat = pytool.lang.flatten(obj)
+    assert inspect.isgenerator(flat)
+    assert dict(flat) == {
+        "nest.sub": 1,
+        "nest.empty": {},
+        "arr.0": 3,
+        "arr.1.0": 4,
+        "arr.1.1": 5,
+        "arr.2.six": 6,
+        "arr.3": [],
+        "none": None,
+    }
+    assert pytool.lang.unflatten(dict(pytool.lang.flatten(obj))) == obj
+
+    assert dict(pytool.lang.flatten(obj, sep="__", lists=False)) == {
+        "nest__sub": 1,
+        "nest__empty": {},
+        "arr": [3, [4, 5], {"six": 6}, []],
+        "none": None,
+    }
+    assert dict(pytool.lang.flatten([{1: "a"}])) == {"0.1": "a"}
+
+    with pytest.raises(TypeError):
+        pytool.lang.flatten("value")
+
+
+def test_flatten_namespace():
+    ns = pytool.lang.Namespace({"a": {"b": 1}, "c": [{"d": 2}]})
+
+    assert dict(pytool.lang.flatten(ns)) == {"a.b": 1, "c.0.d": 2}
+    assert dict(pytool.lang.flatten(ns, lists=False)) == dict(ns.iteritems())
+
+
+def test_flatten_record_namespace():
+    ns = pytool.lang.RecordNamespace({"u": [{"a": 1, "b": {"c": 2}}, {"a": 3, "b": 4}]})
+    del ns.u[0].a
+
+    assert isinstance(ns.u, pytool.lang.RecordList)
+    assert dict(pytool.lang.flatten(ns)) == {"u.0.b.c": 2, "u.1.a": 3, "u.1.b": 4}
+    assert dict(pytool.lang.flatten(ns, lists=False)) == {"u": ns.u}
+    assert dict(pytool.lang.flatten(ns.u[1])) == {"a": 3, "b": 4}
+
+
+def test_flatten_deep():
+    depth = sys.getrecursionlimit() * 2
+    obj = "leaf"
+    for i in range(depth):
+        obj = {"a": [obj], "b": i}
+
+    flat = dict(pytool.lang.flatten(obj))
+    assert len(flat) == depth + 1
+    assert flat[".".join(["a.0"] * depth)] == "leaf"
+    assert pytool.lang.unflatten(flat) == obj
+
+
 def test_namespace_copy():
     a = pytool.lang.Namespace()
     a.foo = "one"
@@ -750,3 +1127,1057 @@ def test_namespace_items_nested():
     ns_items = {k: v for k, v in ns.items()}
 
     assert ns_items == {"foo.bar": "foobar", "fooby": "foobaz"}
+
+
+def test_namespace_pending_item_name():
+    obj = {"_pending": {"a": 1}, "b": 2}
+    for ns in (pytool.lang.Namespace(obj), pytool.lang.LazyNamespace(obj)):
+        assert ns.as_dict() == {"_pending.a": 1, "b": 2}
+        assert ns._pending.a == 1
+        assert ns.copy(shared=True).as_dict() == {"_pending.a": 1, "b": 2}
+
+
+def test_namespace_flag_item_names():
+    obj = {"_vivify": 0, "_descriptors": 0, "_records": 1, "_VALID_NAME": 0}
+    ns = pytool.lang.Namespace(obj)
+    ns.from_dict({"rows": [{"a": 1}, {"a": 2}]})
+    ns.missing.value = 1
+
+    assert ns.missing.value == 1
+    assert ns._vivify == 0
+    assert type(ns.rows) is list
+    assert pytool.json.as_json(ns) == pytool.json.as_json(ns.for_json())
+
+    fast = pytool.lang.FastNamespace({"_descriptors": 1, "a": {"b": 1}})
+    assert pytool.json.as_json(fast) == '{"_descriptors": 1, "a": {"b": 1}}'
+
+
+def test_lazy_namespace_converts_on_access():
+    obj = {"foo": {"bar": 1}, "spam": {"eggs": 2}}
+    ns = pytool.lang.LazyNamespace(obj)
+    assert ns.__dict__ == {}
+    assert ns.foo.bar == 1
+    assert list(ns.__dict__) == ["foo"]
+    assert type(ns.foo) is pytool.lang.LazyNamespace
+
+
+def test_lazy_namespace_memoizes_items():
+    ns = pytool.lang.LazyNamespace({"foo": {"bar": 1}})
+    assert ns.foo is ns.foo
+    ns.foo.bar = 2
+    assert ns.foo.bar == 2
+
+
+def test_lazy_namespace_does_not_mutate_the_source_dict():
+    obj = {"foo": {"bar": 1}, "foo.baz": 2, "rows": [{"a": 1}]}
+    expected = copy.deepcopy(obj)
+    ns = pytool.lang.LazyNamespace(obj)
+    ns.foo.bar = 3
+    ns["rows.0"].a = 4
+    ns.new = 5
+    assert ns.as_dict() == {
+        "foo.bar": 3,
+        "foo.baz": 2,
+        "rows": [{"a": 4}],
+        "new": 5,
+    }
+    assert obj == expected
+
+
+def test_lazy_namespace_matches_namespace():
+    obj = {
+        "dot.first": 1,
+        "arr.0": 3,
+        "arr.1": 4,
+        "more": [{"down.first": 1}, {"0": "zero"}, 3],
+        "nest": {"sub": {"value": True}},
+    }
+    ns = pytool.lang.Namespace(obj)
+    lazy = pytool.lang.LazyNamespace(obj)
+    assert lazy.for_json() == ns.for_json()
+    assert lazy.as_dict() == ns.as_dict()
+    assert list(lazy.__dict__) == list(ns.__dict__)
+
+
+def test_lazy_namespace_traversal():
+    ns = pytool.lang.LazyNamespace({"foo": [{"bar": {"baz": 1}}]})
+    assert ns["foo.0.bar.baz"] == 1
+    assert ns.traverse(["foo", 0, "bar"]).baz == 1
+
+
+def test_lazy_namespace_contains():
+    ns = pytool.lang.LazyNamespace({"foo": {"bar": 1}, "empty": {}})
+    assert "foo" in ns
+    assert "foo.bar" in ns
+    assert "foo.baz" not in ns
+    assert "empty" not in ns
+    assert "missing" not in ns
+    assert "missing" not in ns.__dict__
+
+
+def test_lazy_namespace_bool():
+    assert not pytool.lang.LazyNamespace({})
+    assert pytool.lang.LazyNamespace({"foo": 1})
+
+
+def test_lazy_namespace_delete():
+    ns = pytool.lang.LazyNamespace({"foo": 1, "bar": 2})
+    del ns.foo
+    assert ns.as_dict() == {"bar": 2}
+
+
+def test_lazy_namespace_reports_bad_names_on_access():
+    ns = pytool.lang.LazyNamespace({"key-name": 1})
+    with pytest.raises(AssertionError):
+        ns["key-name"]
+
+
+def test_lazy_namespace_merges_dicts():
+    ns = pytool.lang.LazyNamespace({"foo": {"bar": 1}})
+    ns.from_dict({"spam": 2})
+    assert ns.as_dict() == {"foo.bar": 1, "spam": 2}
+
+
+def test_namespace_compile_path():
+    ns = pytool.lang.Namespace({"foo": [{"bar": {"baz": 1}}, 2]})
+    get = pytool.lang.Namespace.compile_path("foo.0.bar.baz")
+    assert get(ns) == 1
+    assert get(pytool.lang.Namespace({"foo": [{"bar": {"baz": 2}}]})) == 2
+
+
+def test_namespace_compile_path_from_keys():
+    ns = pytool.lang.Namespace()
+    ns.foo = {"first": pytool.lang.Namespace({"color": "red"})}
+    get = pytool.lang.Namespace.compile_path(["foo", "first", "color"])
+    assert get(ns) == "red"
+
+
+def test_namespace_compile_path_is_cached():
+    compile_path = pytool.lang.Namespace.compile_path
+    assert compile_path("foo.bar") is compile_path("foo.bar")
+
+
+def test_namespace_compile_path_matches_traverse_errors():
+    ns = pytool.lang.Namespace()
+    ns.foo = [1, 2]
+
+    with pytest.raises(IndexError):
+        pytool.lang.Namespace.compile_path("foo.2")(ns)
+
+    with pytest.raises(TypeError):
+        pytool.lang.Namespace.compile_path("foo.1e9")(ns)
+
+
+def test_namespace_compile_path_creates_namespaces_like_getitem():
+    ns = pytool.lang.Namespace()
+    ns.one.two = 1
+    assert pytool.lang.Namespace.compile_path("one.three")(ns).as_dict() == {}
+    assert "one.three" not in ns
+
+
+def test_namespace_compile_path_reads_descriptors():
+    class Descriptor(object):
+        def __get__(self, instance, owner):
+            return "Descriptor Value"
+
+    ns = pytool.lang.Namespace()
+    ns.foo.desc = Descriptor()
+    assert pytool.lang.Namespace.compile_path("foo.desc")(ns) == "Descriptor Value"
+
+
+def test_namespace_compile_path_lazy_namespace():
+    ns = pytool.lang.LazyNamespace({"foo": [{"bar": 1}]})
+    assert pytool.lang.Namespace.compile_path("foo.0.bar")(ns) == 1
+
+
+def test_namespace_getter():
+    ns = pytool.lang.Namespace({"server": {"host": "localhost", "port": 80}})
+    get_host = pytool.lang.Namespace.getter("server.host")
+    get_both = pytool.lang.Namespace.getter("server.host", "server.port")
+    assert get_host(ns) == "localhost"
+    assert get_both(ns) == ("localhost", 80)
+
+
+def test_namespace_copy_keeps_key_names_and_empty_namespaces():
+    ks = pytool.lang.Keyspace()
+    ks["dotted.key"] = 1
+    ks.empty = pytool.lang.Keyspace()
+    ks2 = ks.copy()
+
+    assert ks2.__dict__["dotted.key"] == 1
+    assert type(ks2.empty) is pytool.lang.Keyspace
+    assert ks2.empty is not ks.empty
+
+
+def test_namespace_copy_converts_dicts():
+    ns = pytool.lang.Namespace()
+    ns.foo = {"bar": [{"baz": 1}]}
+    ns2 = ns.copy()
+
+    assert ns2.foo.bar[0].baz == 1
+    ns2.foo.bar[0].baz = 2
+    assert ns.foo == {"bar": [{"baz": 1}]}
+
+
+def test_namespace_shared_copy():
+    ns = pytool.lang.Namespace({"foo": {"bar": {"baz": 1}}, "spam": {"eggs": 2}})
+    ns2 = ns.copy(shared=True)
+
+    assert ns2.as_dict() == ns.as_dict()
+    assert type(ns2) is pytool.lang.Namespace
+
+
+def test_namespace_shared_copy_writes_do_not_affect_original():
+    ns = pytool.lang.Namespace({"foo": {"bar": {"baz": 1}}, "spam": {"eggs": 2}})
+    ns2 = ns.copy(shared=True)
+    ns2.foo.bar.baz = 2
+    ns2.foo.new = 3
+
+    assert ns.as_dict() == {"foo.bar.baz": 1, "spam.eggs": 2}
+    assert ns2.as_dict() == {"foo.bar.baz": 2, "foo.new": 3, "spam.eggs": 2}
+
+
+def test_namespace_shared_copy_only_copies_accessed_items():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}, "spam": {"eggs": 2}})
+    ns2 = ns.copy(shared=True)
+    ns2.foo.bar = 2
+
+    assert list(ns2.__dict__) == ["foo"]
+    assert ns2.foo is not ns.foo
+    assert pytool.lang._get_pending(ns2)["spam"] is ns.spam
+
+
+def test_namespace_shared_copy_lists():
+    ns = pytool.lang.Namespace({"foo": [{"bar": 1}, [1, 2]]})
+    ns2 = ns.copy(shared=True)
+    ns2.foo[0].bar = 2
+    ns2.foo[1].append(3)
+
+    assert ns.foo[0].bar == 1
+    assert ns.foo[1] == [1, 2]
+    assert ns2.foo[1] == [1, 2, 3]
+
+
+def test_namespace_shared_copy_of_shared_copy():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}})
+    ns2 = ns.copy(shared=True)
+    ns2.spam = 2
+    ns3 = ns2.copy(shared=True)
+    ns3.foo.bar = 3
+
+    assert ns.foo.bar == 1
+    assert ns2.foo.bar == 1
+    assert ns3.as_dict() == {"foo.bar": 3, "spam": 2}
+
+
+def test_namespace_shared_copy_delete_pending_item():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}, "spam": 2})
+    space = ns.copy(shared=True)
+    del space.spam
+
+    assert space.as_dict() == {"foo.bar": 1}
+    assert type(space) is pytool.lang.Namespace
+    assert ns.spam == 2
+
+
+def test_namespace_shared_copy_keeps_item_order():
+    ns = pytool.lang.Namespace({"a": {"x": 1}, "b": 2, "c": {"y": 3}})
+    ns2 = ns.copy(shared=True)
+    ns2.c.y = 4
+    ns2.d = 5
+
+    assert list(ns2.as_dict()) == ["a.x", "b", "c.y", "d"]
+
+
+def test_lazy_namespace_copy():
+    obj = {"foo": {"bar": 1}, "spam": [{"eggs": 2}]}
+    ns = pytool.lang.LazyNamespace(obj)
+    ns2 = ns.copy()
+    ns3 = ns.copy(shared=True)
+    ns2.foo.bar = 2
+    ns3["spam.0"].eggs = 3
+
+    assert ns.as_dict() == {"foo.bar": 1, "spam": [{"eggs": 2}]}
+    assert ns2.as_dict() == {"foo.bar": 2, "spam": [{"eggs": 2}]}
+    assert ns3.as_dict() == {"foo.bar": 1, "spam": [{"eggs": 3}]}
+    assert obj == {"foo": {"bar": 1}, "spam": [{"eggs": 2}]}
+
+
+def test_namespace_index():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1, "baz": [{"a": 1}]}, "spam": 2})
+    expected = ns.as_dict()
+    ns.use_index()
+
+    assert ns.as_dict() == expected
+    assert dict(ns.items()) == dict(ns.iteritems())
+    assert ns.as_dict("base") == {"base." + k: v for k, v in expected.items()}
+    assert "foo.bar" in ns
+    assert "foo" in ns
+    assert "foo.missing" not in ns
+    assert "foo.missing" not in ns.foo.__dict__
+
+
+def test_namespace_index_item_names():
+    ns = pytool.lang.Namespace({"_index": 5, "_watchers": [1], "a": {"_index": 1}})
+    assert ns.as_dict() == {"_index": 5, "_watchers": [1], "a._index": 1}
+
+    ns.use_index()
+    ns.as_dict()
+    ns.a._watchers = 2
+    assert ns.as_dict()["a._watchers"] == 2
+    assert "a._watchers" in ns
+
+
+def test_namespace_index_is_cached():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}})
+    ns.use_index()
+    ns.as_dict()
+    ns.foo.__dict__["bar"] = 2  # Not tracked
+
+    assert ns.as_dict() == {"foo.bar": 1}
+
+
+def test_namespace_index_tracks_assignment():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1, "baz": {"a": 1}}, "spam": 2})
+    ns.use_index()
+    ns.as_dict()
+
+    ns.foo.bar = 2
+    ns.foo.baz = {"b": 2}
+    ns.new.value = 3
+    ns.spam = pytool.lang.Namespace({"eggs": 4})
+
+    assert ns.as_dict() == {
+        "foo.bar": 2,
+        "foo.baz": {"b": 2},
+        "new.value": 3,
+        "spam.eggs": 4,
+    }
+
+    ns.spam.eggs = 5
+    del ns.foo
+    assert ns.as_dict() == {"new.value": 3, "spam.eggs": 5}
+
+
+def test_namespace_index_stops_tracking_removed_subtrees():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}})
+    ns.use_index()
+    ns.as_dict()
+
+    old = ns.foo
+    ns.foo = 2
+    old.bar = 3
+    old.baz = 4
+
+    assert ns.as_dict() == {"foo": 2}
+    assert pytool.lang._get_watchers(old) is None
+
+
+def test_namespace_index_tracks_keyspace_items():
+    ks = pytool.lang.Keyspace({"foo": {"key-name": 1}})
+    ks.use_index()
+    ks.as_dict()
+    ks.foo["key-name"] = 2
+    ks["other"] = 3
+
+    assert ks.as_dict() == {"foo.key-name": 2, "other": 3}
+
+
+def test_namespace_index_disabled():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}})
+    ns.use_index()
+    ns.as_dict()
+    ns.use_index(False)
+    ns.foo.__dict__["bar"] = 2
+    ns.foo.baz = 3
+
+    assert ns.as_dict() == {"foo.bar": 2, "foo.baz": 3}
+    assert pytool.lang._get_watchers(ns.foo) is None
+    assert type(ns.foo) is pytool.lang.Namespace
+
+
+def test_namespace_index_keeps_class():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}})
+    ns.use_index()
+    ns.as_dict()
+
+    assert type(ns) is pytool.lang.Namespace
+    assert type(ns.foo) is pytool.lang.Namespace
+    assert type(ns.copy(shared=True)) is pytool.lang.Namespace
+    assert type(ns.copy().foo) is pytool.lang.Namespace
+
+    lazy = pytool.lang.LazyNamespace({"foo": {"bar": 1}})
+    lazy.use_index()
+    lazy.as_dict()
+    assert type(lazy.foo) is pytool.lang.LazyNamespace
+
+
+def test_namespace_index_pickles_as_plain_namespace():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}})
+    ns.use_index()
+    ns.as_dict()
+
+    space = pickle.loads(pickle.dumps(ns))
+    assert space.as_dict() == {"foo.bar": 1}
+    assert type(space) is pytool.lang.Namespace
+    assert type(space.foo) is pytool.lang.Namespace
+
+
+def test_fast_namespace():
+    ns = pytool.lang.FastNamespace({"foo": {"bar": 1}, "rows": [{"a": 1}]})
+    ns.spam.eggs = 2
+
+    assert ns.foo.bar == 1
+    assert type(ns.foo) is pytool.lang.FastNamespace
+    assert type(ns.rows[0]) is pytool.lang.FastNamespace
+    assert ns["rows.0.a"] == 1
+    assert "spam.eggs" in ns
+    assert ns.as_dict() == {"foo.bar": 1, "rows": [{"a": 1}], "spam.eggs": 2}
+    assert ns.for_json() == {"foo": {"bar": 1}, "rows": [{"a": 1}], "spam": {"eggs": 2}}
+    assert ns.copy().as_dict() == ns.as_dict()
+
+
+def test_fast_namespace_does_not_implement_descriptor_reads():
+    class Descriptor(object):
+        def __get__(self, instance, owner):
+            return "Descriptor Value"
+
+    desc = Descriptor()
+    ns = pytool.lang.FastNamespace()
+    ns.desc = desc
+
+    assert ns.desc is desc
+    assert ns["desc"] is desc
+    assert pytool.lang.Namespace.compile_path("desc")(ns) is desc
+    assert ns.as_dict() == {"desc": desc}
+    assert ns.copy().desc is desc
+
+
+def test_namespace_merge():
+    defaults = {"server": {"host": "localhost", "port": 80}, "debug": False}
+    config = pytool.lang.Namespace({"server": {"port": 8080}})
+    env = {"server.tls.enabled": True, "debug": True}
+
+    ns = pytool.lang.Namespace.merge(defaults, config, env)
+
+    assert ns.as_dict() == {
+        "server.host": "localhost",
+        "server.port": 8080,
+        "server.tls.enabled": True,
+        "debug": True,
+    }
+    assert type(ns) is pytool.lang.Namespace
+
+
+def test_namespace_merge_replaces_non_mappings():
+    ns = pytool.lang.Namespace.merge(
+        {"foo": {"bar": 1}, "spam": 1}, {"foo": 2, "spam": {"eggs": 2}}
+    )
+    assert ns.as_dict() == {"foo": 2, "spam.eggs": 2}
+
+
+def test_namespace_merge_lists():
+    layers = ({"foo": [1, 2], "bar": {"0": "a"}}, {"foo": [3], "bar": ["b"]})
+
+    replaced = pytool.lang.Namespace.merge(*layers)
+    appended = pytool.lang.Namespace.merge(*layers, strategy="append")
+
+    assert replaced.as_dict() == {"foo": [3], "bar": ["b"]}
+    assert appended.as_dict() == {"foo": [1, 2, 3], "bar": ["a", "b"]}
+
+
+def test_namespace_merge_bad_strategy():
+    with pytest.raises(ValueError):
+        pytool.lang.Namespace.merge({}, strategy="bogus")
+
+
+def test_namespace_merge_bad_layers():
+    with pytest.raises(AssertionError):
+        pytool.lang.Namespace.merge({"foo": 1}, ["foo"])
+
+    with pytest.raises(AssertionError):
+        pytool.lang.Namespace.merge({"key-name": 1})
+
+
+def test_namespace_merge_shares_untouched_subtrees():
+    base = pytool.lang.Namespace({"foo": {"bar": {"baz": 1}}, "spam": {"eggs": 2}})
+    ns = pytool.lang.Namespace.merge(base, {"foo": {"new": 3}})
+
+    assert ns.foo is not base.foo
+    assert pytool.lang._get_pending(ns.foo)["bar"] is base.foo.bar
+    ns.spam.eggs = 4
+    ns.foo.bar.baz = 5
+    assert base.as_dict() == {"foo.bar.baz": 1, "spam.eggs": 2}
+    assert ns.as_dict() == {"foo.bar.baz": 5, "foo.new": 3, "spam.eggs": 4}
+
+
+def test_namespace_update_deep():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1, "baz": [1]}})
+    foo = ns.foo
+    ns.update_deep({"foo.bar": 2}, {"foo": {"baz": [2], "new": {"a.b": 3}}})
+
+    assert ns.foo is foo
+    assert ns.as_dict() == {"foo.bar": 2, "foo.baz": [2], "foo.new.a.b": 3}
+
+    ns.update_deep({"foo": {"baz": [3]}}, strategy="append")
+    assert ns.foo.baz == [2, 3]
+
+
+def test_namespace_update_deep_updates_index():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}})
+    ns.use_index()
+    ns.as_dict()
+    ns.update_deep({"foo": {"bar": 2, "baz": 3}})
+
+    assert ns.as_dict() == {"foo.bar": 2, "foo.baz": 3}
+
+
+def test_namespace_diff():
+    old = pytool.lang.Namespace({"foo": {"bar": 1, "baz": [1, 2]}, "gone": 1})
+    new = pytool.lang.Namespace({"foo": {"bar": 2, "baz": [1, 2]}, "new": {"a": 1}})
+    ops = old.diff(new)
+
+    assert ops[0] == ("set", "foo.bar", 2)
+    assert ops[1][:2] == ("set", "new")
+    assert ops[1][2].as_dict() == {"a": 1}
+    assert ops[2] == ("delete", "gone")
+    assert old.diff(old) == []
+    assert old.diff(old.as_dict()) == []
+
+
+def test_namespace_diff_skips_shared_subtrees():
+    old = pytool.lang.Namespace({"foo": {"bar": {"baz": 1}}, "spam": {"eggs": 2}})
+    new = old.copy(shared=True)
+    new.foo.bar.baz = 3
+
+    # Fail loudly if the untouched subtree is walked at all
+    object.__setattr__(old.spam, "_Namespace__pending", {"eggs": object()})
+    assert old.diff(new) == [("set", "foo.bar.baz", 3)]
+
+
+def test_namespace_diff_compares_lists_by_item():
+    ns = pytool.lang.Namespace({"rows": [{"a": 1}, [{"b": 2}]], "n": 1})
+    assert ns.diff(ns.copy()) == []
+
+    shared = ns.copy(shared=True)
+    assert shared.rows[0].a == 1
+    assert ns.diff(shared) == []
+    assert shared.diff(ns) == []
+
+    shared.rows[0].a = 2
+    assert ns.diff(shared) == [("set", "rows", shared.rows)]
+
+
+def test_namespace_apply_patch():
+    old = pytool.lang.Namespace({"foo": {"bar": 1}, "gone": 1})
+    new = pytool.lang.Namespace(
+        {"foo": {"bar": 2, "baz": {"a": 1}}, "x": {"y": 1}, "rows": [{"a": 1}]}
+    )
+    old.use_index()
+    old.as_dict()
+    old.apply_patch(old.diff(new))
+
+    assert old.as_dict() == new.as_dict()
+    assert isinstance(old.foo.baz, pytool.lang.Namespace)
+    assert old.foo.baz is not new.foo.baz
+
+    old.apply_patch([("delete", "missing"), ("set", "rows.0.a", 2)])
+    assert old.rows[0].a == 2
+    assert new.rows[0].a == 1
+
+    old.apply_patch([("delete", "missing.key")])
+    assert "missing" not in old.__dict__
+
+
+def test_namespace_apply_patch_bad_op():
+    with pytest.raises(ValueError):
+        pytool.lang.Namespace().apply_patch([("move", "foo")])
+
+
+def test_namespace_pickle():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1, "rows": [{"a": 1}]}, "empty": {}})
+    ns.spam.eggs = pytool.lang.Keyspace({"key.name": 2})
+    data = pickle.dumps(ns)
+    ns2 = pickle.loads(data)
+
+    assert ns2.as_dict() == ns.as_dict()
+    assert isinstance(ns2.foo, pytool.lang.Namespace)
+    assert isinstance(ns2.foo.rows[0], pytool.lang.Namespace)
+    assert isinstance(ns2.spam.eggs, pytool.lang.Keyspace)
+    assert "empty" in ns2.__dict__
+    assert ns2.foo is not ns.foo
+
+
+def test_namespace_pickle_cycle():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}})
+    ns.me = ns
+    ns.foo.parent = ns
+    ns.foo.me = ns.foo
+    ns2 = pickle.loads(pickle.dumps(ns))
+
+    assert ns2.me is ns2
+    assert ns2.foo.parent is ns2
+    assert ns2.foo.me is ns2.foo
+    assert ns2.foo.bar == 1
+
+
+def test_namespace_pickle_shared_subtree():
+    shared = pytool.lang.Namespace({"value": 1})
+    ns = pytool.lang.Namespace({"a": {"x": shared}, "b": {"y": shared, "z": shared}})
+    ns.c = ns.a.x
+    ns2 = pickle.loads(pickle.dumps(ns))
+
+    assert ns2.a.x is ns2.b.y
+    assert ns2.b.y is ns2.b.z
+    assert ns2.c is ns2.a.x
+    assert ns2.c.value == 1
+    assert ns2.a is not ns2.b
+
+
+def test_namespace_pickle_keeps_pending_items():
+    ns = pytool.lang.LazyNamespace({"foo": {"bar": {"baz": 1}}, "spam.eggs": 2})
+    ns.foo
+    ns2 = pickle.loads(pickle.dumps(ns))
+
+    assert pytool.lang._get_pending(ns2) == pytool.lang._get_pending(ns)
+    assert ns2.as_dict() == {"foo.bar.baz": 1, "spam.eggs": 2}
+
+
+def test_namespace_to_bytes():
+    ns = pytool.lang.Namespace(
+        {
+            "foo": {"bar": 1, "big": 2**70, "small": -(2**40), "float": 1.5},
+            "text": "x" * 300,
+            "values": [None, True, False, b"raw", ("a", "a"), {"raw": 1}],
+            "rows": [{"name": "x"}] * 300,
+        }
+    )
+    ns2 = pytool.lang.Namespace.from_bytes(ns.to_bytes())
+
+    assert ns2.as_dict() == ns.as_dict()
+    assert isinstance(ns2.rows[299], pytool.lang.Namespace)
+
+    lazy = pytool.lang.LazyNamespace({"foo.bar": {"0": "a"}})
+    assert pytool.lang.Namespace.from_bytes(lazy.to_bytes()).foo.bar == ["a"]
+
+
+def test_namespace_to_bytes_errors():
+    with pytest.raises(TypeError):
+        pytool.lang.Namespace({"foo": object()}).to_bytes()
+
+    data = pytool.lang.Namespace({"foo": "bar"}).to_bytes()
+    for bad in (b"", b"XX" + data[2:], data[:-1], data + b"N"):
+        with pytest.raises(ValueError):
+            pytool.lang.Namespace.from_bytes(bad)
+
+
+def test_config_holder():
+    holder = pytool.lang.ConfigHolder({"server": {"port": 80, "host": "a"}})
+    old = holder.snapshot()
+    new = holder.update({"server.port": 8080})
+
+    assert holder.snapshot() is new
+    assert old.as_dict() == {"server.port": 80, "server.host": "a"}
+    assert new.as_dict() == {"server.port": 8080, "server.host": "a"}
+    assert pytool.lang._get_pending(new.server) is None
+
+    holder.publish(pytool.lang.LazyNamespace({"other": {"key": 1}}))
+    assert isinstance(holder.snapshot(), pytool.lang.Namespace)
+    assert pytool.lang._get_pending(holder.snapshot()) is None
+    assert pytool.lang._get_pending(holder.snapshot().other) is None
+    assert pytool.lang.ConfigHolder().snapshot().as_dict() == {}
+
+
+def test_config_holder_snapshots_do_not_vivify():
+    holder = pytool.lang.ConfigHolder({"server": {"port": 80}, "rows": [{"a": 1}]})
+    snapshot = holder.snapshot()
+
+    assert not snapshot.feature.flag
+    assert not snapshot.server.missing
+    assert not snapshot.rows[0].missing
+    assert snapshot.as_dict() == {"server.port": 80, "rows": [{"a": 1}]}
+    assert type(snapshot) is pytool.lang.Namespace
+    assert type(snapshot.server) is pytool.lang.Namespace
+
+    with pytest.raises(AttributeError):
+        snapshot.server.port = 8080
+    with pytest.raises(AttributeError):
+        del snapshot.server.port
+    with pytest.raises(AttributeError):
+        snapshot.rows[0].a = 2
+    assert snapshot.server.port == 80
+
+    keyspace = pytool.lang.ConfigHolder({"a-b": 1}, namespace=pytool.lang.Keyspace)
+    with pytest.raises(AttributeError):
+        keyspace.snapshot()["c"] = 2
+
+    space = snapshot.copy()
+    space.feature.flag = True
+    assert type(space) is pytool.lang.Namespace
+    assert space.feature.flag is True
+
+    space = pickle.loads(pickle.dumps(snapshot))
+    space.server.port = 8080
+    assert space.as_dict() == {"server.port": 8080, "rows": [{"a": 1}]}
+
+
+def test_config_holder_copies_published_namespaces():
+    space = pytool.lang.Namespace({"port": 80})
+    holder = pytool.lang.ConfigHolder({"server": space})
+
+    assert holder.snapshot().server is not space
+    space.port = 8080
+    assert holder.snapshot().server.port == 80
+
+
+def test_config_holder_releases_old_snapshots():
+    holder = pytool.lang.ConfigHolder({"foo": 1})
+    ref = weakref.ref(holder.snapshot())
+    holder.publish({"foo": 2})
+    gc.collect()
+
+    assert ref() is None
+
+
+def test_config_holder_readers_see_whole_snapshots():
+    holder = pytool.lang.ConfigHolder({"a": 0, "b": {"c": 0}})
+    errors = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            snapshot = holder.snapshot()
+            if snapshot.a != snapshot.b.c:
+                errors.append(snapshot.as_dict())
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for i in range(200):
+        holder.publish({"a": i, "b": {"c": i}})
+        holder.update({"a": -i, "b.c": -i})
+    done.set()
+    for reader in readers:
+        reader.join()
+
+    assert errors == []
+
+
+def test_namespace_get_many():
+    ns = pytool.lang.Namespace(
+        {"server": {"host": "h", "port": 1, "rows": [{"a": 1}, {"a": 2}]}}
+    )
+    ns.raw = {"x": [1, 2]}
+    values = ns.get_many(
+        ["server.host", "server.port", "server.rows.1.a", "raw.x.0", "server"]
+    )
+
+    assert values == ("h", 1, 2, 1, ns.server)
+    assert ns.get_many(["server.port"], as_dict=True) == {"server.port": 1}
+    assert ns.get_many([]) == ()
+
+
+def test_namespace_get_many_missing():
+    ns = pytool.lang.Namespace({"server": {"rows": [{"a": 1}]}})
+    values = ns.get_many(
+        ["missing", "server.missing.deep", "server.rows.3.a", "server.rows.x"],
+        default=None,
+    )
+
+    assert values == (None, None, None, None)
+    assert ns.get_many(["missing"])[0] is pytool.lang.UNSET
+    assert "missing" not in ns.__dict__
+    assert list(ns.server.__dict__) == ["rows"]
+
+
+def test_namespace_get_many_lazy():
+    ns = pytool.lang.LazyNamespace({"foo": {"bar": 1}, "spam": {"eggs": 2}})
+
+    assert ns.get_many(["foo.bar", "foo.baz"], default=0) == (1, 0)
+    assert "spam" not in ns.__dict__
+
+
+def test_strict_namespace():
+    ns = pytool.lang.StrictNamespace({"foo": {"bar": 1}})
+
+    assert not ns.feature.flag
+    assert ns.feature is ns.missing
+    assert ns["spam.eggs"] is ns.missing
+    assert list(ns.__dict__) == ["foo"]
+    assert not ns.foo.missing
+    assert list(ns.foo.__dict__) == ["bar"]
+    assert isinstance(ns.foo, pytool.lang.StrictNamespace)
+    assert pickle.loads(pickle.dumps(ns.missing)) is ns.missing
+
+    ns.update_deep({"feature.flag": True})
+    assert ns.feature.flag is True
+
+
+def test_strict_namespace_empty_is_immutable():
+    ns = pytool.lang.StrictNamespace()
+
+    with pytest.raises(AttributeError):
+        ns.feature.flag = True
+    with pytest.raises(AttributeError):
+        del ns.feature.flag
+    with pytest.raises(AttributeError):
+        ns.feature.from_dict({"flag": True})
+    assert not ns.feature
+    with pytest.raises(AttributeError):
+        ns.feature.use_index()
+    with pytest.raises(AttributeError):
+        ns.feature._Namespace__watchers = []
+    assert pytool.lang._get_index(ns.feature) is None
+
+
+def test_strict_namespace_empty_in_index():
+    ns = pytool.lang.StrictNamespace({"foo": 1})
+    ns.use_index()
+    ns.as_dict()
+    ns.empty = ns.missing
+    ns.empty = 2
+
+    assert ns.as_dict() == {"foo": 1, "empty": 2}
+    assert pytool.lang._get_watchers(ns.missing) is None
+    assert type(ns.missing) is pytool.lang._EmptyNamespace
+
+
+def test_strict_namespace_apply_patch():
+    ns = pytool.lang.StrictNamespace({"a": 1})
+    ns.apply_patch([("set", "c.d", 1), ("delete", "x.y"), ("set", "c.e.f", 2)])
+
+    assert ns.as_dict() == {"a": 1, "c.d": 1, "c.e.f": 2}
+    assert type(ns.c.e) is pytool.lang.StrictNamespace
+
+
+def test_namespace_prune():
+    ns = pytool.lang.Namespace({"foo": {"bar": 1}, "rows": [{"a": {}}]})
+    ns.foo.baz.spam
+    ns.missing.deep.key
+    ns.use_index()
+    ns.as_dict()
+    ns.prune()
+
+    assert list(ns.__dict__) == ["foo", "rows"]
+    assert list(ns.foo.__dict__) == ["bar"]
+    assert len(ns.rows) == 1
+    assert "a" not in ns.rows[0].__dict__
+    assert ns.as_dict() == {"foo.bar": 1, "rows": [{}]}
+
+
+def test_compact_keyspace_matches_keyspace():
+    doc = {"a": {"b": 1, "c": [1, {"d": 2}], "e": {"0": "x"}}, "key-1": {"x.y": 3}}
+    cks = pytool.lang.CompactKeyspace(doc)
+    ks = pytool.lang.Keyspace(doc)
+
+    assert cks.as_dict() == ks.as_dict()
+    assert cks.for_json() == ks.for_json()
+    assert [key for key, _ in cks] == [key for key, _ in ks]
+    assert pytool.json.as_json(cks) == pytool.json.as_json(ks)
+    assert isinstance(cks.a.c[1], pytool.lang.CompactKeyspace)
+    assert repr(pytool.lang.CompactKeyspace()) == "<CompactKeyspace({})>"
+
+
+def test_compact_keyspace_items():
+    cks = pytool.lang.CompactKeyspace()
+    cks["user-1"]["new-ui"] = True
+    cks.other.flag = False
+    cks.raw = {"not": "nested"}
+
+    assert cks["user-1.new-ui"] is True
+    assert cks.traverse(["other", "flag"]) is False
+    assert "user-1.new-ui" in cks
+    assert "user-1.old-ui" not in cks
+    assert "raw" in cks
+    assert "raw.not" not in cks
+    assert cks.as_dict() == {
+        "user-1.new-ui": True,
+        "other.flag": False,
+        "raw": {"not": "nested"},
+    }
+
+    cks.empty
+    assert "empty" not in cks
+    del cks["user-1"]
+    del cks.other
+    with pytest.raises(AttributeError):
+        del cks.missing
+    assert cks.as_dict() == {"raw": {"not": "nested"}}
+
+
+def test_compact_keyspace_copy_and_pickle():
+    cks = pytool.lang.CompactKeyspace({"foo": {"bar": [{"a": 1}]}})
+    cks.nested = pytool.lang.CompactKeyspace({"b": 2})
+
+    for other in (cks.copy(), copy.deepcopy(cks), pickle.loads(pickle.dumps(cks))):
+        assert other.as_dict() == cks.as_dict()
+        other.foo.bar[0].a = 3
+        other.nested.b = 4
+    assert cks.as_dict() == {"foo.bar": [{"a": 1}], "nested.b": 2}
+
+
+RECORDS_DOC = {
+    "rows": [
+        {"id": 1, "name": "one", "meta.a": 1, "tags": ["x"], "items": 0},
+        {"id": 2, "name": "two", "meta": {"a": 2}, "tags": [], "items": 1},
+    ],
+    "mixed": [{"a": 1}, {"b": 2}],
+    "single": [{"a": 1}],
+}
+
+
+def test_record_namespace_matches_namespace():
+    records = pytool.lang.RecordNamespace(RECORDS_DOC)
+    ns = pytool.lang.Namespace(RECORDS_DOC)
+
+    assert isinstance(records.rows, pytool.lang.RecordList)
+    assert isinstance(records.rows[0], pytool.lang.RecordRow)
+    assert isinstance(records.rows[1].meta, pytool.lang.RecordNamespace)
+    assert isinstance(records.mixed, list)
+    assert isinstance(records.single, list)
+
+    assert records.as_dict() == ns.as_dict()
+    assert records.for_json() == ns.for_json()
+    assert pytool.json.as_json(records) == pytool.json.as_json(ns)
+    assert list(records.rows[0]) == list(ns.rows[0])
+    assert records.rows[1].as_dict("row") == ns.rows[1].as_dict("row")
+    assert records.rows[1].for_json("row") == ns.rows[1].for_json("row")
+
+    paths = ["rows.1.name", "rows.0.meta.a", "rows.0.missing", "rows.5.id"]
+    assert records.get_many(paths) == ns.get_many(paths)
+    assert records["rows.1.meta.a"] == 2
+    assert records.traverse(["rows", "0", "tags", 0]) == "x"
+
+
+def test_record_namespace_rows():
+    records = pytool.lang.RecordNamespace(RECORDS_DOC)
+    rows = records.rows
+
+    assert rows[0].items == 0
+    assert rows[0]["items"] == 0
+    assert rows[0] == rows[0]
+    assert rows[0] != rows[1]
+    assert not rows[0].missing
+    assert "meta.a" in rows[0]
+    assert "missing" not in rows[0]
+
+    rows[0].name = "first"
+    rows[1].extra = True
+    assert rows[0].name == "first"
+    assert "extra" in rows[1]
+    assert "extra" not in rows[0]
+    del rows[1].extra
+    with pytest.raises(AttributeError):
+        del rows[1].extra
+
+    rows.append({"id": 3, "admin": True})
+    rows.insert(0, pytool.lang.Namespace({"id": 0}))
+    assert [row.id for row in rows] == [0, 1, 2, 3]
+    assert rows[-1].for_json() == {"id": 3, "admin": True}
+    assert rows.pop().admin is True
+    assert [row.id for row in rows[1:]] == [1, 2]
+    assert rows[1:] == rows[1:]
+    with pytest.raises(TypeError):
+        rows.append(1)
+
+    del rows[0]
+    assert records.for_json()["rows"] == [
+        {"id": 1, "name": "first", "meta": {"a": 1}, "tags": ["x"], "items": 0},
+        {"id": 2, "name": "two", "meta": {"a": 2}, "tags": [], "items": 1},
+    ]
+
+
+def test_record_namespace_copy_and_pickle():
+    records = pytool.lang.RecordNamespace(RECORDS_DOC)
+    expected = records.for_json()
+
+    others = [
+        records.copy(),
+        records.copy(shared=True),
+        copy.deepcopy(records),
+        pickle.loads(pickle.dumps(records)),
+        pytool.lang.RecordNamespace.from_bytes(records.to_bytes()),
+    ]
+    for other in others:
+        assert other.for_json() == expected
+        assert isinstance(other.rows, pytool.lang.RecordList)
+        other.rows[0].name = "changed"
+        other.rows[1].meta.a = 3
+    assert records.for_json() == expected
+
+    merged = pytool.lang.RecordNamespace.merge(
+        records, {"rows": [{"id": 3}]}, strategy="append"
+    )
+    assert [row.id for row in merged.rows] == [1, 2, 3]
+    assert len(records.rows) == 2
+
+
+SchemaRoute = pytool.lang.compile_schema("SchemaRoute", {"path": "/", "timeout": 5})
+SchemaConfig = pytool.lang.compile_schema(
+    "SchemaConfig",
+    {
+        "server": {"host": "localhost", "port": 80},
+        "routes": [SchemaRoute],
+        "tags": ["default"],
+        "name": pytool.lang.UNSET,
+        "extra": None,
+    },
+)
+
+
+def test_compile_schema():
+    config = SchemaConfig(
+        {"server.port": 8080, "routes": [{"path": "/a"}], "extra": {"x.y": 1}}
+    )
+
+    assert config.server.port == 8080
+    assert config.server.host == "localhost"
+    assert config.routes[0].timeout == 5
+    assert isinstance(config.routes[0], SchemaRoute)
+    assert isinstance(config.extra, pytool.lang.Namespace)
+    assert config["routes.0.path"] == "/a"
+    assert config.traverse(["routes", 0, "path"]) == "/a"
+    assert not hasattr(config, "__dict__")
+    assert SchemaConfig().tags is not SchemaConfig().tags
+
+
+def test_compile_schema_matches_namespace():
+    config = SchemaConfig({"routes": [{"path": "/a"}], "extra": {"x": {"y": 1}}})
+    ns = pytool.lang.Namespace(config.for_json())
+
+    assert config.as_dict() == ns.as_dict()
+    assert config.as_dict("base") == ns.as_dict("base")
+    assert config.for_json("base") == ns.for_json("base")
+    assert [key for key, _ in config] == [key for key, _ in ns]
+    assert pytool.json.as_json(config) == pytool.json.as_json(ns)
+    assert "server.port" in config
+    assert "extra.x.y" in config
+    assert "extra.x.z" not in config
+    assert "name" not in config
+    assert "missing" not in config
+
+
+def test_compile_schema_errors():
+    with pytest.raises(AssertionError):
+        SchemaConfig({"missing": 1})
+    with pytest.raises(AssertionError):
+        SchemaConfig({"server": 1})
+    with pytest.raises(AttributeError):
+        SchemaConfig().missing
+    with pytest.raises(AttributeError):
+        SchemaConfig().missing = 1
+    for fields in ({"items": 1}, {"_private": 1}, {"not valid": 1}):
+        with pytest.raises(ValueError):
+            pytool.lang.compile_schema("Bad", fields)
+
+
+def test_compile_schema_copy_and_pickle():
+    config = SchemaConfig({"name": "x", "routes": [{"path": "/a"}]})
+    copies = [config.copy(), copy.deepcopy(config), pickle.loads(pickle.dumps(config))]
+    for other in copies:
+        assert type(other) is SchemaConfig
+        assert other.as_dict() == config.as_dict()
+        other.routes[0].path = "/b"
+        other.tags.append("other")
+    assert config.routes[0].path == "/a"
+    assert config.tags == ["default"]